@@ -13,9 +13,10 @@ from helpers.air_table import (
     get_primary_leader,
     get_secondary_leaders,
     fetch_waiting_clubs,
-    approve_club_airtable,
+    approve_clubs_airtable,
 )
 from helpers.slack_minor import slack_lookup_user_display
+from helpers.write_batcher import WriteBatcher
 
 from helpers.air_table import (
     club_leaders,
@@ -23,6 +24,7 @@ from helpers.air_table import (
     get_old_club_from_leader,
     search_clubs,
     club_data_to_obj,
+    hydrate_clubs,
 )
 
 
@@ -536,6 +538,9 @@ def handle_edit_secondary_leaders_select(ack, body, client, logger):
         "secondary_leaders_select"
     ]["selected_users"]
 
+    # Creates and updates are sent together in batches
+    leader_writes = WriteBatcher(club_leaders)
+
     # Check if every user is a leader and if not, add Airtable record
     for user in user_list:
         if not check_if_leader(user):
@@ -543,7 +548,7 @@ def handle_edit_secondary_leaders_select(ack, body, client, logger):
             slack_user = slack_lookup_user_display(user)
             if slack_user == -1:
                 continue
-            club_leaders.create(
+            leader_writes.create(
                 {
                     "Name": slack_user["name"],
                     "Slack ID": user,
@@ -562,17 +567,21 @@ def handle_edit_secondary_leaders_select(ack, body, client, logger):
             )
 
         else:
-            club_leaders.update(
+            leader_writes.update(
                 get_airtable_rec_id_from_slack_id(user), {"Club Link": [club["id"]]}
             )
 
+    leader_writes.flush()
+
     # Remove all other secondary leaders from club
-    for leader in get_all_leaders_for_club(club["id"]):
-        if (
-            leader["fields"]["Slack ID"] not in user_list
+    club_leaders.batch_delete(
+        [
+            leader["id"]
+            for leader in get_all_leaders_for_club(club["id"])
+            if leader["fields"]["Slack ID"] not in user_list
             and "Is Primary" not in leader["fields"]
-        ):
-            club_leaders.delete(leader["id"])
+        ]
+    )
 
     client.views_update(
         view_id=body["view"]["id"],
@@ -911,8 +920,14 @@ def handle_add_club_submission(ack, body, client, logger):
     ]["value"]
     old_club_record = get_old_club_from_leader(body["user"]["id"])
 
+    # If the lookup fails the geo fields are left empty for profile_update.py to fill in later
     geo_data = lookup_lat_long(
-        old_club_record["fields"]["Latitude"], old_club_record["fields"]["Longitude"]
+        old_club_record["fields"]["Latitude"],
+        old_club_record["fields"]["Longitude"],
+        timeout=10,
+    )
+    country_code = (
+        geo_data["country_code"].upper() if "country_code" in geo_data else None
     )
 
     club = clubs_table.create(
@@ -922,20 +937,23 @@ def handle_add_club_submission(ack, body, client, logger):
             "Socials to Display": club_socials,
             "Club Venue": [old_club_record["id"]],
             "To Display": True,
-            "Country": geo_data["country"],
-            "Country Code": geo_data["country_code"].upper(),
+            "Country": geo_data["country"] if "country" in geo_data else None,
+            "Country Code": country_code,
             "State ISO Code": geo_data["ISO3166-2-lvl4"]
             if "ISO3166-2-lvl4" in geo_data
             else None,
             "State": geo_data["state"] if "state" in geo_data else None,
             "Postcode": geo_data["postcode"] if "postcode" in geo_data else None,
-            "Continent": get_continent(geo_data["country_code"].upper()),
+            "Continent": get_continent(country_code) if country_code else None,
         }
     )
 
+    # Every leader of the new club is created in one batch
+    leader_writes = WriteBatcher(club_leaders)
+
     for leader in secondary_leaders:
         slack_user = slack_lookup_user_display(leader)
-        club_leaders.create(
+        leader_writes.create(
             {
                 "Name": slack_user["name"],
                 "Club Link": [club["id"]],
@@ -953,7 +971,7 @@ def handle_add_club_submission(ack, body, client, logger):
         )
 
     slack_user = slack_lookup_user_display(body["user"]["id"])
-    club_leaders.create(
+    leader_writes.create(
         {
             "Name": slack_lookup_user_display(body["user"]["id"])["name"],
             "Club Link": [club["id"]],
@@ -968,6 +986,8 @@ def handle_add_club_submission(ack, body, client, logger):
         }
     )
 
+    leader_writes.flush()
+
     client.chat_postMessage(
         channel=body["user"]["id"],
         text=f"Your club has been created! You can view it once it's been approved by HQ!",
@@ -1058,8 +1078,7 @@ def handle_approve_club(ack, body, client, logger):
         ]["selected_options"]
     ]
 
-    for club in clubs_to_approve:
-        approve_club_airtable(club)
+    approve_clubs_airtable(clubs_to_approve)
 
     client.chat_postMessage(
         channel=body["user"]["id"],
@@ -1079,16 +1098,15 @@ def lookup_club(ack, respond, command, client, body):
 
     club_name = command["text"]
 
-    club_search = search_clubs(club_name)
+    # Each club takes 3 blocks and a message can hold at most 50
+    club_search = search_clubs(club_name, limit=15)
 
     if len(club_search) == 0:
         respond("No club found!")
         return
 
     clubs = []
-    for c in club_search:
-        club = club_data_to_obj(c)
-
+    for club in hydrate_clubs(club_search):
         if not club.to_display:
             continue
 
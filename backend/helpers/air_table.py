@@ -1,10 +1,21 @@
+import asyncio
+import copy
 import os
 
 from dotenv import load_dotenv
-from pyairtable import Table
-from pyairtable.formulas import match, AND, FIND, STR_VALUE, FIELD
 
+from helpers.air_table_async import AsyncAirtable
+from helpers.autocomplete import Autocomplete
 from helpers.classes import *
+from helpers.clusters import ClusterIndex
+from helpers.fields import CLUB_FIELDS, LEADER_FIELDS, OLD_CLUB_FIELDS
+from helpers.mapper import map_club, map_leader, map_old_club
+from helpers.mirror import SQLiteMirror
+from helpers.search import SearchIndex
+from helpers.snapshot import SnapshotTable, snapshot_cache
+from helpers.spatial import GeoGrid, PlaceIndex
+from helpers.tiles import TileIndex
+from helpers.write_batcher import WriteBatcher
 
 
 
@@ -13,67 +24,85 @@ load_dotenv()
 personal_token = os.environ.get("AIRTABLE_PAT")
 base_id = os.environ.get("AIRTABLE_BASE_ID")
 
-clubs_table: Table = Table(personal_token, base_id, "Club Directory Link")
+# "memory" serves lookups from the in-memory snapshots, "sqlite" also persists them to a local file and
+# serves lookups from its indexes, see helpers/snapshot.py and helpers/mirror.py
+AIRTABLE_BACKEND = os.environ.get("AIRTABLE_BACKEND", "memory")
+AIRTABLE_SQLITE_PATH = os.environ.get("AIRTABLE_SQLITE_PATH", "airtable.sqlite3")
 
-club_leaders: Table = Table(personal_token, base_id, "Leaders Directory Link")
+mirror = SQLiteMirror(AIRTABLE_SQLITE_PATH) if AIRTABLE_BACKEND == "sqlite" else None
 
+# Snapshots only sync the columns listed in helpers/fields.py
 
+clubs_table: SnapshotTable = SnapshotTable(
+    personal_token, base_id, "Club Directory Link", mirror=mirror, fields=CLUB_FIELDS
+)
+
+club_leaders: SnapshotTable = SnapshotTable(
+    personal_token, base_id, "Leaders Directory Link", mirror=mirror, fields=LEADER_FIELDS
+)
+
+old_clubs_table: SnapshotTable = SnapshotTable(
+    personal_token, base_id, "Clubs Dashboard", mirror=mirror, fields=OLD_CLUB_FIELDS
+)
+
+# Used by the API to sync the snapshots without tying up a thread per request
+airtable_async = AsyncAirtable(personal_token, base_id)
+
+# Secondary indexes, built once per load and kept up to date on every sync and write
+
+clubs_table.snapshot.add_index(
+    "name",
+    lambda club: [club["fields"]["Club Name"]] if "Club Name" in club["fields"] else [],
+)
+clubs_table.snapshot.add_index(
+    "id", lambda club: [str(club["fields"]["ID"])] if "ID" in club["fields"] else []
+)
+club_leaders.snapshot.add_index(
+    "club", lambda leader: leader["fields"].get("Club Link", [])[:1]
+)
+club_leaders.snapshot.add_index(
+    "slack_id",
+    lambda leader: [leader["fields"]["Slack ID"]]
+    if "Slack ID" in leader["fields"]
+    else [],
+)
+
+# Fuzzy search over the clubs, a match in the name counts for more than one in the description
+clubs_search = SearchIndex(
+    {"Club Name": 4, "Venue": 2, "Location": 2, "Description": 1}
+)
+clubs_table.snapshot.attach_index("search", clubs_search)
+
+
+@snapshot_cache(club_leaders.snapshot)
+def get_leader_records():
+    """
+    This function returns (airtable record id, leader) for all the club leaders, in the same order as get_all_leaders
+    """
+    return [
+        (leader["id"], leader_data_to_obj(leader)) for leader in club_leaders.snapshot.all()
+    ]
+
+
+@snapshot_cache(club_leaders.snapshot)
 def get_all_leaders():
     """
     This function returns a list of all the club leaders
     """
-    leaders = []
-
-    for leader in club_leaders.all():
-        leader_data = Leader(
-            name=leader["fields"]["Name"],
-            pronouns=leader["fields"]["Pronouns"]
-            if "Pronouns" in leader["fields"]
-            else None,
-            is_primary=leader["fields"]["Is Primary"]
-            if "Is Primary" in leader["fields"]
-            else False,
-            email=leader["fields"]["Email"]
-            if "Email" in leader["fields"] and "Email" in leader["fields"]["To Display"]
-            else None,
-            slack_id=leader["fields"]["Slack ID"]
-            if "Slack ID" in leader["fields"]
-            else None,
-            website=leader["fields"]["Website"]
-            if "Website" in leader["fields"]
-            else None,
-            scrapbook=leader["fields"]["Scrapbook"]
-            if "Scrapbook" in leader["fields"]
-            else None,
-            socials=Socials(
-                github=leader["fields"]["Github"]
-                if "Github" in leader["fields"]
-                and "Github" in leader["fields"]["To Display"]
-                else None,
-                linkedin=leader["fields"]["LinkedIn"]
-                if "LinkedIn" in leader["fields"]
-                and "LinkedIn" in leader["fields"]["To Display"]
-                else None,
-                twitter=leader["fields"]["Twitter"]
-                if "Twitter" in leader["fields"]
-                and "Twitter" in leader["fields"]["To Display"]
-                else None,
-            ),
-        )
-        leaders.append(leader_data)
-
-    return leaders
+    return [leader for _, leader in get_leader_records()]
 
 
+@snapshot_cache(clubs_table.snapshot, club_leaders.snapshot)
 def get_all_clubs():
     """
     This function returns a list of all the clubs
     """
     clubs = []
 
-    clubs_data = clubs_table.all()
+    clubs_data = clubs_table.snapshot.all()
+    leaders_by_id = club_leaders.snapshot.records
 
-    for club in map(club_data_to_obj, clubs_data):
+    for club in hydrate_clubs(clubs_data, leaders_by_id):
         if not club.to_display or not club.approved:
             continue
 
@@ -86,8 +115,11 @@ def get_club_by_name(name: str):
     """
     This function takes a club name and returns the club data
     """
-    formula = match({"Club Name": name})
-    club_data = clubs_table.first(formula=formula)
+    if mirror is not None:
+        clubs_table.snapshot.ensure_fresh()
+        club_data = mirror.first(clubs_table.table_name, "Club Name", name)
+    else:
+        club_data = next(iter(clubs_table.snapshot.lookup("name", name)), None)
 
     if club_data == None:
         return None
@@ -99,8 +131,7 @@ def get_club_by_id(id: int):
     """
     This function takes a club id and returns the club data
     """
-    formula = match({"ID": id})
-    club_data = clubs_table.first(formula=formula)
+    club_data = find_club_by_id(id)
 
     if club_data == None:
         return None
@@ -108,155 +139,170 @@ def get_club_by_id(id: int):
     return club_data_to_obj(club_data)
 
 
-def club_data_to_obj(club_data: dict):
-    """
-    A simple function to convert club data to a ClubElement object
-    """
-    club = ClubElement(
-        id=club_data["fields"]["ID"],
-        name=club_data["fields"]["Club Name"],
-        to_display=club_data["fields"]["To Display"]
-        if "To Display" in club_data["fields"]
-        else False,
-        approved=club_data["fields"]["Approved"]
-        if "Approved" in club_data["fields"]
-        else False,
-        description=club_data["fields"]["Description"]
-        if "Description" in club_data["fields"]
-        else None,
-        website=club_data["fields"]["Website"]
-        if "Website" in club_data["fields"]
-        else None,
-        scrapbook=club_data["fields"]["Scrapbook"]
-        if "Scrapbook" in club_data["fields"]
-        else None,
-        venue=club_data["fields"]["Venue"][0],
-        location=club_data["fields"]["Location"][0],
-        geo_data=GeoData(
-            coordinates=Coordinates(
-                latitude=club_data["fields"]["Latitude"][0],
-                longitude=club_data["fields"]["Longitude"][0],
-            ),
-            country=club_data["fields"]["Country"]
-            if "Country" in club_data["fields"]
-            else None,
-            state=club_data["fields"]["State"]
-            if "State" in club_data["fields"]
-            else None,
-            state_iso_code=club_data["fields"]["State ISO Code"]
-            if "State ISO Code" in club_data["fields"]
-            else None,
-            country_code=club_data["fields"]["Country Code"]
-            if "Country Code" in club_data["fields"]
-            else None,
-            continent=club_data["fields"]["Continent"]
-            if "Continent" in club_data["fields"]
-            else None,
-            postcode=club_data["fields"]["Postcode"]
-            if "Postcode" in club_data["fields"]
-            else None,
-        ),
-        socials=Socials(
-            github=club_data["fields"]["Github"]
-            if "Github" in club_data["fields"]
-            and "Github" in club_data["fields"]["Socials to Display"]
-            else None,
-            linkedin=club_data["fields"]["LinkedIn"]
-            if "LinkedIn" in club_data["fields"]
-            and "LinkedIn" in club_data["fields"]["Socials to Display"]
-            else None,
-            twitter=club_data["fields"]["Twitter"]
-            if "Twitter" in club_data["fields"]
-            and "Twitter" in club_data["fields"]["Socials To Display"]
-            else None,
-        ),
-        leaders=[],
+def club_data_to_obj(club_data: dict, leaders_by_id: dict = None):
+    """
+    A simple function to convert club data to a ClubElement object, leaders are looked up in leaders_by_id when given
+    """
+    if leaders_by_id is None:
+        leaders_by_id = get_leaders_by_ids(
+            club_data["fields"].get("Leaders Directory Link", [])
+        )
+
+    return map_club(
+        club_data["fields"],
+        leaders=[
+            leader_data_to_obj(leaders_by_id[leader_id])
+            for leader_id in club_data["fields"].get("Leaders Directory Link", [])
+            if leader_id in leaders_by_id
+        ],
     )
-    for leader_id in club_data["fields"]["Leaders Directory Link"]:
-        leader = club_leaders.get(leader_id)
-
-        try:
-            leader["fields"]["To Display"]
-        except KeyError:
-            leader["fields"]["To Display"] = []
-
-        leader_data = Leader(
-            name=leader["fields"]["Name"],
-            pronouns=leader["fields"]["Pronouns"]
-            if "Pronouns" in leader["fields"]
-            else None,
-            is_primary=leader["fields"]["Is Primary"]
-            if "Is Primary" in leader["fields"]
-            else False,
-            email=leader["fields"]["Email"]
-            if "Email" in leader["fields"] and "Email" in leader["fields"]["To Display"]
-            else None,
-            slack_id=leader["fields"]["Slack ID"]
-            if "Slack ID" in leader["fields"]
-            else None,
-            website=leader["fields"]["Website"]
-            if "Website" in leader["fields"]
-            else None,
-            scrapbook=leader["fields"]["Scrapbook"]
-            if "Scrapbook" in leader["fields"]
-            else None,
-            socials=Socials(
-                github=leader["fields"]["Github"]
-                if "Github" in leader["fields"]
-                and "Github" in leader["fields"]["To Display"]
-                else None,
-                linkedin=leader["fields"]["LinkedIn"]
-                if "LinkedIn" in leader["fields"]
-                and "LinkedIn" in leader["fields"]["To Display"]
-                else None,
-                twitter=leader["fields"]["Twitter"]
-                if "Twitter" in leader["fields"]
-                and "Twitter" in leader["fields"]["To Display"]
-                else None,
-            ),
+
+
+def get_leaders_by_ids(leader_ids) -> dict:
+    """
+    This function takes a list of leader airtable record ids and returns a dict of record id -> leader record
+    """
+    club_leaders.snapshot.ensure_fresh()
+    leaders = club_leaders.snapshot.records
+
+    return {
+        leader_id: leaders[leader_id] for leader_id in leader_ids if leader_id in leaders
+    }
+
+
+def hydrate_clubs(clubs_data: list, leaders_by_id: dict = None):
+    """
+    This function takes a list of club records and returns a list of ClubElement objects,
+    joining in every leader they link to in one go
+    """
+    if leaders_by_id is None:
+        leaders_by_id = get_leaders_by_ids(
+            leader_id
+            for club_data in clubs_data
+            for leader_id in club_data["fields"].get("Leaders Directory Link", [])
         )
-    club.leaders.append(leader_data)
 
-    return club
+    return [club_data_to_obj(club_data, leaders_by_id) for club_data in clubs_data]
 
 
 # Add old clubs to the map
 
-old_clubs_table = Table(personal_token, base_id, "Clubs Dashboard")
+
+def is_active_old_club(old_club: dict) -> bool:
+    """
+    This function takes an old club record and returns whether it is active and can be placed on the map
+    """
+    return old_club["fields"].get("Status") == "active" and all(
+        old_club["fields"].get(field) not in (None, "")
+        for field in ("Latitude", "Longitude", "Venue", "Continent")
+    )
 
 
+@snapshot_cache(old_clubs_table.snapshot)
 def get_old_clubs():
     """
     This function returns a list of all the old clubs
     """
-    clubs = []
-    formula = AND(
-        match({"Status": "active"}),
-        "NOT({Latitude} = BLANK())",
-        "NOT({Longitude} = BLANK())",
-        "NOT({Venue} = BLANK())",
-        "NOT({Continent} = BLANK())",
-    )
+    return [
+        map_old_club(club["fields"])
+        for club in old_clubs_table.snapshot.all()
+        if is_active_old_club(club)
+    ]
 
-    for club in map(
-        lambda club: OldClub(
-            name=club["fields"]["Venue"],
-            coordinates=Coordinates(
-                latitude=club["fields"]["Latitude"],
-                longitude=club["fields"]["Longitude"],
-            ),
-            country=club["fields"]["Address Country"]
-            if "Address Country" in club["fields"]
-            else None,
-            continent=club["fields"]["Continent"]
-            if "Continent" in club["fields"]
-            else None,
-        ),
-        old_clubs_table.all(formula=formula),
-    ):
-        clubs.append(club)
 
-    return clubs
+@snapshot_cache(clubs_table.snapshot)
+def get_map_clubs() -> list:
+    """
+    This function returns the displayed clubs without their leaders, for building structures that only need
+    their names and locations and shouldn't be rebuilt when a leader changes
+    """
+    return [
+        map_club(club["fields"])
+        for club in clubs_table.snapshot.all()
+        if club["fields"].get("To Display") and club["fields"].get("Approved")
+    ]
+
+
+@snapshot_cache(clubs_table.snapshot, old_clubs_table.snapshot)
+def get_autocomplete() -> Autocomplete:
+    """
+    This function returns the autocomplete over the displayed clubs' names, venues and locations and the old clubs' names,
+    it is only rebuilt when the clubs change
+    """
+    entries = []
+
+    for club in get_map_clubs():
+        entries += [(club.name, "club"), (club.venue, "venue"), (club.location, "location")]
+
+    for old_club in get_old_clubs():
+        entries.append((old_club.name, "old_club"))
+
+    return Autocomplete(entries)
+
+
+@snapshot_cache(clubs_table.snapshot, old_clubs_table.snapshot)
+def get_place_index() -> PlaceIndex:
+    """
+    This function returns the spatial index over the displayed clubs and the old clubs, it is only rebuilt when they change
+    """
+    places = []
+
+    for club in get_map_clubs():
+        places.append(
+            {
+                "id": club.id,
+                "name": club.name,
+                "kind": "club",
+                "continent": club.geo_data.continent,
+                "latitude": club.geo_data.coordinates.latitude,
+                "longitude": club.geo_data.coordinates.longitude,
+            }
+        )
+
+    for old_club in get_old_clubs():
+        places.append(
+            {
+                "id": None,
+                "name": old_club.name,
+                "kind": "old_club",
+                "continent": old_club.continent,
+                "latitude": old_club.coordinates.latitude,
+                "longitude": old_club.coordinates.longitude,
+            }
+        )
+
+    return PlaceIndex(places)
+
+
+@snapshot_cache(clubs_table.snapshot, old_clubs_table.snapshot)
+def get_cluster_index() -> ClusterIndex:
+    """
+    This function returns the map clusters for every zoom level, they are only rebuilt when the clubs change
+    """
+    return ClusterIndex(get_place_index().places)
+
+
+@snapshot_cache(clubs_table.snapshot, old_clubs_table.snapshot)
+def get_tile_index() -> TileIndex:
+    """
+    This function returns the vector tiles of the displayed clubs and old clubs, in the club and old_club layers.
+    Tiles are cached until the clubs change
+    """
+    return TileIndex(get_place_index().places, ["id", "name", "continent", "kind"])
+
+
+@snapshot_cache(clubs_table.snapshot, club_leaders.snapshot)
+def get_club_grid() -> tuple:
+    """
+    This function returns the list of all the clubs and a grid index over it, indexes into the grid are indexes
+    into that list. They are built together so a sync can't swap the list out from under the grid.
+    """
+    clubs = get_all_clubs()
+
+    return clubs, GeoGrid(
+        [club.geo_data.coordinates.latitude for club in clubs],
+        [club.geo_data.coordinates.longitude for club in clubs],
+    )
 
 
 # Lookup if a user is a club leader
@@ -266,8 +312,7 @@ def check_if_leader(user_id: str) -> bool:
     """
     This function takes a user id and returns whether or not they are a club leader
     """
-    formula = match({"Slack ID": user_id})
-    leader_data = club_leaders.first(formula=formula)
+    leader_data = find_leader_by_slack_id(user_id)
 
     if leader_data == None:
         return False
@@ -299,25 +344,23 @@ def get_club_by_leader(user_id: str) -> dict:
     """
     This function takes a user id and returns the club they lead
     """
-    formula = match({"Slack ID": user_id})
-    leader_data = club_leaders.first(formula=formula)
+    leader_data = find_leader_by_slack_id(user_id)
 
     if leader_data == None:
         return None
 
     club_id = leader_data["fields"]["Club Link"][0]
 
-    club_data = clubs_table.get(club_id)
+    club_data = clubs_table.snapshot.get(club_id)
 
-    return club_data
+    return copy.deepcopy(club_data)
 
 
 def get_airtable_rec_id_from_slack_id(slack_id: str) -> str:
     """
     This function takes a slack user id and returns the airtable record id
     """
-    formula = match({"Slack ID": slack_id})
-    leader_data = club_leaders.first(formula=formula)
+    leader_data = find_leader_by_slack_id(slack_id)
 
     if leader_data == None:
         return None
@@ -329,16 +372,14 @@ def get_all_leaders_for_club(club_air_id: str):
     """
     This function takes a club airtable record id and returns a list of all the leaders
     """
-    leaders = []
-
-    for leader in club_leaders.all():
-        if "Club Link" not in leader["fields"]:
-            continue
-
-        if leader["fields"]["Club Link"][0] == club_air_id:
-            leaders.append(leader)
+    if mirror is not None:
+        club_leaders.snapshot.ensure_fresh()
+        return mirror.find(club_leaders.table_name, "Club Link", club_air_id)
 
-    return leaders
+    return [
+        copy.deepcopy(leader)
+        for leader in club_leaders.snapshot.lookup("club", club_air_id)
+    ]
 
 
 def get_primary_leader(club_air_id: str):
@@ -373,13 +414,25 @@ def get_old_club_from_leader(leaders_slack):
     """
     This function takes a slack user id and returns the old club they lead
     """
-    formula = FIND(STR_VALUE(leaders_slack), FIELD("Slack ID"))
-    old_club = old_clubs_table.first(formula=formula)
+    if mirror is not None:
+        old_clubs_table.snapshot.ensure_fresh()
+        old_club = mirror.first_containing(
+            old_clubs_table.table_name, "Slack ID", leaders_slack
+        )
+    else:
+        old_club = next(
+            (
+                old_club
+                for old_club in old_clubs_table.snapshot.all()
+                if leaders_slack in slack_ids_str(old_club["fields"].get("Slack ID"))
+            ),
+            None,
+        )
 
     if old_club == None:
         return None
 
-    return old_club
+    return copy.deepcopy(old_club)
 
 
 def fetch_waiting_clubs():
@@ -387,8 +440,11 @@ def fetch_waiting_clubs():
     This function returns a list of all the clubs waiting for approval
     """
 
-    formula = match({"Approved": False})
-    clubs_data = clubs_table.all(formula=formula)
+    clubs_data = [
+        copy.deepcopy(club)
+        for club in clubs_table.snapshot.all()
+        if not club["fields"].get("Approved")
+    ]
 
     return clubs_data
 
@@ -398,57 +454,194 @@ def approve_club_airtable(club_id: str):
     This function takes a club airtable id and approves it
     """
 
-    club_data = clubs_table.first(formula=match({"ID": club_id}))
-
-    clubs_table.update(club_data["id"], {"Approved": True})
+    approve_clubs_airtable([club_id])
 
 
-def search_clubs(query: str):
+def approve_clubs_airtable(club_ids: list):
     """
-    This function takes a search query and returns a list of clubs that are named similarly
+    This function takes a list of club ids and approves them all, 10 clubs per request
     """
+    updates = WriteBatcher(clubs_table)
 
-    formula = FIND(STR_VALUE(query), FIELD("Club Name"))
-    clubs_data = clubs_table.all(formula=formula)
+    for club_id in club_ids:
+        club_data = find_club_by_id(club_id)
+
+        if club_data == None:
+            continue
+
+        updates.update(club_data["id"], {"Approved": True})
+
+    updates.flush()
 
-    return clubs_data
+
+def search_clubs(query: str, limit: int = 20):
+    """
+    This function takes a search query and returns a list of the clubs that match it best, best first
+    """
+    clubs_table.snapshot.ensure_fresh()
+
+    return [copy.deepcopy(club) for club in clubs_search.lookup(query, limit)]
 
 
 def leader_data_to_obj(leader: dict):
     """
     A simple function to convert leader data to a Leader object
     """
+    return map_leader(leader["fields"])
+
+
+def find_club_by_id(id) -> dict:
+    """
+    This function takes a club id (the ID field, not the airtable record id) and returns the club record
+    """
+    if mirror is not None:
+        clubs_table.snapshot.ensure_fresh()
+        return mirror.first(
+            clubs_table.table_name, "ID", int(id) if str(id).isdigit() else id
+        )
+
+    return next(iter(clubs_table.snapshot.lookup("id", str(id))), None)
+
+
+def find_leader_by_slack_id(slack_id: str) -> dict:
+    """
+    This function takes a slack user id and returns the leader record
+    """
+    if mirror is not None:
+        club_leaders.snapshot.ensure_fresh()
+        return mirror.first(club_leaders.table_name, "Slack ID", slack_id)
+
+    return next(iter(club_leaders.snapshot.lookup("slack_id", slack_id)), None)
 
-    return Leader(
-        name=leader["fields"]["Name"],
-        pronouns=leader["fields"]["Pronouns"]
-        if "Pronouns" in leader["fields"]
-        else None,
-        is_primary=leader["fields"]["Is Primary"]
-        if "Is Primary" in leader["fields"]
-        else False,
-        email=leader["fields"]["Email"]
-        if "Email" in leader["fields"] and "Email" in leader["fields"]["To Display"]
-        else None,
-        slack_id=leader["fields"]["Slack ID"]
-        if "Slack ID" in leader["fields"]
-        else None,
-        website=leader["fields"]["Website"] if "Website" in leader["fields"] else None,
-        scrapbook=leader["fields"]["Scrapbook"]
-        if "Scrapbook" in leader["fields"]
-        else None,
-        socials=Socials(
-            github=leader["fields"]["Github"]
-            if "Github" in leader["fields"]
-            and "Github" in leader["fields"]["To Display"]
-            else None,
-            linkedin=leader["fields"]["LinkedIn"]
-            if "LinkedIn" in leader["fields"]
-            and "LinkedIn" in leader["fields"]["To Display"]
-            else None,
-            twitter=leader["fields"]["Twitter"]
-            if "Twitter" in leader["fields"]
-            and "Twitter" in leader["fields"]["To Display"]
-            else None,
-        ),
+
+def slack_ids_str(slack_ids) -> str:
+    """
+    This function takes the Slack ID field of an old club, which may be a lookup list, and returns it as a string
+    """
+    if slack_ids is None:
+        return ""
+
+    if isinstance(slack_ids, list):
+        return ",".join(str(x) for x in slack_ids)
+
+    return str(slack_ids)
+
+
+async def refresh_tables_async(*tables: SnapshotTable):
+    """
+    This function syncs the snapshots of the given tables concurrently if they are stale
+    """
+    await asyncio.gather(
+        *(table.snapshot.ensure_fresh_async(airtable_async) for table in tables)
     )
+
+
+async def get_all_clubs_async():
+    """
+    This function returns a list of all the clubs, syncing through the async client
+    """
+    await refresh_tables_async(clubs_table, club_leaders)
+    return await get_all_clubs.get_async()
+
+
+async def get_leader_records_async():
+    """
+    This function returns (airtable record id, leader) for all the club leaders, syncing through the async client
+    """
+    await refresh_tables_async(club_leaders)
+    return await get_leader_records.get_async()
+
+
+async def get_old_clubs_async():
+    """
+    This function returns a list of all the old clubs, syncing through the async client
+    """
+    await refresh_tables_async(old_clubs_table)
+    return await get_old_clubs.get_async()
+
+
+async def get_club_by_name_async(name: str):
+    """
+    This function takes a club name and returns the club data, syncing through the async client
+    """
+    await refresh_tables_async(clubs_table, club_leaders)
+    return get_club_by_name(name)
+
+
+async def get_club_by_id_async(id: int):
+    """
+    This function takes a club id and returns the club data, syncing through the async client
+    """
+    await refresh_tables_async(clubs_table, club_leaders)
+    return get_club_by_id(id)
+
+
+async def search_clubs_async(query: str, limit: int = 20):
+    """
+    This function takes a search query and returns the displayed clubs that match it best, syncing through the async client
+    """
+    await refresh_tables_async(clubs_table, club_leaders)
+
+    clubs_data = [
+        club
+        for club in clubs_search.lookup(query, limit=None)
+        if club["fields"].get("To Display") and club["fields"].get("Approved")
+    ]
+
+    return hydrate_clubs(clubs_data[:limit])
+
+
+async def autocomplete_clubs_async(prefix: str, limit: int = 10):
+    """
+    This function takes a prefix and returns the club, venue and location names starting with it, syncing through the async client
+    """
+    await refresh_tables_async(clubs_table, old_clubs_table)
+    autocomplete = await get_autocomplete.get_async()
+    return autocomplete.complete(prefix, limit)
+
+
+async def nearby_clubs_async(latitude: float, longitude: float, radius_km: float, limit: int = 20):
+    """
+    This function takes a location and returns the clubs and old clubs within radius_km of it, closest first,
+    syncing through the async client
+    """
+    await refresh_tables_async(clubs_table, old_clubs_table)
+    place_index = await get_place_index.get_async()
+    return place_index.nearby(latitude, longitude, radius_km, limit)
+
+
+async def get_map_clusters_async(
+    min_lon: float, min_lat: float, max_lon: float, max_lat: float, zoom: int
+):
+    """
+    This function takes a bounding box and zoom level and returns the clusters and clubs to show in it,
+    syncing through the async client
+    """
+    await refresh_tables_async(clubs_table, old_clubs_table)
+    cluster_index = await get_cluster_index.get_async()
+    return cluster_index.get_clusters(min_lon, min_lat, max_lon, max_lat, zoom)
+
+
+async def get_clubs_in_bbox_async(
+    min_lat: float, min_lon: float, max_lat: float, max_lon: float
+):
+    """
+    This function takes a bounding box and returns every club inside it, syncing through the async client.
+    A box with min_lon > max_lon crosses the antimeridian.
+    """
+    await refresh_tables_async(clubs_table, club_leaders)
+
+    clubs, grid = await get_club_grid.get_async()
+    indexes = grid.in_bbox(min_lat, min_lon, max_lat, max_lon)
+
+    return [clubs[index] for index in indexes.tolist()]
+
+
+async def get_tile_async(z: int, x: int, y: int) -> bytes:
+    """
+    This function takes tile coordinates and returns the encoded vector tile, syncing through the async client
+    """
+    await refresh_tables_async(clubs_table, old_clubs_table)
+
+    tile_index = await get_tile_index.get_async()
+    return tile_index.tile(z, x, y)
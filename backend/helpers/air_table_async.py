@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import os
+from typing import List, Optional
+from urllib.parse import quote
+
+import httpx
+from dotenv import load_dotenv
+
+from helpers.rate_limit import (AIRTABLE_MAX_RETRIES, is_rate_limited,
+                                retry_delay, scheduler)
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Size of the keep-alive connection pool shared by every request to Airtable
+AIRTABLE_MAX_CONNECTIONS = int(os.environ.get("AIRTABLE_MAX_CONNECTIONS", 10))
+
+
+class AsyncAirtable:
+    """
+    An asyncio Airtable client, every request goes through one pooled keep-alive httpx client
+    """
+
+    API_URL = "https://api.airtable.com/v0"
+
+    def __init__(
+        self,
+        api_key: str,
+        base_id: str,
+        max_connections: int = AIRTABLE_MAX_CONNECTIONS,
+        timeout: float = 30,
+    ):
+        self.api_key = api_key
+        self.base_id = base_id
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """
+        The httpx client is created on first use so it belongs to the running event loop
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                timeout=self.timeout,
+            )
+
+        return self._client
+
+    def table_url(self, table_name: str) -> str:
+        return f"{self.API_URL}/{self.base_id}/{quote(table_name, safe='')}"
+
+    async def all(
+        self,
+        table_name: str,
+        formula: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+    ) -> List[dict]:
+        """
+        This function takes a table name and returns every record in it, following Airtable's pagination
+        """
+        params = []
+        if formula:
+            params.append(("filterByFormula", formula))
+        for field in fields or []:
+            params.append(("fields[]", field))
+
+        records = []
+        offset = None
+
+        while True:
+            page_params = params + [("offset", offset)] if offset else params
+
+            data = await self.request("GET", self.table_url(table_name), page_params)
+
+            records.extend(data.get("records", []))
+            offset = data.get("offset")
+
+            if not offset:
+                return records
+
+    async def request(self, method: str, url: str, params=None) -> dict:
+        """
+        This function sends a request through the scheduler, backing off and retrying when Airtable returns a 429
+        """
+        attempt = 0
+
+        while True:
+            await scheduler.acquire_async()
+
+            response = await self.client.request(method, url, params=params)
+
+            try:
+                response.raise_for_status()
+                return response.json()
+            except httpx.HTTPStatusError as exc:
+                if not is_rate_limited(exc) or attempt >= AIRTABLE_MAX_RETRIES:
+                    raise
+
+            attempt += 1
+            logger.warning(f"Airtable rate limited a request, retry {attempt}")
+            await asyncio.sleep(retry_delay(attempt))
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
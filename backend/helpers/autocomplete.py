@@ -0,0 +1,63 @@
+from bisect import bisect_left
+from typing import Iterable, List, Tuple
+
+from helpers.search import normalize
+
+
+class Autocomplete:
+    """
+    Sorted arrays of normalized names to complete prefixes against with a binary search.
+    Names starting with the prefix come first, then names with a later word starting with it.
+    Build a new one when the names change, it is never modified.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, str]]):
+        """
+        entries are (text, kind) pairs, kind says what the text is, like "club" or "venue"
+        """
+        full = set()
+        words = set()
+
+        for text, kind in entries:
+            if not text:
+                continue
+
+            key = normalize(text)
+            full.add((key, text, kind))
+
+            # every later word start, so "robo" finds "Club 1 Robotics"
+            for i in range(1, len(key)):
+                if key[i - 1] == " " and key[i] != " ":
+                    words.add((key[i:], text, kind))
+
+        self.full = sorted(full)
+        self.words = sorted(words)
+
+    def complete(self, prefix: str, limit: int = 10) -> List[dict]:
+        """
+        This function takes a prefix and returns up to limit suggestions, as dicts with text and kind
+        """
+        prefix = normalize(prefix).strip()
+
+        if not prefix:
+            return []
+
+        suggestions = []
+        seen = set()
+
+        for entries in (self.full, self.words):
+            i = bisect_left(entries, (prefix,))
+
+            while i < len(entries) and len(suggestions) < limit:
+                key, text, kind = entries[i]
+
+                if not key.startswith(prefix):
+                    break
+
+                if (text, kind) not in seen:
+                    seen.add((text, kind))
+                    suggestions.append({"text": text, "kind": kind})
+
+                i += 1
+
+        return suggestions
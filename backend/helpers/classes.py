@@ -1,14 +1,18 @@
 from typing import List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+
+# Fields set airtable= to the column they are read from and display_field= to the multiple select
+# column that decides whether they are shown, see helpers/fields.py
 
 
 class Coordinates(BaseModel):
     """
     A class to represent the coordinates of a location
     """
-    latitude: float
-    longitude: float
+    latitude: float = Field(..., airtable="Latitude")
+    longitude: float = Field(..., airtable="Longitude")
 
 
 class GeoData(BaseModel):
@@ -16,57 +20,91 @@ class GeoData(BaseModel):
     A class to represent the geographical data of a location
     """
     coordinates: Coordinates
-    state: Optional[str]
-    state_iso_code: Optional[str]
-    country: str
-    country_code: str
-    postcode: Optional[str]
-    continent: str
+    state: Optional[str] = Field(None, airtable="State")
+    state_iso_code: Optional[str] = Field(None, airtable="State ISO Code")
+    country: Optional[str] = Field(None, airtable="Country")
+    country_code: Optional[str] = Field(None, airtable="Country Code")
+    postcode: Optional[str] = Field(None, airtable="Postcode")
+    continent: Optional[str] = Field(None, airtable="Continent")
 
 
 class Socials(BaseModel):
     """
     A class to represent the social media links of a club or leader
     """
-    github: Optional[str]
-    linkedin: Optional[str]
-    twitter: Optional[str]
+    github: Optional[str] = Field(None, airtable="Github")
+    linkedin: Optional[str] = Field(None, airtable="LinkedIn")
+    twitter: Optional[str] = Field(None, airtable="Twitter")
 
 
 class Leader(BaseModel):
     """
     A class to represent a club leader
     """
-    name: str
-    pronouns: Optional[str]
-    is_primary: bool
-    email: str
-    slack_id: str
-    website: Optional[str]
-    scrapbook: Optional[str]
-    socials: Socials
+    name: str = Field(..., airtable="Name")
+    pronouns: Optional[str] = Field(None, airtable="Pronouns")
+    is_primary: bool = Field(..., airtable="Is Primary")
+    email: Optional[str] = Field(None, airtable="Email", display_field="To Display")
+    slack_id: Optional[str] = Field(None, airtable="Slack ID")
+    website: Optional[str] = Field(None, airtable="Website")
+    scrapbook: Optional[str] = Field(None, airtable="Scrapbook")
+    socials: Socials = Field(..., display_field="To Display")
 
 
 class ClubElement(BaseModel):
     """
     A class to represent a club
     """
-    id: int
-    name: str
-    to_display: bool
-    approved: bool
-    description: Optional[str]
-    website: Optional[str]
-    scrapbook: Optional[str]
-    venue: str
-    location: str
+    id: int = Field(..., airtable="ID")
+    name: str = Field(..., airtable="Club Name")
+    to_display: bool = Field(..., airtable="To Display")
+    approved: bool = Field(..., airtable="Approved")
+    description: Optional[str] = Field(None, airtable="Description")
+    website: Optional[str] = Field(None, airtable="Website")
+    scrapbook: Optional[str] = Field(None, airtable="Scrapbook")
+    venue: str = Field(..., airtable="Venue")
+    location: str = Field(..., airtable="Location")
     geo_data: GeoData
-    socials: Socials
-    leaders: List[Leader]
+    socials: Socials = Field(..., display_field="Socials to Display")
+    leaders: List[Leader] = Field(..., airtable="Leaders Directory Link")
 
 
 class OldClub(BaseModel):
-    name: str
+    name: str = Field(..., airtable="Venue")
     coordinates: Optional[Coordinates]
-    country: Optional[str]
-    continent: Optional[str]
+    country: Optional[str] = Field(None, airtable="Address Country")
+    continent: Optional[str] = Field(None, airtable="Continent")
+
+
+class Suggestion(BaseModel):
+    """
+    A class to represent an autocomplete suggestion, kind is one of club, venue, location or old_club
+    """
+    text: str
+    kind: str
+
+
+class NearbyClub(BaseModel):
+    """
+    A class to represent a club or old club near a location, id is only set for clubs
+    """
+    id: Optional[int]
+    name: str
+    kind: str
+    latitude: float
+    longitude: float
+    distance_km: float
+
+
+class MapFeature(BaseModel):
+    """
+    A class to represent a marker on the map, kind is cluster, club or old_club.
+    Clusters have how many places they hold in count and the zoom level they split up at in expansion_zoom.
+    """
+    id: Optional[int]
+    name: Optional[str]
+    kind: str
+    latitude: float
+    longitude: float
+    count: int
+    expansion_zoom: Optional[int]
@@ -0,0 +1,160 @@
+import math
+from typing import List
+
+import numpy as np
+
+# Web Mercator can't show the poles, latitudes are clamped to what a square map covers
+MAX_LATITUDE = 85.05112878
+
+CLUSTER_MIN_ZOOM = 0
+# Above this zoom every point is returned on its own
+CLUSTER_MAX_ZOOM = 16
+# Points closer than this many pixels on a 256px tile are merged
+CLUSTER_RADIUS_PX = 60
+TILE_EXTENT = 256
+
+
+def mercator_x(longitude: float) -> float:
+    return longitude / 360 + 0.5
+
+
+def mercator_y(latitude: float) -> float:
+    latitude = max(-MAX_LATITUDE, min(MAX_LATITUDE, latitude))
+    sin = math.sin(math.radians(latitude))
+    return 0.5 - 0.25 * math.log((1 + sin) / (1 - sin)) / math.pi
+
+
+def mercator_longitude(x: float) -> float:
+    return (x - 0.5) * 360
+
+
+def mercator_latitude(y: float) -> float:
+    return math.degrees(2 * math.atan(math.exp((0.5 - y) * 2 * math.pi)) - math.pi / 2)
+
+
+class ClusterLevel:
+    """
+    The clusters and lone points at one zoom level, sorted by x so a viewport is a binary search plus a filter.
+    Every item is (x, y, count, ref, expansion_zoom), ref is the index of the place for lone points.
+    """
+
+    def __init__(self, items: list):
+        self.items = sorted(items, key=lambda item: item[0])
+        self.xs = np.array([item[0] for item in self.items], dtype=float)
+        self.ys = np.array([item[1] for item in self.items], dtype=float)
+
+    def within(self, min_x: float, min_y: float, max_x: float, max_y: float) -> list:
+        start = np.searchsorted(self.xs, min_x, side="left")
+        end = np.searchsorted(self.xs, max_x, side="right")
+        ys = self.ys[start:end]
+        hits = np.nonzero((ys >= min_y) & (ys <= max_y))[0] + start
+
+        return [self.items[i] for i in hits.tolist()]
+
+
+class ClusterIndex:
+    """
+    Clusters places for every zoom level ahead of time, the same way supercluster does: each level is built from the
+    one above it by greedily merging items within the cluster radius, found through a grid of radius sized cells.
+    Places are dicts with at least latitude and longitude. Build a new one when the places change.
+    """
+
+    def __init__(
+        self,
+        places: List[dict],
+        min_zoom: int = CLUSTER_MIN_ZOOM,
+        max_zoom: int = CLUSTER_MAX_ZOOM,
+        radius_px: float = CLUSTER_RADIUS_PX,
+    ):
+        self.places = places
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+
+        items = [
+            (mercator_x(place["longitude"]), mercator_y(place["latitude"]), 1, i, None)
+            for i, place in enumerate(places)
+        ]
+
+        # zoom -> ClusterLevel, max_zoom + 1 holds the places themselves
+        self.levels = {max_zoom + 1: ClusterLevel(items)}
+
+        for zoom in range(max_zoom, min_zoom - 1, -1):
+            items = self._cluster(items, radius_px / (TILE_EXTENT * 2**zoom), zoom)
+            self.levels[zoom] = ClusterLevel(items)
+
+    def _cluster(self, items: list, radius: float, zoom: int) -> list:
+        grid = {}
+        for i, (x, y, *_) in enumerate(items):
+            grid.setdefault((int(x // radius), int(y // radius)), []).append(i)
+
+        merged = [False] * len(items)
+        clusters = []
+        radius_squared = radius * radius
+
+        for i, (x, y, count, ref, expansion_zoom) in enumerate(items):
+            if merged[i]:
+                continue
+            merged[i] = True
+
+            cell_x, cell_y = int(x // radius), int(y // radius)
+            total = count
+            sum_x, sum_y = x * count, y * count
+
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    for j in grid.get((cell_x + dx, cell_y + dy), ()):
+                        if merged[j]:
+                            continue
+
+                        other_x, other_y, other_count = items[j][:3]
+                        if (other_x - x) ** 2 + (other_y - y) ** 2 > radius_squared:
+                            continue
+
+                        merged[j] = True
+                        total += other_count
+                        sum_x += other_x * other_count
+                        sum_y += other_y * other_count
+
+            if total == count:
+                # nothing close enough, carried down unchanged
+                clusters.append((x, y, count, ref, expansion_zoom))
+            else:
+                clusters.append((sum_x / total, sum_y / total, total, None, zoom + 1))
+
+        return clusters
+
+    def get_clusters(
+        self, min_lon: float, min_lat: float, max_lon: float, max_lat: float, zoom: int
+    ) -> List[dict]:
+        """
+        This function returns the clusters and places inside a bounding box at a zoom level.
+        A box with min_lon > max_lon crosses the antimeridian.
+        """
+        level = self.levels[max(self.min_zoom, min(zoom, self.max_zoom + 1))]
+
+        min_y, max_y = mercator_y(max_lat), mercator_y(min_lat)
+
+        if min_lon > max_lon:
+            items = level.within(mercator_x(min_lon), min_y, 1, max_y) + level.within(
+                0, min_y, mercator_x(max_lon), max_y
+            )
+        else:
+            items = level.within(mercator_x(min_lon), min_y, mercator_x(max_lon), max_y)
+
+        return [self._feature(item) for item in items]
+
+    def _feature(self, item) -> dict:
+        x, y, count, ref, expansion_zoom = item
+
+        if ref is not None:
+            return dict(self.places[ref], count=1, expansion_zoom=None)
+
+        return {
+            "id": None,
+            "name": None,
+            "kind": "cluster",
+            "latitude": mercator_latitude(y),
+            "longitude": mercator_longitude(x),
+            "count": count,
+            "expansion_zoom": expansion_zoom,
+        }
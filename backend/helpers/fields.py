@@ -0,0 +1,38 @@
+from typing import List, Type
+
+from pydantic import BaseModel
+
+from helpers.classes import ClubElement, Leader, OldClub
+
+
+def airtable_fields(model: Type[BaseModel]) -> List[str]:
+    """
+    This function takes a model and returns the Airtable columns it is read from, in order.
+    Nested models without an airtable= column of their own are read from the same record, so their columns are included.
+    """
+    fields = []
+
+    for field in model.__fields__.values():
+        extra = field.field_info.extra
+
+        if "airtable" in extra:
+            fields.append(extra["airtable"])
+        elif isinstance(field.type_, type) and issubclass(field.type_, BaseModel):
+            fields.extend(airtable_fields(field.type_))
+
+        if "display_field" in extra:
+            fields.append(extra["display_field"])
+
+    return list(dict.fromkeys(fields))
+
+
+# The columns each table is synced with. Anything the API, the bot or the scripts read from a record has to be listed here,
+# on top of what the models need.
+
+CLUB_FIELDS = airtable_fields(ClubElement)
+
+# "Club Link" is what leaders are indexed by
+LEADER_FIELDS = airtable_fields(Leader) + ["Club Link"]
+
+# "Status" decides whether an old club is shown, "Slack ID" is how the bot finds a leader's old club
+OLD_CLUB_FIELDS = airtable_fields(OldClub) + ["Status", "Slack ID"]
@@ -1,27 +1,154 @@
-import random
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional, Tuple
 
 import pycountry_convert as pc
+from dotenv import load_dotenv
 from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
+from geopy.exc import GeocoderServiceError, GeocoderTimedOut, GeocoderUnavailable
 
-# The random integer is to prevent the user agent from being the same every time and getting blocked
-geolocator = Nominatim(user_agent=f"geoapiExercise{random.randint(0, 1000)}")
+from helpers.geocode_cache import GeocodeCache
+from helpers.offline_geocoder import OfflineGeocoder
+from helpers.rate_limit import TokenBucket, retry_delay
 
+load_dotenv()
 
-def lookup_lat_long(latitude: float, longitude: float):
+# "nominatim" always asks Nominatim, "offline" looks coordinates up in the bundled places dataset first.
+# Offline results have no postcode, and fall back to Nominatim when there's no place nearby or it has no
+# ISO code, unless GEOCODER_FALLBACK is false
+GEOCODER = os.environ.get("GEOCODER", "nominatim")
+GEOCODER_FALLBACK = os.environ.get("GEOCODER_FALLBACK", "true").lower() == "true"
+OFFLINE_GEOCODER_MAX_KM = float(os.environ.get("OFFLINE_GEOCODER_MAX_KM", 100))
+
+offline_geocoder = OfflineGeocoder(max_distance_km=OFFLINE_GEOCODER_MAX_KM)
+
+# Reverse geocoding results are cached on disk, 4 decimal places is about 11 metres.
+# docker-compose keeps the file on the geocode-cache volume, shared by the api and the bot
+GEOCODE_CACHE_PATH = os.environ.get("GEOCODE_CACHE_PATH", "geocode.sqlite3")
+GEOCODE_CACHE_PRECISION = int(os.environ.get("GEOCODE_CACHE_PRECISION", 4))
+GEOCODE_CACHE_TTL_DAYS = float(os.environ.get("GEOCODE_CACHE_TTL_DAYS", 90))
+GEOCODE_CACHE_MAX_ENTRIES = int(os.environ.get("GEOCODE_CACHE_MAX_ENTRIES", 100000))
+
+geocode_cache = GeocodeCache(
+    GEOCODE_CACHE_PATH,
+    GEOCODE_CACHE_PRECISION,
+    GEOCODE_CACHE_TTL_DAYS * 24 * 60 * 60,
+    GEOCODE_CACHE_MAX_ENTRIES,
+)
+
+# Nominatim's usage policy asks for an identifying user agent and at most one request per second
+NOMINATIM_USER_AGENT = os.environ.get("NOMINATIM_USER_AGENT", "hackclub-clubsdirectory")
+NOMINATIM_RATE_LIMIT = float(os.environ.get("NOMINATIM_RATE_LIMIT", 1))
+
+# How long a single lookup may take, retries included, before it gives up
+GEOCODE_TIMEOUT_SECONDS = float(os.environ.get("GEOCODE_TIMEOUT_SECONDS", 30))
+GEOCODE_WORKERS = int(os.environ.get("GEOCODE_WORKERS", 4))
+
+geolocator = Nominatim(user_agent=NOMINATIM_USER_AGENT)
+nominatim_bucket = TokenBucket(NOMINATIM_RATE_LIMIT, 1)
+
+
+def lookup_lat_long(
+    latitude: float, longitude: float, timeout: float = GEOCODE_TIMEOUT_SECONDS
+) -> dict:
     """
-    This function takes a latitude and longitude and returns the location
+    This function takes a latitude and longitude and returns the location, or an empty dict if it couldn't be
+    looked up within timeout seconds.
+    Offline results have no postcode, Nominatim results are cached so a place is only sent to it once.
     """
+    offline = None
+
+    if GEOCODER == "offline":
+        offline = offline_geocoder.reverse(latitude, longitude)
+
+        if offline != None and ("ISO3166-2-lvl4" in offline or not GEOCODER_FALLBACK):
+            return offline
+
+        if not GEOCODER_FALLBACK:
+            return {}
+
+    address = geocode_cache.get(latitude, longitude)
+
+    if address != None:
+        return address
+
+    address = reverse_nominatim(latitude, longitude, time.monotonic() + timeout)
+
+    if address == None:
+        # the country is still better than nothing
+        return offline or {}
+
+    geocode_cache.set(latitude, longitude, address)
+
+    return address
+
+
+def reverse_nominatim(latitude: float, longitude: float, deadline: float) -> Optional[dict]:
+    """
+    This function asks Nominatim for the address of a latitude and longitude, backing off exponentially while it
+    times out or is unavailable. It returns None if the deadline (a time.monotonic() value) passes first.
+    """
+    attempt = 0
+
     while True:
+        # wait for our turn under the rate limit, unless that would take us past the deadline
+        wait = nominatim_bucket.try_acquire()
+        while wait > 0:
+            if time.monotonic() + wait > deadline:
+                return None
+            time.sleep(wait)
+            wait = nominatim_bucket.try_acquire()
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+
         try:
-            geolocator.user_agent = f"geoapiExercise{random.randint(0, 1000)}"
             location = geolocator.reverse(
-                f"{latitude}, {longitude}", language='en-US')
-            break
-        except (GeocoderTimedOut, GeocoderUnavailable):
-            print("Geocoder timed out, retrying...")
-            continue
-    return location.raw['address']
+                f"{latitude}, {longitude}", language='en-US', timeout=min(remaining, 10))
+            return location.raw['address'] if location != None else None
+        except (GeocoderTimedOut, GeocoderUnavailable, GeocoderServiceError):
+            attempt += 1
+            delay = retry_delay(attempt)
+
+            if time.monotonic() + delay > deadline:
+                print("Geocoder timed out, giving up")
+                return None
+
+            print(f"Geocoder timed out, retrying in {delay:.1f}s...")
+            time.sleep(delay)
+
+
+def lookup_lat_longs(
+    items: Iterable,
+    coordinates: Callable[..., Tuple[float, float]],
+    workers: int = GEOCODE_WORKERS,
+    timeout: float = GEOCODE_TIMEOUT_SECONDS,
+) -> Iterator[tuple]:
+    """
+    This function takes an iterable of items (records for example) and a function returning an item's latitude
+    and longitude, and yields (item, location) pairs in order as they are looked up.
+    Lookups run on a pool of workers sharing Nominatim's rate limit, each with its own timeout, and location is
+    an empty dict for the ones that failed so the rest still come through.
+    At most twice as many items as there are workers are in flight, so long inputs are streamed.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight = deque()
+
+        for item in items:
+            in_flight.append(
+                (item, executor.submit(lookup_lat_long, *coordinates(item), timeout))
+            )
+
+            if len(in_flight) >= workers * 2:
+                item, future = in_flight.popleft()
+                yield item, future.result()
+
+        while in_flight:
+            item, future = in_flight.popleft()
+            yield item, future.result()
 
 
 def get_continent(country_code: str) -> str:
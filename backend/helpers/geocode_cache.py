@@ -0,0 +1,113 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS geocodes (
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL,
+    address TEXT NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (latitude, longitude)
+);
+CREATE INDEX IF NOT EXISTS geocodes_last_used ON geocodes (last_used);
+"""
+
+
+class GeocodeCache:
+    """
+    Reverse geocoding results kept in a local SQLite file, keyed by coordinates rounded to precision decimal places.
+    Entries expire after ttl seconds and the least recently used ones are evicted past max_entries.
+    The file isn't opened until the first lookup, so importing the geocoder doesn't create it.
+    """
+
+    def __init__(self, path: str, precision: int, ttl: float, max_entries: int):
+        self.path = path
+        self.precision = precision
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._has_schema = False
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        SQLite connections can't be shared between threads, so every thread gets its own
+        """
+        connection = getattr(self._local, "connection", None)
+
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA synchronous=NORMAL")
+
+            with self._schema_lock:
+                if not self._has_schema:
+                    # WAL sticks to the file, and threads switching to it at once fail with "database is locked"
+                    connection.execute("PRAGMA journal_mode=WAL")
+                    with connection:
+                        connection.executescript(SCHEMA)
+                    self._has_schema = True
+
+            self._local.connection = connection
+
+        return connection
+
+    def key(self, latitude: float, longitude: float):
+        return (
+            round(float(latitude), self.precision),
+            round(float(longitude), self.precision),
+        )
+
+    def get(self, latitude: float, longitude: float) -> Optional[dict]:
+        """
+        This function takes a latitude and longitude and returns the cached address, or None if it isn't cached
+        """
+        key = self.key(latitude, longitude)
+        now = time.time()
+
+        with self._connection() as connection:
+            row = connection.execute(
+                "SELECT address, created FROM geocodes WHERE latitude = ? AND longitude = ?",
+                key,
+            ).fetchone()
+
+            if row == None:
+                return None
+
+            address, created = row
+
+            if now - created > self.ttl:
+                connection.execute(
+                    "DELETE FROM geocodes WHERE latitude = ? AND longitude = ?", key
+                )
+                return None
+
+            connection.execute(
+                "UPDATE geocodes SET last_used = ? WHERE latitude = ? AND longitude = ?",
+                (now, *key),
+            )
+
+        return json.loads(address)
+
+    def set(self, latitude: float, longitude: float, address: dict):
+        """
+        This function caches the address for a latitude and longitude, evicting the least recently used entries if full
+        """
+        now = time.time()
+
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO geocodes (latitude, longitude, address, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (*self.key(latitude, longitude), json.dumps(address), now, now),
+            )
+            connection.execute(
+                """
+                DELETE FROM geocodes WHERE rowid IN (
+                    SELECT rowid FROM geocodes ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
@@ -0,0 +1,94 @@
+from typing import Callable, Optional, Type
+
+from pydantic import BaseModel
+from pydantic.fields import SHAPE_SINGLETON
+
+from helpers.classes import ClubElement, Leader, OldClub
+
+
+def compile_mapper(
+    model: Type[BaseModel], display_field: Optional[str] = None
+) -> Callable[..., BaseModel]:
+    """
+    This function takes a model whose fields are annotated with their Airtable columns (see helpers/classes.py)
+    and returns a function turning a record's fields into an instance of it.
+    The work of reading the annotations is done once here, and instances are built like construct() does since
+    Airtable data is trusted, so converting a record is a handful of dict lookups.
+
+    Missing columns become False for bools and the field default otherwise, which is None for required fields
+    too since nothing is validated, so fields whose column can be empty or hidden are Optional on the model.
+    Columns holding a lookup list are unwrapped to their first value unless the field is a list.
+    display_field is the multiple select column gating every column of the model, a field can set its own
+    with display_field=.
+    Link fields (a list of models) are left empty, pass their value to the returned function instead.
+    """
+    steps = []
+
+    for name, field in model.__fields__.items():
+        extra = field.field_info.extra
+        gate = extra.get("display_field", display_field)
+        is_model = isinstance(field.type_, type) and issubclass(field.type_, BaseModel)
+
+        if "airtable" not in extra:
+            steps.append((name, compile_mapper(field.type_, gate)))
+        elif is_model:
+            steps.append((name, _empty_list))
+        else:
+            steps.append(
+                (
+                    name,
+                    _column(
+                        extra["airtable"],
+                        False if field.type_ is bool else field.default,
+                        field.shape != SHAPE_SINGLETON,
+                        gate,
+                    ),
+                )
+            )
+
+    fields_set = frozenset(model.__fields__)
+
+    def map_record(fields: dict, **overrides) -> BaseModel:
+        # built in field order so the model serializes the same way a validated one does
+        values = {
+            name: overrides[name] if name in overrides else step(fields)
+            for name, step in steps
+        }
+
+        # what construct() does, minus the per field default handling since every field is set above
+        instance = model.__new__(model)
+        object.__setattr__(instance, "__dict__", values)
+        object.__setattr__(instance, "__fields_set__", set(fields_set))
+        return instance
+
+    map_record.__name__ = f"map_{model.__name__}"
+
+    return map_record
+
+
+def _empty_list(fields: dict) -> list:
+    return []
+
+
+def _column(column: str, default, is_list: bool, gate: Optional[str]):
+    """
+    Returns the extractor for a single column
+    """
+
+    def extract(fields: dict):
+        value = fields.get(column, default)
+
+        if gate is not None and column not in fields.get(gate, ()):
+            return default
+
+        if not is_list and isinstance(value, list):
+            return value[0] if value else default
+
+        return value
+
+    return extract
+
+
+map_club = compile_mapper(ClubElement)
+map_leader = compile_mapper(Leader)
+map_old_club = compile_mapper(OldClub)
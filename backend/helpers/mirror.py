@@ -0,0 +1,169 @@
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from typing import List, Optional
+
+# Fields the mirror keeps an index on, mapped to their JSON path inside a stored record
+INDEXED_FIELDS = {
+    "Club Name": '$.fields."Club Name"',
+    "ID": '$.fields."ID"',
+    "Slack ID": '$.fields."Slack ID"',
+    "Club Link": '$.fields."Club Link"[0]',
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    table_name TEXT NOT NULL,
+    id TEXT NOT NULL,
+    record TEXT NOT NULL,
+    PRIMARY KEY (table_name, id)
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    table_name TEXT PRIMARY KEY,
+    last_sync TEXT NOT NULL,
+    last_full_sync TEXT NOT NULL
+);
+"""
+
+
+class SQLiteMirror:
+    """
+    A copy of the Airtable base in a local SQLite file, indexed on the fields we look records up by.
+    It is kept up to date by the table snapshots and survives restarts, so a new process can start warm.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+        connection = self._connection()
+        connection.executescript(SCHEMA)
+        for field, json_path in INDEXED_FIELDS.items():
+            index_name = "records_" + field.lower().replace(" ", "_")
+            connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {index_name} ON records (table_name, json_extract(record, '{json_path}'))"
+            )
+        connection.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        SQLite connections can't be shared between threads, so every thread gets its own
+        """
+        connection = getattr(self._local, "connection", None)
+
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+
+        return connection
+
+    def load(self, table_name: str) -> List[dict]:
+        """
+        This function takes a table name and returns every record stored for it
+        """
+        rows = self._connection().execute(
+            "SELECT record FROM records WHERE table_name = ?", (table_name,)
+        )
+        return [json.loads(row[0]) for row in rows]
+
+    def replace(self, table_name: str, records: List[dict]):
+        """
+        This function replaces every record stored for a table
+        """
+        with self._connection() as connection:
+            connection.execute("DELETE FROM records WHERE table_name = ?", (table_name,))
+            connection.executemany(
+                "INSERT INTO records (table_name, id, record) VALUES (?, ?, ?)",
+                [(table_name, record["id"], json.dumps(record)) for record in records],
+            )
+
+    def upsert(self, table_name: str, records: List[dict]):
+        """
+        This function adds or replaces the given records
+        """
+        with self._connection() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO records (table_name, id, record) VALUES (?, ?, ?)",
+                [(table_name, record["id"], json.dumps(record)) for record in records],
+            )
+
+    def delete(self, table_name: str, record_ids: List[str]):
+        """
+        This function removes the given records
+        """
+        with self._connection() as connection:
+            connection.executemany(
+                "DELETE FROM records WHERE table_name = ? AND id = ?",
+                [(table_name, record_id) for record_id in record_ids],
+            )
+
+    def first(self, table_name: str, field: str, value) -> Optional[dict]:
+        """
+        This function takes a table name, an indexed field and a value and returns the first record with that value
+        """
+        row = self._connection().execute(
+            f"SELECT record FROM records WHERE table_name = ? AND json_extract(record, '{INDEXED_FIELDS[field]}') = ? LIMIT 1",
+            (table_name, value),
+        ).fetchone()
+
+        if row == None:
+            return None
+
+        return json.loads(row[0])
+
+    def find(self, table_name: str, field: str, value) -> List[dict]:
+        """
+        This function takes a table name, an indexed field and a value and returns every record with that value
+        """
+        rows = self._connection().execute(
+            f"SELECT record FROM records WHERE table_name = ? AND json_extract(record, '{INDEXED_FIELDS[field]}') = ?",
+            (table_name, value),
+        )
+        return [json.loads(row[0]) for row in rows]
+
+    def first_containing(self, table_name: str, field: str, value: str) -> Optional[dict]:
+        """
+        This function works like Airtable's FIND(), it returns the first record whose field contains the value.
+        An exact match is tried through the index before falling back to a scan.
+        """
+        record = self.first(table_name, field, value)
+
+        if record != None:
+            return record
+
+        row = self._connection().execute(
+            f"SELECT record FROM records WHERE table_name = ? AND instr(json_extract(record, '{INDEXED_FIELDS[field]}'), ?) > 0 LIMIT 1",
+            (table_name, value),
+        ).fetchone()
+
+        if row == None:
+            return None
+
+        return json.loads(row[0])
+
+    def get_sync_state(self, table_name: str):
+        """
+        This function takes a table name and returns the (last sync, last full sync) datetimes, or None if it was never synced
+        """
+        row = self._connection().execute(
+            "SELECT last_sync, last_full_sync FROM sync_state WHERE table_name = ?",
+            (table_name,),
+        ).fetchone()
+
+        if row == None:
+            return None
+
+        return datetime.fromisoformat(row[0]), datetime.fromisoformat(row[1])
+
+    def set_sync_state(self, table_name: str, last_sync: datetime, last_full_sync: datetime):
+        """
+        This function records when a table was last synced
+        """
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO sync_state (table_name, last_sync, last_full_sync) VALUES (?, ?, ?)",
+                (table_name, last_sync.isoformat(), last_full_sync.isoformat()),
+            )
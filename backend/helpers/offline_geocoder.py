@@ -0,0 +1,183 @@
+import csv
+import gzip
+import math
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+import pycountry
+
+PLACES_PATH = os.path.join(os.path.dirname(__file__), "data", "places.csv.gz")
+
+EARTH_RADIUS_KM = 6371.0
+
+# Ranges this small are scanned instead of split further
+KD_LEAF_SIZE = 8
+
+# Countries pycountry names differently from Nominatim's English results, so offline lookups
+# don't make the update scripts rewrite records Nominatim filled in before
+NOMINATIM_COUNTRY_NAMES = {
+    "BN": "Brunei",
+    "BQ": "Caribbean Netherlands",
+    "BS": "The Bahamas",
+    "CD": "Democratic Republic of the Congo",
+    "CG": "Congo-Brazzaville",
+    "CV": "Cape Verde",
+    "FK": "Falkland Islands",
+    "FM": "Federated States of Micronesia",
+    "GM": "The Gambia",
+    "MF": "Saint Martin",
+    "MO": "Macau",
+    "PN": "Pitcairn Islands",
+    "PS": "Palestinian Territory",
+    "RU": "Russia",
+    "SX": "Sint Maarten",
+    "TL": "East Timor",
+    "VA": "Vatican City",
+    "VG": "British Virgin Islands",
+    "VI": "United States Virgin Islands",
+}
+
+
+def to_xyz(latitude: float, longitude: float):
+    """
+    This function takes a latitude and longitude and returns the point on the unit sphere,
+    straight line distance between those grows with the distance along the earth and has no seam at the antimeridian
+    """
+    lat = math.radians(latitude)
+    lon = math.radians(longitude)
+    return (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+
+
+def chord_to_km(chord: float) -> float:
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+class KDTree:
+    """
+    A static k-d tree over 3D points, stored implicitly: the median of every range is its node,
+    the points before it the left subtree and the ones after it the right subtree
+    """
+
+    def __init__(self, points: np.ndarray):
+        order = np.arange(len(points))
+        stack = [(0, len(points), 0)]
+
+        while stack:
+            lo, hi, axis = stack.pop()
+
+            if hi - lo <= KD_LEAF_SIZE:
+                continue
+
+            mid = (lo + hi) // 2
+            sub = order[lo:hi]
+            order[lo:hi] = sub[np.argpartition(points[sub, axis], mid - lo)]
+
+            stack.append((lo, mid, (axis + 1) % 3))
+            stack.append((mid + 1, hi, (axis + 1) % 3))
+
+        self.order = order.tolist()
+        # plain lists are faster than numpy for the one point at a time access a search does
+        self.coords = [points[order, axis].tolist() for axis in range(3)]
+
+    def nearest(self, point) -> tuple:
+        """
+        This function takes a 3D point and returns (index of the nearest point, squared distance to it)
+        """
+        xs, ys, zs = self.coords
+        qx, qy, qz = point
+        best = [math.inf, -1]
+
+        def visit(i):
+            d = (xs[i] - qx) ** 2 + (ys[i] - qy) ** 2 + (zs[i] - qz) ** 2
+            if d < best[0]:
+                best[0] = d
+                best[1] = i
+
+        def search(lo, hi, axis):
+            if hi - lo <= KD_LEAF_SIZE:
+                for i in range(lo, hi):
+                    visit(i)
+                return
+
+            mid = (lo + hi) // 2
+            visit(mid)
+
+            diff = point[axis] - self.coords[axis][mid]
+            near, far = ((lo, mid), (mid + 1, hi)) if diff < 0 else ((mid + 1, hi), (lo, mid))
+            next_axis = (axis + 1) % 3
+
+            search(*near, next_axis)
+            if diff * diff < best[0]:
+                search(*far, next_axis)
+
+        search(0, len(xs), 0)
+
+        return self.order[best[1]], best[0]
+
+
+class OfflineGeocoder:
+    """
+    Reverse geocodes against the bundled places dataset (see scripts/build_places.py), without any network access.
+    The dataset and tree are loaded on first use.
+    """
+
+    def __init__(self, path: str = PLACES_PATH, max_distance_km: float = 100):
+        self.path = path
+        self.max_distance_km = max_distance_km
+        self.places = None
+        self.tree = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self.tree is not None:
+                return
+
+            with gzip.open(self.path, "rt", encoding="utf-8", newline="") as file:
+                places = [
+                    (row["cc"], row["admin1"], row["iso"], float(row["lat"]), float(row["lon"]))
+                    for row in csv.DictReader(file)
+                ]
+
+            lat = np.radians([place[3] for place in places])
+            lon = np.radians([place[4] for place in places])
+            points = np.column_stack(
+                (np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat))
+            )
+
+            self.places = places
+            self.tree = KDTree(points)
+
+    def reverse(self, latitude: float, longitude: float) -> Optional[dict]:
+        """
+        This function takes a latitude and longitude and returns the address fields Nominatim would
+        (country, country_code, state and ISO3166-2-lvl4 when known), or None if no place is close enough
+        """
+        if self.tree is None:
+            self.load()
+
+        index, distance = self.tree.nearest(to_xyz(float(latitude), float(longitude)))
+
+        if chord_to_km(math.sqrt(distance)) > self.max_distance_km:
+            return None
+
+        country_code, state, iso_code = self.places[index][:3]
+        country = pycountry.countries.get(alpha_2=country_code)
+
+        if country == None:
+            return None
+
+        address = {
+            "country": NOMINATIM_COUNTRY_NAMES.get(
+                country_code, getattr(country, "common_name", country.name)
+            ),
+            "country_code": country_code.lower(),
+        }
+        if state:
+            address["state"] = state
+        if iso_code:
+            address["ISO3166-2-lvl4"] = iso_code
+
+        return address
@@ -0,0 +1,119 @@
+import base64
+import json
+from typing import Optional, Tuple, Type
+
+from pydantic import BaseModel
+
+
+class PaginationError(ValueError):
+    pass
+
+
+def encode_cursor(offset: int, key) -> str:
+    payload = json.dumps([offset, key], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, object]:
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        offset, key = json.loads(payload)
+    except (TypeError, ValueError):
+        raise PaginationError("Invalid cursor")
+
+    if not isinstance(offset, int) or offset < 0:
+        raise PaginationError("Invalid cursor")
+
+    return offset, key
+
+
+def paginate(
+    items: list, keys: list, limit: int, cursor: Optional[str] = None
+) -> Tuple[list, Optional[str]]:
+    """
+    This function takes a list, the unique key of every item in it (in the same order), a page size and the cursor
+    from the previous page, and returns (the page, the cursor for the next one or None on the last page).
+    The cursor remembers the key of the last item it returned, so the next page still starts after it if items
+    before it were added or removed in between.
+    """
+    start = 0
+
+    if cursor:
+        offset, last = decode_cursor(cursor)
+        start = offset
+
+        if not (0 < offset <= len(keys) and keys[offset - 1] == last):
+            try:
+                start = keys.index(last) + 1
+            except ValueError:
+                # the last item is gone, the offset is the best guess
+                pass
+
+    page = items[start:start + limit]
+    end = start + len(page)
+
+    if end >= len(items) or not page:
+        return page, None
+
+    return page, encode_cursor(end, keys[end - 1])
+
+
+def parse_fields(fields: str, model: Type[BaseModel]) -> dict:
+    """
+    This function takes a comma separated list of fields, nested ones written like geo_data.country, and returns
+    them as a nested dict of field name -> sub fields (None for the whole field).
+    It raises a PaginationError if a field isn't on the model.
+    """
+    spec = {}
+
+    for path in fields.split(","):
+        path = path.strip()
+        if not path:
+            continue
+
+        current_model, current_spec = model, spec
+        names = path.split(".")
+
+        for depth, name in enumerate(names):
+            if current_model is None or name not in current_model.__fields__:
+                raise PaginationError(f"Unknown field {path}")
+
+            model_field = current_model.__fields__[name]
+            last = depth == len(names) - 1
+
+            if last:
+                current_spec[name] = None
+                break
+
+            if name in current_spec and current_spec[name] is None:
+                # the whole field was already asked for
+                break
+
+            nested = model_field.type_
+            current_model = (
+                nested if isinstance(nested, type) and issubclass(nested, BaseModel) else None
+            )
+            current_spec = current_spec.setdefault(name, {})
+
+    if not spec:
+        raise PaginationError("No fields given")
+
+    return spec
+
+
+def select_fields(value, spec: dict):
+    """
+    This function takes a JSON value (a dict or a list of dicts) and a spec from parse_fields
+    and returns it with only those fields
+    """
+    if isinstance(value, list):
+        return [select_fields(item, spec) for item in value]
+
+    if not isinstance(value, dict):
+        return value
+
+    return {
+        name: value[name] if sub_spec is None else select_fields(value[name], sub_spec)
+        for name, sub_spec in spec.items()
+        if name in value
+    }
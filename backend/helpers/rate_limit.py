@@ -0,0 +1,245 @@
+import asyncio
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import redis
+import requests
+from dotenv import load_dotenv
+from pyairtable import Table
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Airtable allows 5 requests per second per base, shared by the API, the bot and the scripts
+AIRTABLE_RATE_LIMIT = float(os.environ.get("AIRTABLE_RATE_LIMIT", 5))
+AIRTABLE_BURST = float(os.environ.get("AIRTABLE_BURST", 5))
+
+# Tokens background jobs must leave in the bucket, so interactive requests always have some budget left
+AIRTABLE_INTERACTIVE_RESERVE = float(os.environ.get("AIRTABLE_INTERACTIVE_RESERVE", 2))
+
+AIRTABLE_MAX_RETRIES = int(os.environ.get("AIRTABLE_MAX_RETRIES", 5))
+
+# How long to stick to the local bucket after Redis fails
+REDIS_RETRY_SECONDS = 30
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+_lane = contextvars.ContextVar("airtable_lane", default=INTERACTIVE)
+
+# Refills the bucket from Redis' clock so every container agrees on the time, returns how long to wait as a string
+# since Lua numbers are truncated to integers on the way out
+TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local reserve = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens - 1 >= reserve then
+    tokens = tokens - 1
+else
+    wait = (1 + reserve - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], 60)
+return tostring(wait)
+"""
+
+
+def set_lane(lane: str):
+    """
+    This function sets the lane Airtable requests made from the current context are scheduled in
+    """
+    _lane.set(lane)
+
+
+@contextmanager
+def use_lane(lane: str):
+    """
+    A context manager (or decorator) that schedules the Airtable requests made inside it in the given lane
+    """
+    token = _lane.set(lane)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+class TokenBucket:
+    """
+    An in-process token bucket, used when Redis isn't available
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, reserve: float = 0) -> float:
+        """
+        This function takes a token if more than reserve are left and returns 0, otherwise it returns how long to wait
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+
+            if self.tokens - 1 >= reserve:
+                self.tokens -= 1
+                return 0
+
+            return (1 + reserve - self.tokens) / self.rate
+
+
+class RedisTokenBucket:
+    """
+    A token bucket kept in Redis so every process talking to the same base shares one budget
+    """
+
+    def __init__(self, client: redis.Redis, key: str, rate: float, capacity: float):
+        self.client = client
+        self.key = key
+        self.rate = rate
+        self.capacity = capacity
+        self._script = client.register_script(TOKEN_BUCKET_LUA)
+
+    def try_acquire(self, reserve: float = 0) -> float:
+        return float(
+            self._script(keys=[self.key], args=[self.rate, self.capacity, reserve])
+        )
+
+
+class AirtableScheduler:
+    """
+    Schedules every Airtable request against a shared token bucket.
+    Interactive requests may use the whole bucket, background ones have to leave the reserve untouched,
+    so a batch job can never starve the bot.
+    """
+
+    def __init__(self, bucket, fallback: TokenBucket, reserve: float):
+        self.bucket = bucket
+        self.fallback = fallback
+        self.reserve = reserve
+        self._redis_down_until = 0.0
+
+    def wait_time(self, lane: str = None) -> float:
+        """
+        This function tries to take a token for the lane and returns how long to wait before trying again
+        """
+        reserve = self.reserve if (lane or _lane.get()) == BACKGROUND else 0
+
+        if self.bucket is not None and time.monotonic() > self._redis_down_until:
+            try:
+                return self.bucket.try_acquire(reserve)
+            except redis.RedisError:
+                self._redis_down_until = time.monotonic() + REDIS_RETRY_SECONDS
+                logger.warning(
+                    "Redis rate limit bucket unavailable, using the local one",
+                    exc_info=True,
+                )
+
+        return self.fallback.try_acquire(reserve)
+
+    def acquire(self, lane: str = None):
+        """
+        This function blocks until a request may be sent
+        """
+        lane = lane or _lane.get()
+
+        while True:
+            wait = self.wait_time(lane)
+            if wait <= 0:
+                return
+            time.sleep(wait * random.uniform(1, 1.2))
+
+    async def acquire_async(self, lane: str = None):
+        """
+        This function waits until a request may be sent without blocking the event loop
+        """
+        lane = lane or _lane.get()
+
+        while True:
+            wait = await asyncio.to_thread(self.wait_time, lane)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait * random.uniform(1, 1.2))
+
+
+def retry_delay(attempt: int) -> float:
+    """
+    This function takes how many times a request was rate limited and returns how long to back off for
+    """
+    return min(30, 2 ** attempt) * random.uniform(0.5, 1)
+
+
+def is_rate_limited(exc: Exception) -> bool:
+    """
+    This function returns whether an exception is Airtable rejecting a request with a 429
+    """
+    response = getattr(exc, "response", None)
+    return response is not None and response.status_code == 429
+
+
+class ScheduledTable(Table):
+    """
+    A pyairtable Table whose requests all go through the scheduler and are retried with backoff on a 429
+    """
+
+    # the scheduler paces requests, so pyairtable's own sleep between pages and batches isn't needed
+    API_LIMIT = 0
+
+    def _request(self, method: str, url: str, params=None, json_data=None):
+        attempt = 0
+
+        while True:
+            scheduler.acquire()
+
+            try:
+                return super()._request(method, url, params=params, json_data=json_data)
+            except requests.exceptions.HTTPError as exc:
+                if not is_rate_limited(exc) or attempt >= AIRTABLE_MAX_RETRIES:
+                    raise
+
+            attempt += 1
+            logger.warning(f"Airtable rate limited a request, retry {attempt}")
+            time.sleep(retry_delay(attempt))
+
+
+def create_scheduler() -> AirtableScheduler:
+    """
+    This function returns a scheduler sharing its bucket through Redis when REDIS_URL is set
+    """
+    bucket = None
+    redis_url = os.environ.get("REDIS_URL")
+
+    if redis_url:
+        bucket = RedisTokenBucket(
+            redis.Redis.from_url(redis_url),
+            "airtable-rate-limit:" + os.environ.get("AIRTABLE_BASE_ID", ""),
+            AIRTABLE_RATE_LIMIT,
+            AIRTABLE_BURST,
+        )
+
+    return AirtableScheduler(
+        bucket,
+        TokenBucket(AIRTABLE_RATE_LIMIT, AIRTABLE_BURST),
+        AIRTABLE_INTERACTIVE_RESERVE,
+    )
+
+
+scheduler = create_scheduler()
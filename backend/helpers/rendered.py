@@ -0,0 +1,256 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+from typing import Optional
+
+import brotli
+from dotenv import load_dotenv
+from fastapi.encoders import jsonable_encoder
+from fastapi_cache.coder import Coder
+from starlette.requests import Request
+from starlette.responses import Response
+
+load_dotenv()
+
+# Bodies smaller than this aren't worth compressing
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", 9))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", 11))
+# Bodies built for a single request (pages, sparse fields) are compressed on the spot, so faster
+DYNAMIC_COMPRESS_QUALITY = int(os.environ.get("DYNAMIC_COMPRESS_QUALITY", 5))
+
+# Content-Encoding -> the suffix its ETag gets, preferred first
+ENCODINGS = {"br": "br", "gzip": "gz"}
+
+
+def make_etag(*parts: bytes) -> str:
+    """
+    This function takes some bytes and returns a strong ETag for them, a quoted sha256 prefix
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part)
+        digest.update(b"\0")
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+class RenderedBody:
+    """
+    A JSON response body rendered once, with a strong ETag hashed from its bytes.
+    variants holds the body compressed with each encoding once precompress() has run, they are cached
+    along with the body so every worker serving it shares them.
+    keys optionally identifies every item of a list body, for paging on something the items don't include.
+    """
+
+    __slots__ = ("body", "etag", "variants", "keys")
+
+    def __init__(
+        self,
+        body: bytes,
+        etag: Optional[str] = None,
+        variants: Optional[dict] = None,
+        keys: Optional[list] = None,
+    ):
+        self.body = body
+        self.etag = etag or make_etag(body)
+        self.variants = variants or {}
+        self.keys = keys
+
+    def json(self):
+        return json.loads(self.body)
+
+    def encoded(self, encoding: str) -> bytes:
+        """
+        This function returns the body compressed with encoding (br or gzip). Bodies that weren't precompressed
+        are compressed on the spot at DYNAMIC_COMPRESS_QUALITY, so a request never waits for the slow settings.
+        """
+        body = self.variants.get(encoding)
+
+        if body is None:
+            body = compress(self.body, encoding, DYNAMIC_COMPRESS_QUALITY)
+            self.variants[encoding] = body
+
+        return body
+
+    async def precompress(self) -> "RenderedBody":
+        """
+        This function compresses every variant ahead of time in a thread, so no request has to wait for it
+        """
+        if len(self.body) >= COMPRESS_MIN_BYTES:
+            for encoding in ENCODINGS:
+                if encoding not in self.variants:
+                    self.variants[encoding] = await asyncio.to_thread(
+                        compress, self.body, encoding
+                    )
+
+        return self
+
+
+def compress(body: bytes, encoding: str, quality: int = BROTLI_QUALITY) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=quality)
+    return gzip.compress(body, compresslevel=min(quality, GZIP_LEVEL), mtime=0)
+
+
+def dump_json(value) -> bytes:
+    return json.dumps(
+        value, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def render(value, keys: Optional[list] = None) -> RenderedBody:
+    """
+    This function takes a value a route would return and renders it the same way FastAPI's JSONResponse does,
+    keys are kept with it (see RenderedBody)
+    """
+    return RenderedBody(dump_json(jsonable_encoder(value)), keys=keys)
+
+
+class RenderedCoder(Coder):
+    """
+    Stores a RenderedBody in the cache as its ETag, the sizes of its parts and then the body, its
+    compressed variants and its keys back to back, so a hit needs no JSON parsing, hashing or compressing
+    """
+
+    @classmethod
+    def encode(cls, value: RenderedBody) -> bytes:
+        names = [encoding for encoding in ENCODINGS if encoding in value.variants]
+        parts = [value.body] + [value.variants[encoding] for encoding in names]
+
+        if value.keys != None:
+            names.append("keys")
+            parts.append(dump_json(value.keys))
+        sizes = " ".join(
+            f"{name}={len(part)}" for name, part in zip(["identity"] + names, parts)
+        )
+
+        return value.etag.encode("ascii") + b"\n" + sizes.encode("ascii") + b"\n" + b"".join(parts)
+
+    @classmethod
+    def decode(cls, value) -> RenderedBody:
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+
+        lines = value.split(b"\n", 2)
+        if len(lines) == 2:
+            # written before the variants were cached, JSON bodies never hold a raw newline
+            return RenderedBody(lines[1], lines[0].decode("ascii"))
+
+        etag, sizes, data = lines
+
+        parts = {}
+        offset = 0
+        for size in sizes.decode("ascii").split():
+            name, length = size.split("=")
+            parts[name] = data[offset:offset + int(length)]
+            offset += int(length)
+
+        body = parts.pop("identity")
+        keys = parts.pop("keys", None)
+
+        return RenderedBody(
+            body, etag.decode("ascii"), parts, None if keys == None else json.loads(keys)
+        )
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    This function takes an If-None-Match header and an ETag and returns whether the client already has it,
+    comparing weakly like RFC 9110 says to for If-None-Match
+    """
+    if not if_none_match:
+        return False
+
+    if if_none_match.strip() == "*":
+        return True
+
+    etag = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == etag
+        for candidate in if_none_match.split(",")
+    )
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    This function takes an Accept-Encoding header and returns the best encoding we have that it accepts,
+    or None for the uncompressed body
+    """
+    if not accept_encoding:
+        return None
+
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+
+        accepted[name.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in ENCODINGS:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+
+    return best
+
+
+def encoded_etag(etag: str, encoding: Optional[str]) -> str:
+    """
+    This function takes an ETag and the Content-Encoding a body is sent with and returns the ETag for that encoding
+    """
+    if encoding == None:
+        return etag
+
+    return f'{etag[:-1]}-{ENCODINGS[encoding]}"'
+
+
+def not_modified(etag: str) -> Response:
+    """
+    This function takes the ETag the client already has and returns the 304 telling it so
+    """
+    return Response(status_code=304, headers={"ETag": etag, "Vary": "Accept-Encoding"})
+
+
+def rendered_response(
+    request: Request,
+    rendered: RenderedBody,
+    etag: Optional[str] = None,
+    headers: Optional[dict] = None,
+) -> Response:
+    """
+    This function returns rendered as a JSON response, or a 304 if the request's If-None-Match already has its ETag.
+    The body is sent compressed with the best encoding the client accepts, each encoding with its own ETag.
+    etag overrides the body's own one for responses derived from another body.
+    """
+    etag = etag or rendered.etag
+    headers = dict(headers or {}, Vary="Accept-Encoding")
+    body = rendered.body
+
+    encoding = None
+    if len(body) >= COMPRESS_MIN_BYTES:
+        encoding = choose_encoding(request.headers.get("accept-encoding"))
+
+    etag = encoded_etag(etag, encoding)
+    headers["ETag"] = etag
+
+    if encoding != None:
+        headers["Content-Encoding"] = encoding
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+
+    if encoding != None:
+        body = rendered.encoded(encoding)
+
+    return Response(body, media_type="application/json", headers=headers)
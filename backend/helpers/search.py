@@ -0,0 +1,157 @@
+import re
+import unicodedata
+from typing import Dict, List
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# A record has to share at least this share of the query's trigrams to be a match, low enough to survive a typo or two
+SEARCH_MIN_SIMILARITY = 0.5
+
+
+def normalize(text: str) -> str:
+    """
+    This function takes some text and returns it lower cased with accents stripped
+    """
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(normalize(text))
+
+
+def trigrams(token: str) -> set:
+    """
+    This function takes a token and returns its trigrams, padded so the start and end of a word count too
+    """
+    padded = f" {token} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """
+    A trigram index over some text fields of a TableSnapshot's records, attach it with TableSnapshot.attach_index.
+    Every field has a weight, a match in the club name counts for more than one in the description.
+    Like SnapshotIndex, postings are replaced rather than mutated so searches can run during a sync.
+    """
+
+    def __init__(self, fields: Dict[str, float]):
+        # field name -> weight
+        self.fields = fields
+        # trigram -> {record id: weight}
+        self.postings = {}
+        # token -> {record id: weight}, whole word matches rank above partial ones
+        self.tokens = {}
+        self.records = {}
+        # record id -> (trigrams, tokens) it was indexed under, so it can be removed again
+        self._keys = {}
+
+    def _keys_for(self, record: dict):
+        grams = {}
+        tokens = {}
+
+        for field, weight in self.fields.items():
+            for token in tokenize(field_text(record, field)):
+                if tokens.get(token, 0) < weight:
+                    tokens[token] = weight
+                for gram in trigrams(token):
+                    if grams.get(gram, 0) < weight:
+                        grams[gram] = weight
+
+        return grams, tokens
+
+    def rebuild(self, records: dict):
+        postings = {}
+        token_postings = {}
+        keys = {}
+
+        for record_id, record in records.items():
+            grams, tokens = self._keys_for(record)
+            keys[record_id] = (grams, tokens)
+
+            for gram, weight in grams.items():
+                postings.setdefault(gram, {})[record_id] = weight
+            for token, weight in tokens.items():
+                token_postings.setdefault(token, {})[record_id] = weight
+
+        self.postings, self.tokens, self._keys = postings, token_postings, keys
+        self.records = dict(records)
+
+    def add(self, record: dict):
+        record_id = record["id"]
+        grams, tokens = self._keys_for(record)
+
+        for index, keys in ((self.postings, grams), (self.tokens, tokens)):
+            for key, weight in keys.items():
+                bucket = dict(index.get(key, {}))
+                bucket[record_id] = weight
+                index[key] = bucket
+
+        self._keys[record_id] = (grams, tokens)
+        self.records[record_id] = record
+
+    def remove(self, record: dict):
+        record_id = record["id"]
+        grams, tokens = self._keys.pop(record_id, ({}, {}))
+
+        for index, keys in ((self.postings, grams), (self.tokens, tokens)):
+            for key in keys:
+                bucket = dict(index.get(key, {}))
+                bucket.pop(record_id, None)
+
+                if bucket:
+                    index[key] = bucket
+                else:
+                    index.pop(key, None)
+
+        self.records.pop(record_id, None)
+
+    def lookup(self, query: str, limit: int = 20) -> list:
+        """
+        This function takes a search query and returns the best matching records, best first.
+        Pass limit=None to get every match.
+        """
+        query_tokens = tokenize(query)
+        query_grams = set()
+        for token in query_tokens:
+            query_grams |= trigrams(token)
+
+        if not query_grams:
+            return []
+
+        matched = {}
+        scores = {}
+
+        for gram in query_grams:
+            for record_id, weight in self.postings.get(gram, {}).items():
+                matched[record_id] = matched.get(record_id, 0) + 1
+                scores[record_id] = scores.get(record_id, 0) + weight
+
+        for token in query_tokens:
+            for record_id, weight in self.tokens.get(token, {}).items():
+                if record_id in scores:
+                    scores[record_id] += weight * len(token)
+
+        needed = SEARCH_MIN_SIMILARITY * len(query_grams)
+        records = self.records
+        ranked = sorted(
+            (-scores[record_id], record_id)
+            for record_id, count in matched.items()
+            if count >= needed
+        )
+
+        # a record removed by a sync running alongside is skipped
+        results = (records.get(record_id) for _, record_id in ranked)
+        return [record for record in results if record is not None][:limit]
+
+
+def field_text(record: dict, field: str) -> str:
+    """
+    Reads a field of an Airtable record as text, taking the first value of lookup fields
+    """
+    value = record["fields"].get(field)
+
+    if isinstance(value, list):
+        value = value[0] if value else None
+
+    return str(value) if value is not None else ""
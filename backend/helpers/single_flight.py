@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from functools import wraps
+
+from dotenv import load_dotenv
+from fastapi_cache.coder import JsonCoder
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# How long a worker may hold the rebuild lock before another one is allowed to take over
+SINGLE_FLIGHT_LOCK_SECONDS = int(os.environ.get("SINGLE_FLIGHT_LOCK_SECONDS", 60))
+
+# How long a finished rebuild is kept around for the workers that were waiting on it
+SINGLE_FLIGHT_RESULT_SECONDS = 30
+
+SINGLE_FLIGHT_POLL_SECONDS = 0.1
+
+# Only deletes the lock if it still holds our token, so a rebuild that overran its lock can't release someone else's
+RELEASE_LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_redis = None
+
+
+def get_redis():
+    """
+    This function returns the Redis client used for the cross worker locks, or None if REDIS_URL isn't set
+    """
+    global _redis
+
+    if _redis is None and os.environ.get("REDIS_URL"):
+        _redis = aioredis.from_url(os.environ.get("REDIS_URL"))
+
+    return _redis
+
+
+def single_flight(prefix: str = "single-flight"):
+    """
+    A decorator that makes concurrent calls to an async function with the same arguments share one call.
+    Callers in this process await the same task, callers in other workers wait on a Redis lock
+    and pick up the result the worker holding it publishes.
+    """
+
+    def decorator(func):
+        in_flight = {}
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = f"{prefix}:{func.__module__}:{func.__name__}:{args}:{sorted(kwargs.items())}"
+
+            task = in_flight.get(key)
+            if task is None:
+                task = asyncio.ensure_future(_run_once(key, func, args, kwargs))
+                in_flight[key] = task
+                task.add_done_callback(lambda _: in_flight.pop(key, None))
+
+            # shield it so one caller going away doesn't cancel the call for everyone else
+            return await asyncio.shield(task)
+
+        return wrapper
+
+    return decorator
+
+
+async def _run_once(key: str, func, args, kwargs):
+    """
+    Runs func unless another worker already is, in which case it waits for that worker's result
+    """
+    redis = get_redis()
+
+    if redis is None:
+        return await func(*args, **kwargs)
+
+    lock_key = key + ":lock"
+    result_key = key + ":result"
+    token = uuid.uuid4().hex
+
+    try:
+        deadline = time.monotonic() + SINGLE_FLIGHT_LOCK_SECONDS
+
+        while not await redis.set(
+            lock_key, token, nx=True, ex=SINGLE_FLIGHT_LOCK_SECONDS
+        ):
+            # someone else is rebuilding, wait for them to publish the result
+            result = await redis.get(result_key)
+            if result is not None:
+                return JsonCoder.decode(result)
+
+            if time.monotonic() > deadline:
+                break
+
+            await asyncio.sleep(SINGLE_FLIGHT_POLL_SECONDS)
+    except RedisError:
+        logger.warning(
+            "Redis unavailable for single flight, running without the lock",
+            exc_info=True,
+        )
+        return await func(*args, **kwargs)
+
+    try:
+        # a rebuild may have finished between our cache miss and taking the lock
+        result = await redis.get(result_key)
+        if result is not None:
+            return JsonCoder.decode(result)
+    except RedisError:
+        logger.warning("Redis unavailable for single flight", exc_info=True)
+
+    try:
+        value = await func(*args, **kwargs)
+        await _publish(redis, result_key, value)
+        return value
+    finally:
+        await _release(redis, lock_key, token)
+
+
+async def _publish(redis, result_key: str, value):
+    try:
+        await redis.set(
+            result_key, JsonCoder.encode(value), ex=SINGLE_FLIGHT_RESULT_SECONDS
+        )
+    except RedisError:
+        # the waiting workers time out and rebuild for themselves
+        logger.warning("Failed to publish a single flight result", exc_info=True)
+
+
+async def _release(redis, lock_key: str, token: str):
+    try:
+        await redis.eval(RELEASE_LOCK_LUA, 1, lock_key, token)
+    except RedisError:
+        # the lock expires by itself
+        logger.warning("Failed to release a single flight lock", exc_info=True)
@@ -0,0 +1,555 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+
+from dotenv import load_dotenv
+from pyairtable import Table
+from pyairtable.formulas import STR_VALUE
+
+from helpers.rate_limit import ScheduledTable
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# How long a snapshot is trusted before the next read triggers an incremental sync
+SNAPSHOT_REFRESH_SECONDS = int(os.environ.get("SNAPSHOT_REFRESH_SECONDS", 60))
+
+# Incremental syncs can't see deleted records, so every so often the whole table is reloaded
+SNAPSHOT_FULL_SYNC_SECONDS = int(os.environ.get("SNAPSHOT_FULL_SYNC_SECONDS", 3600))
+
+# After a failed sync the current records keep being served and the next sync waits this long
+SNAPSHOT_RETRY_SECONDS = int(os.environ.get("SNAPSHOT_RETRY_SECONDS", 30))
+
+# How often an async sync checks whether a thread has finished its sync
+SYNC_LOCK_POLL_SECONDS = 0.05
+
+# Incremental syncs overlap by this much to cover clock skew between us and Airtable
+SNAPSHOT_SYNC_OVERLAP_SECONDS = 60
+
+
+class TableSnapshot:
+    """
+    An in-memory copy of every record in an Airtable table.
+    The first sync loads the whole table, later ones only fetch records modified since the previous sync.
+    """
+
+    def __init__(
+        self,
+        table: Table,
+        refresh_interval: int = SNAPSHOT_REFRESH_SECONDS,
+        full_sync_interval: int = SNAPSHOT_FULL_SYNC_SECONDS,
+        mirror=None,
+        fields: list = None,
+    ):
+        self.table = table
+        self.refresh_interval = refresh_interval
+        self.full_sync_interval = full_sync_interval
+        # an optional SQLiteMirror the records are persisted to and warm started from
+        self.mirror = mirror
+        # the columns to sync, every column when None, see helpers/fields.py
+        self.fields = fields
+
+        # record id -> record, treat as read only outside this class
+        self.records = {}
+        # bumped every time the records change, used to invalidate anything derived from them
+        self.version = 0
+        self.loaded = False
+        # index name -> SnapshotIndex, kept in step with the records
+        self.indexes = {}
+
+        self._last_sync_started = None
+        self._last_full_sync_started = None
+        self._last_refresh = 0.0
+        # time.monotonic() of the last failed sync, syncs are held off for a while after one
+        self._last_failure = None
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        # thread ident of whoever holds _sync_lock
+        self._sync_owner = None
+        self._async_lock = None
+        self._background_task = None
+
+    def add_index(self, name: str, key_func):
+        """
+        This function adds a secondary index over the records.
+        key_func takes a record and returns the keys it should be found under.
+        """
+        self.attach_index(name, SnapshotIndex(key_func))
+
+    def attach_index(self, name: str, index):
+        """
+        This function adds any index with SnapshotIndex's rebuild, add, remove and lookup methods,
+        it is kept up to date the same way
+        """
+        with self._lock:
+            index.rebuild(self.records)
+            self.indexes[name] = index
+
+    def lookup(self, name: str, key) -> list:
+        """
+        This function takes an index name and a key and returns every record stored under that key
+        """
+        self.ensure_fresh()
+        return self.indexes[name].lookup(key)
+
+    def is_stale(self) -> bool:
+        """
+        This function returns whether the snapshot is due for a sync
+        """
+        if not self.loaded:
+            return True
+
+        now = time.monotonic()
+
+        if self._last_failure != None and now - self._last_failure < SNAPSHOT_RETRY_SECONDS:
+            return False
+
+        return now - self._last_refresh > self.refresh_interval
+
+    def refresh(self, full: bool = False) -> bool:
+        """
+        This function syncs the snapshot with Airtable and returns whether anything changed
+        """
+        if not self._acquire_sync_lock():
+            return self._sync(full)
+
+        try:
+            return self._sync(full)
+        finally:
+            self._release_sync_lock()
+
+    def ensure_fresh(self):
+        """
+        This function syncs the snapshot if it is stale.
+        Until the first load finishes every caller waits for it. After that the sync runs in a background thread
+        and callers keep reading the current records, even if it fails.
+        """
+        if not self.is_stale():
+            return
+
+        if not self.loaded:
+            if not self._acquire_sync_lock():
+                self._sync()
+                return
+
+            try:
+                if not self.loaded:
+                    self._sync()
+            finally:
+                self._release_sync_lock()
+            return
+
+        if self._sync_lock.acquire(blocking=False):
+            # the thread releases the lock when it's done
+            threading.Thread(target=self._background_sync, daemon=True).start()
+
+    def _background_sync(self):
+        self._sync_owner = threading.get_ident()
+        try:
+            if self.is_stale():
+                self._sync()
+        except Exception:
+            self._sync_failed()
+        finally:
+            self._release_sync_lock()
+
+    def _sync_failed(self):
+        self._last_failure = time.monotonic()
+        logger.warning(
+            f"Syncing {self.table.table_name} failed, serving the current records "
+            f"and retrying in {SNAPSHOT_RETRY_SECONDS}s",
+            exc_info=True,
+        )
+
+    async def refresh_async(self, client, full: bool = False) -> bool:
+        """
+        This function works like refresh, but fetches the records through an AsyncAirtable client
+        """
+        async with self._get_async_lock():
+            await self._acquire_sync_lock_async()
+            try:
+                return await self._sync_async(client, full)
+            finally:
+                self._release_sync_lock()
+
+    async def ensure_fresh_async(self, client):
+        """
+        This function works like ensure_fresh, but fetches the records through an AsyncAirtable client
+        without blocking the event loop, after the first load in a background task
+        """
+        if not self.is_stale():
+            return
+
+        if self.loaded:
+            if self._sync_lock.acquire(blocking=False):
+                self._sync_owner = threading.get_ident()
+                # kept so the task isn't garbage collected, it releases the lock when it's done
+                self._background_task = asyncio.ensure_future(
+                    self._background_sync_async(client)
+                )
+            return
+
+        async with self._get_async_lock():
+            if self.loaded:
+                return
+
+            await self._acquire_sync_lock_async()
+            try:
+                if not self.loaded:
+                    await self._sync_async(client)
+            finally:
+                self._release_sync_lock()
+
+    async def _background_sync_async(self, client):
+        try:
+            if self.is_stale():
+                await self._sync_async(client)
+        except Exception:
+            self._sync_failed()
+        finally:
+            self._release_sync_lock()
+
+    def _get_async_lock(self) -> asyncio.Lock:
+        # created lazily so it belongs to the running event loop
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+        return self._async_lock
+
+    def _acquire_sync_lock(self) -> bool:
+        """
+        Waits for the sync lock and returns True, or returns False without it if an async sync on this same
+        thread's event loop holds it, since waiting would block the loop that has to finish that sync
+        """
+        if self._sync_owner == threading.get_ident():
+            return False
+
+        self._sync_lock.acquire()
+        self._sync_owner = threading.get_ident()
+        return True
+
+    async def _acquire_sync_lock_async(self):
+        # polled rather than waited for in a thread, a thread can't be cancelled so a request going away
+        # would leave it taking the lock with nobody left to release it
+        while not self._sync_lock.acquire(blocking=False):
+            await asyncio.sleep(SYNC_LOCK_POLL_SECONDS)
+        self._sync_owner = threading.get_ident()
+
+    def _release_sync_lock(self):
+        self._sync_owner = None
+        self._sync_lock.release()
+
+    def _sync(self, full: bool = False) -> bool:
+        started, full, formula = self._plan_sync(full)
+
+        options = {}
+        if formula:
+            options["formula"] = formula
+        if self.fields:
+            options["fields"] = self.fields
+
+        records = self.table.all(**options)
+
+        return self._finish_sync(records, started, full)
+
+    async def _sync_async(self, client, full: bool = False) -> bool:
+        started, full, formula = self._plan_sync(full)
+
+        records = await client.all(
+            self.table.table_name, formula=formula, fields=self.fields
+        )
+
+        return self._finish_sync(records, started, full)
+
+    def _plan_sync(self, full: bool):
+        """
+        Works out whether the next sync has to be a full one and the formula to fetch with
+        """
+        if not self.loaded and not full and self.mirror is not None:
+            self._load_mirror()
+
+        started = datetime.now(timezone.utc)
+        full = (
+            full
+            or not self.loaded
+            or started - self._last_full_sync_started
+            > timedelta(seconds=self.full_sync_interval)
+        )
+
+        if full:
+            return started, full, None
+
+        return (
+            started,
+            full,
+            modified_since(
+                self._last_sync_started
+                - timedelta(seconds=SNAPSHOT_SYNC_OVERLAP_SECONDS)
+            ),
+        )
+
+    def _finish_sync(self, records: list, started: datetime, full: bool) -> bool:
+        changed = self._apply(records, full)
+
+        self._last_sync_started = started
+        self._last_refresh = time.monotonic()
+        self._last_failure = None
+        if full:
+            self._last_full_sync_started = started
+        self.loaded = True
+
+        if self.mirror is not None:
+            self.mirror.set_sync_state(
+                self.table.table_name, started, self._last_full_sync_started
+            )
+
+        return changed
+
+    def _load_mirror(self):
+        """
+        Warm starts the snapshot from the mirror so the next sync only needs to fetch what changed since
+        """
+        sync_state = self.mirror.get_sync_state(self.table.table_name)
+
+        if sync_state == None:
+            return
+
+        with self._lock:
+            self.records = {
+                record["id"]: record
+                for record in self.mirror.load(self.table.table_name)
+            }
+            for index in self.indexes.values():
+                index.rebuild(self.records)
+            self.version += 1
+
+        self._last_sync_started, self._last_full_sync_started = sync_state
+        self.loaded = True
+
+    def _apply(self, records: list, full: bool) -> bool:
+        with self._lock:
+            changed = [
+                record
+                for record in records
+                if self.records.get(record["id"]) != record
+            ]
+            removed = (
+                set(self.records) - {record["id"] for record in records}
+                if full
+                else set()
+            )
+
+            if not changed and not removed:
+                return False
+
+            records_copy = dict(self.records)
+            for record_id in removed:
+                del records_copy[record_id]
+            for record in changed:
+                records_copy[record["id"]] = record
+
+            for index in self.indexes.values():
+                for record_id in removed:
+                    index.remove(self.records[record_id])
+                for record in changed:
+                    if record["id"] in self.records:
+                        index.remove(self.records[record["id"]])
+                    index.add(record)
+
+            self.records = records_copy
+            self.version += 1
+
+            if self.mirror is not None:
+                if full:
+                    self.mirror.replace(self.table.table_name, records)
+                else:
+                    self.mirror.upsert(self.table.table_name, changed)
+
+            return True
+
+    def all(self) -> list:
+        """
+        This function returns every record in the snapshot
+        """
+        self.ensure_fresh()
+        return list(self.records.values())
+
+    def get(self, record_id: str):
+        """
+        This function takes a record id and returns the record, or None if it isn't in the table
+        """
+        self.ensure_fresh()
+        return self.records.get(record_id)
+
+    def put(self, record: dict):
+        """
+        This function adds or replaces a record after it has been written to Airtable
+        """
+        self._apply([record], full=False)
+
+    def drop(self, record_id: str):
+        """
+        This function removes a record after it has been deleted from Airtable
+        """
+        with self._lock:
+            if record_id not in self.records:
+                return
+
+            records_copy = dict(self.records)
+            del records_copy[record_id]
+
+            for index in self.indexes.values():
+                index.remove(self.records[record_id])
+
+            self.records = records_copy
+            self.version += 1
+
+            if self.mirror is not None:
+                self.mirror.delete(self.table.table_name, [record_id])
+
+
+class SnapshotIndex:
+    """
+    A secondary index over a TableSnapshot, mapping keys to the records found under them.
+    Buckets are replaced rather than mutated so readers never see one change size under them.
+    """
+
+    def __init__(self, key_func):
+        self.key_func = key_func
+        self.buckets = {}
+
+    def rebuild(self, records: dict):
+        buckets = {}
+        for record in records.values():
+            for key in self.key_func(record):
+                buckets.setdefault(key, {})[record["id"]] = record
+        self.buckets = buckets
+
+    def add(self, record: dict):
+        for key in self.key_func(record):
+            bucket = dict(self.buckets.get(key, {}))
+            bucket[record["id"]] = record
+            self.buckets[key] = bucket
+
+    def remove(self, record: dict):
+        for key in self.key_func(record):
+            bucket = dict(self.buckets.get(key, {}))
+            bucket.pop(record["id"], None)
+
+            if bucket:
+                self.buckets[key] = bucket
+            else:
+                self.buckets.pop(key, None)
+
+    def lookup(self, key) -> list:
+        return list(self.buckets.get(key, {}).values())
+
+
+class SnapshotTable(ScheduledTable):
+    """
+    A ScheduledTable that keeps a TableSnapshot of its records.
+    Writes made through it are applied to the snapshot straight away so reads never lag behind our own changes.
+    """
+
+    def __init__(self, *args, mirror=None, fields: list = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.snapshot = TableSnapshot(self, mirror=mirror, fields=fields)
+
+    def create(self, fields: dict, typecast=False, **options):
+        record = super().create(fields, typecast=typecast, **options)
+        self.snapshot.put(record)
+        return record
+
+    def batch_create(self, records, typecast=False, **options):
+        created = super().batch_create(records, typecast=typecast, **options)
+        for record in created:
+            self.snapshot.put(record)
+        return created
+
+    def update(self, record_id: str, fields: dict, replace=False, typecast=False, **options):
+        record = super().update(
+            record_id, fields, replace=replace, typecast=typecast, **options
+        )
+        self.snapshot.put(record)
+        return record
+
+    def batch_update(self, records, replace=False, typecast=False, **options):
+        updated = super().batch_update(
+            records, replace=replace, typecast=typecast, **options
+        )
+        for record in updated:
+            self.snapshot.put(record)
+        return updated
+
+    def delete(self, record_id: str):
+        deleted = super().delete(record_id)
+        self.snapshot.drop(record_id)
+        return deleted
+
+    def batch_delete(self, record_ids):
+        deleted = super().batch_delete(record_ids)
+        for record_id in record_ids:
+            self.snapshot.drop(record_id)
+        return deleted
+
+
+def modified_since(since: datetime) -> str:
+    """
+    This function takes a datetime and returns a formula matching records modified after it
+    """
+    return "IS_AFTER(LAST_MODIFIED_TIME(), {})".format(
+        STR_VALUE(since.strftime("%Y-%m-%dT%H:%M:%S.000Z"))
+    )
+
+
+def snapshot_cache(*snapshots: TableSnapshot):
+    """
+    A decorator that caches the result of a function until one of the given snapshots changes.
+    The cached function gets a get_async() too, which builds the value in a thread when it has to
+    so a slow build doesn't block the event loop
+    """
+
+    def decorator(func):
+        state = {"entry": (None, None)}
+        # so threads building at the same time build it once
+        lock = threading.Lock()
+
+        def current_versions() -> tuple:
+            return tuple(snapshot.version for snapshot in snapshots)
+
+        @wraps(func)
+        def wrapper():
+            for snapshot in snapshots:
+                snapshot.ensure_fresh()
+
+            with lock:
+                versions = current_versions()
+                cached_versions, value = state["entry"]
+
+                if cached_versions != versions:
+                    value = func()
+                    state["entry"] = (versions, value)
+
+            return value
+
+        async def get_async():
+            """
+            Returns the cached value, or builds it in a thread if the snapshots changed since.
+            The snapshots should already be synced through ensure_fresh_async
+            """
+            cached_versions, value = state["entry"]
+
+            if cached_versions == current_versions():
+                return value
+
+            return await asyncio.to_thread(wrapper)
+
+        wrapper.get_async = get_async
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,184 @@
+import math
+from typing import List
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+# Grid cells are this many degrees on a side, about 111km at the equator
+GRID_CELL_DEGREES = 1.0
+
+
+def haversine_km(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    This function takes a point and arrays of points, all in radians, and returns the distances between them in km
+    """
+    a = (
+        np.sin((lats - lat) / 2) ** 2
+        + math.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class GeoGrid:
+    """
+    A spatial index bucketing points into a grid of latitude/longitude cells.
+    Points are sorted by cell so every cell is a slice of one array, and a query only looks at the cells it overlaps.
+    Build a new one when the points change, it is never modified.
+    """
+
+    def __init__(self, latitudes, longitudes, cell_degrees: float = GRID_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self.rows = math.ceil(180 / cell_degrees)
+        self.cols = math.ceil(360 / cell_degrees)
+
+        self.latitudes = np.asarray(latitudes, dtype=float)
+        self.longitudes = np.asarray(longitudes, dtype=float)
+        self.lat_radians = np.radians(self.latitudes)
+        self.lon_radians = np.radians(self.longitudes)
+
+        cells = self._row(self.latitudes) * self.cols + self._col(self.longitudes)
+        self.order = np.argsort(cells, kind="stable")
+
+        cell_ids, starts, counts = np.unique(
+            cells[self.order], return_index=True, return_counts=True
+        )
+        # cell id -> (start, end) of its points in order
+        self.cells = {
+            int(cell): (int(start), int(start + count))
+            for cell, start, count in zip(cell_ids, starts, counts)
+        }
+
+    def __len__(self):
+        return len(self.latitudes)
+
+    def _row(self, latitudes):
+        rows = np.floor((np.asarray(latitudes) + 90) / self.cell_degrees).astype(int)
+        return np.clip(rows, 0, self.rows - 1)
+
+    def _col(self, longitudes):
+        cols = np.floor((np.asarray(longitudes) + 180) / self.cell_degrees).astype(int)
+        return cols % self.cols
+
+    def within(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> np.ndarray:
+        """
+        This function returns the indexes of the points in the cells a bounding box overlaps, a superset of
+        the points inside it. A box with min_lon > max_lon crosses the antimeridian.
+        """
+        row_range = range(int(self._row(min_lat)), int(self._row(max_lat)) + 1)
+
+        first_col, last_col = int(self._col(min_lon)), int(self._col(max_lon))
+        if max_lon - min_lon >= 360:
+            col_range = range(self.cols)
+        elif min_lon <= max_lon and first_col <= last_col:
+            col_range = range(first_col, last_col + 1)
+        else:
+            col_range = list(range(first_col, self.cols)) + list(range(last_col + 1))
+
+        # for big boxes it's quicker to go through the occupied cells than every cell in the box
+        if len(row_range) * len(col_range) > len(self.cells):
+            rows, cols = set(row_range), set(col_range)
+            slices = [
+                span
+                for cell, span in self.cells.items()
+                if cell // self.cols in rows and cell % self.cols in cols
+            ]
+        else:
+            slices = [
+                self.cells[row * self.cols + col]
+                for row in row_range
+                for col in col_range
+                if row * self.cols + col in self.cells
+            ]
+
+        if not slices:
+            return np.empty(0, dtype=int)
+
+        return np.concatenate([self.order[start:end] for start, end in slices])
+
+    def in_bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> np.ndarray:
+        """
+        This function returns the indexes of the points inside a bounding box, in index order.
+        A box with min_lon > max_lon crosses the antimeridian.
+        """
+        candidates = self.within(min_lat, min_lon, max_lat, max_lon)
+
+        latitudes = self.latitudes[candidates]
+        longitudes = self.longitudes[candidates]
+        inside = (latitudes >= min_lat) & (latitudes <= max_lat)
+
+        if min_lon <= max_lon:
+            inside &= (longitudes >= min_lon) & (longitudes <= max_lon)
+        else:
+            inside &= (longitudes >= min_lon) | (longitudes <= max_lon)
+
+        return np.sort(candidates[inside])
+
+    def nearest(self, latitude: float, longitude: float, radius_km: float, limit: int):
+        """
+        This function returns (indexes, distances in km) of up to limit points within radius_km of a point, closest first
+        """
+        radius_degrees = math.degrees(radius_km / EARTH_RADIUS_KM)
+        min_lat, max_lat = latitude - radius_degrees, latitude + radius_degrees
+
+        if min_lat <= -90 or max_lat >= 90 or radius_degrees >= 90:
+            # the circle covers a pole, so every longitude
+            min_lon, max_lon = -180.0, 180.0
+        else:
+            lon_degrees = math.degrees(
+                math.asin(
+                    min(1.0, math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(latitude)))
+                )
+            )
+            min_lon, max_lon = longitude - lon_degrees, longitude + lon_degrees
+
+            if max_lon - min_lon >= 360:
+                min_lon, max_lon = -180.0, 180.0
+            else:
+                min_lon = (min_lon + 180) % 360 - 180
+                max_lon = (max_lon + 180) % 360 - 180
+
+        candidates = self.within(max(min_lat, -90), min_lon, min(max_lat, 90), max_lon)
+
+        distances = haversine_km(
+            math.radians(latitude),
+            math.radians(longitude),
+            self.lat_radians[candidates],
+            self.lon_radians[candidates],
+        )
+
+        inside = distances <= radius_km
+        candidates, distances = candidates[inside], distances[inside]
+
+        if len(candidates) > limit:
+            closest = np.argpartition(distances, limit - 1)[:limit]
+            candidates, distances = candidates[closest], distances[closest]
+
+        order = np.argsort(distances, kind="stable")
+
+        return candidates[order], distances[order]
+
+
+class PlaceIndex:
+    """
+    The clubs and old clubs on the map with a GeoGrid over them, places are dicts with
+    id (None for old clubs), name, kind ("club" or "old_club"), latitude and longitude
+    """
+
+    def __init__(self, places: List[dict]):
+        self.places = places
+        self.grid = GeoGrid(
+            [place["latitude"] for place in places],
+            [place["longitude"] for place in places],
+        )
+
+    def nearby(self, latitude: float, longitude: float, radius_km: float, limit: int) -> List[dict]:
+        """
+        This function returns up to limit places within radius_km of a point, closest first, with their distance_km
+        """
+        indexes, distances = self.grid.nearest(latitude, longitude, radius_km, limit)
+
+        return [
+            dict(self.places[index], distance_km=round(float(distance), 3))
+            for index, distance in zip(indexes.tolist(), distances.tolist())
+        ]
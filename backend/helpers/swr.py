@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import os
+import time
+from functools import wraps
+
+from dotenv import load_dotenv
+from fastapi_cache import FastAPICache
+
+from helpers.rendered import RenderedCoder
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# After the soft TTL a value is still served, but the next request refreshes it in the background
+CACHE_SOFT_TTL = int(os.environ.get("CACHE_SOFT_TTL", 1800))
+# After the hard TTL a value is gone and the next request waits for a new one
+CACHE_HARD_TTL = int(os.environ.get("CACHE_HARD_TTL", 24 * 60 * 60))
+# How long a not found result is cached, so something created after it is found soon
+CACHE_MISSING_TTL = int(os.environ.get("CACHE_MISSING_TTL", 60))
+# How long after a failed background refresh a stale key is served without trying again
+CACHE_RETRY_SECONDS = float(os.environ.get("CACHE_RETRY_SECONDS", 60))
+
+# key -> the background refresh running for it, so a stale key is only refreshed once at a time
+refreshing = {}
+# key -> time.monotonic() its last background refresh failed at
+failed_at = {}
+
+
+def swr_cache(
+    soft_ttl: int = CACHE_SOFT_TTL,
+    hard_ttl: int = CACHE_HARD_TTL,
+    coder=RenderedCoder,
+    is_missing=None,
+    missing_ttl: int = CACHE_MISSING_TTL,
+):
+    """
+    A stale-while-revalidate cache for async functions, stored in FastAPICache's backend.
+    Values younger than soft_ttl are returned as they are, older ones are still returned while a background task
+    refreshes them, and only a missing value (never built, or older than hard_ttl) makes the caller wait.
+    If a refresh fails, Airtable being down for example, the stale value keeps being served until the hard TTL
+    and the key isn't refreshed again for CACHE_RETRY_SECONDS.
+    Values is_missing returns True for (not found results) are only kept for missing_ttl.
+    """
+
+    def decorator(func):
+        def make_key(args, kwargs) -> str:
+            return f"{FastAPICache.get_prefix()}:swr:{func.__module__}:{func.__name__}:{args}:{sorted(kwargs.items())}"
+
+        def ttl_for(value) -> int:
+            if is_missing != None and is_missing(value):
+                return min(missing_ttl, hard_ttl)
+            return hard_ttl
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = make_key(args, kwargs)
+
+            cached = await _get(key, coder)
+
+            if cached is None:
+                # callers arriving while it's being built wait for the same one
+                return await asyncio.shield(
+                    _start_refresh(key, func, args, kwargs, coder, ttl_for)
+                )
+
+            created, value = cached
+
+            if time.time() - created >= soft_ttl and not _recently_failed(key):
+                _start_refresh(key, func, args, kwargs, coder, ttl_for)
+
+            return value
+
+        async def warm(*args, **kwargs) -> bool:
+            """
+            Builds the value for these arguments if it's missing or past the soft TTL and waits for it,
+            returns whether it had to
+            """
+            key = make_key(args, kwargs)
+            cached = await _get(key, coder)
+
+            if cached != None and time.time() - cached[0] < soft_ttl:
+                return False
+
+            await asyncio.shield(_start_refresh(key, func, args, kwargs, coder, ttl_for))
+            return True
+
+        wrapper.warm = warm
+
+        return wrapper
+
+    return decorator
+
+
+async def _get(key: str, coder):
+    """
+    Returns (when it was built, value) for a key, or None if it isn't cached
+    """
+    try:
+        data = await FastAPICache.get_backend().get(key)
+    except Exception:
+        logger.warning(f"Error retrieving cache key '{key}' from backend:", exc_info=True)
+        return None
+
+    if data is None:
+        return None
+
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+
+    created, payload = data.split(b"\n", 1)
+
+    return float(created), coder.decode(payload)
+
+
+def _recently_failed(key: str) -> bool:
+    failed = failed_at.get(key)
+
+    if failed == None:
+        return False
+
+    if time.monotonic() - failed < CACHE_RETRY_SECONDS:
+        return True
+
+    del failed_at[key]
+    return False
+
+
+def _start_refresh(key: str, func, args, kwargs, coder, ttl_for) -> asyncio.Future:
+    """
+    Starts refreshing a key unless it already is, and returns the task doing it
+    """
+    task = refreshing.get(key)
+
+    if task is None:
+        task = asyncio.ensure_future(_refresh(key, func, args, kwargs, coder, ttl_for))
+        refreshing[key] = task
+        task.add_done_callback(lambda task: _finish_refresh(key, task))
+
+    return task
+
+
+async def _refresh(key: str, func, args, kwargs, coder, ttl_for):
+    value = await func(*args, **kwargs)
+
+    payload = coder.encode(value)
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+
+    try:
+        await FastAPICache.get_backend().set(
+            key, f"{time.time()}\n".encode("ascii") + payload, ttl_for(value)
+        )
+    except Exception:
+        logger.warning(f"Error setting cache key '{key}' in backend:", exc_info=True)
+
+    return value
+
+
+def _finish_refresh(key: str, task: asyncio.Task):
+    refreshing.pop(key, None)
+
+    if task.cancelled():
+        return
+
+    # callers waiting on a missing value get the exception themselves, this is for the background refreshes
+    if task.exception() is not None:
+        failed_at[key] = time.monotonic()
+        logger.warning(
+            f"Refreshing cache key '{key}' failed, serving the stale value for {CACHE_RETRY_SECONDS:.0f}s",
+            exc_info=task.exception(),
+        )
+    else:
+        failed_at.pop(key, None)
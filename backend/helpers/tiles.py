@@ -0,0 +1,174 @@
+import math
+import os
+import struct
+import threading
+from collections import OrderedDict
+from typing import List
+
+import numpy as np
+
+from helpers.clusters import mercator_x, mercator_y
+
+# Tile coordinates run from 0 to this, the Mapbox Vector Tile default
+TILE_EXTENT = 4096
+# Points this far outside a tile (in tile units) are still drawn, so markers on the edge aren't cut in half
+TILE_BUFFER = 64
+TILE_MAX_ZOOM = 24
+# How many encoded tiles are kept per snapshot version
+TILE_CACHE_SIZE = int(os.environ.get("TILE_CACHE_SIZE", 2048))
+
+# Geometry types and commands from the Mapbox Vector Tile spec
+POINT = 1
+MOVE_TO = 1
+
+
+def varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def field(number: int, wire_type: int) -> bytes:
+    return varint((number << 3) | wire_type)
+
+
+def length_delimited(number: int, payload: bytes) -> bytes:
+    return field(number, 2) + varint(len(payload)) + payload
+
+
+def encode_value(value) -> bytes:
+    """
+    This function takes a property value and returns it as a vector tile Value message
+    """
+    if isinstance(value, bool):
+        return field(7, 0) + varint(int(value))
+    if isinstance(value, int):
+        if value >= 0:
+            return field(5, 0) + varint(value)
+        return field(6, 0) + varint(zigzag(value))
+    if isinstance(value, float):
+        return field(3, 1) + struct.pack("<d", value)
+    return length_delimited(1, str(value).encode("utf-8"))
+
+
+def encode_layer(name: str, features: List[tuple], extent: int = TILE_EXTENT) -> bytes:
+    """
+    This function takes a layer name and a list of (x, y, properties) point features in tile coordinates
+    and returns the encoded Layer message. Properties that are None are left out.
+    """
+    keys, values = {}, {}
+    body = bytearray()
+
+    for x, y, properties in features:
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault((type(value), value), len(values)))
+
+        geometry = (
+            varint((1 << 3) | MOVE_TO) + varint(zigzag(x)) + varint(zigzag(y))
+        )
+        feature = (
+            length_delimited(2, b"".join(varint(tag) for tag in tags))
+            + field(3, 0) + varint(POINT)
+            + length_delimited(4, geometry)
+        )
+        body += length_delimited(2, feature)
+
+    layer = (
+        field(15, 0) + varint(2)
+        + length_delimited(1, name.encode("utf-8"))
+        + bytes(body)
+        + b"".join(length_delimited(3, key.encode("utf-8")) for key in keys)
+        + b"".join(length_delimited(4, encode_value(value)) for _, value in values)
+        + field(5, 0) + varint(extent)
+    )
+    return length_delimited(3, layer)
+
+
+class TileIndex:
+    """
+    Serves Mapbox Vector Tiles of point places, every place goes in the layer named by its kind and carries
+    the properties listed in properties. Places are sorted by x so a tile is a binary search plus a filter.
+    Encoded tiles are kept in an LRU cache, build a new index when the places change.
+    """
+
+    def __init__(
+        self,
+        places: List[dict],
+        properties: List[str],
+        cache_size: int = TILE_CACHE_SIZE,
+    ):
+        places = sorted(places, key=lambda place: mercator_x(place["longitude"]))
+
+        self.places = places
+        self.properties = properties
+        self.xs = np.array([mercator_x(place["longitude"]) for place in places], dtype=float)
+        self.ys = np.array([mercator_y(place["latitude"]) for place in places], dtype=float)
+
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _within(self, min_x: float, min_y: float, max_x: float, max_y: float) -> np.ndarray:
+        start = np.searchsorted(self.xs, min_x, side="left")
+        end = np.searchsorted(self.xs, max_x, side="right")
+        ys = self.ys[start:end]
+        return np.nonzero((ys >= min_y) & (ys <= max_y))[0] + start
+
+    def tile(self, z: int, x: int, y: int) -> bytes:
+        """
+        This function takes tile coordinates and returns the encoded tile, empty if there is nothing in it
+        """
+        key = (z, x, y)
+
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        data = self._encode(z, x, y)
+
+        with self._lock:
+            self._cache[key] = data
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        return data
+
+    def _encode(self, z: int, x: int, y: int) -> bytes:
+        tiles = 2**z
+        buffer = TILE_BUFFER / TILE_EXTENT
+        min_y, max_y = (y - buffer) / tiles, (y + 1 + buffer) / tiles
+
+        # the buffer can spill over the antimeridian, those points are drawn shifted by a world
+        ranges = [((x - buffer) / tiles, (x + 1 + buffer) / tiles, 0)]
+        if tiles > 1 and x == 0:
+            ranges.append((1 - buffer / tiles, 1, -1))
+        if tiles > 1 and x == tiles - 1:
+            ranges.append((0, buffer / tiles, 1))
+
+        layers = {}
+
+        for min_x, max_x, shift in ranges:
+            for index in self._within(min_x, min_y, max_x, max_y).tolist():
+                place = self.places[index]
+                tile_x = math.floor(((self.xs[index] + shift) * tiles - x) * TILE_EXTENT + 0.5)
+                tile_y = math.floor((self.ys[index] * tiles - y) * TILE_EXTENT + 0.5)
+
+                layers.setdefault(place["kind"], []).append(
+                    (tile_x, tile_y, {name: place.get(name) for name in self.properties})
+                )
+
+        return b"".join(
+            encode_layer(name, features) for name, features in sorted(layers.items())
+        )
@@ -0,0 +1,218 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi_cache.backends import Backend
+from fastapi_cache.backends.redis import RedisBackend
+from redis.exceptions import RedisError
+
+from helpers.rate_limit import retry_delay
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# How much memory the in-process cache may hold, values bigger than this only live in Redis
+L1_CACHE_MAX_BYTES = int(os.environ.get("L1_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# How long a value is kept in process at most, in case an invalidation message was lost
+L1_CACHE_MAX_AGE_SECONDS = float(os.environ.get("L1_CACHE_MAX_AGE_SECONDS", 60))
+CACHE_INVALIDATION_CHANNEL = os.environ.get(
+    "CACHE_INVALIDATION_CHANNEL", "fastapi-cache:invalidate"
+)
+
+
+class TwoTierBackend(Backend):
+    """
+    A fastapi-cache backend keeping the values it reads and writes in an in-process LRU bounded by size,
+    in front of a RedisBackend so hot reads never leave the process.
+    Workers stay coherent through Redis pub/sub: every write or clear is announced on CACHE_INVALIDATION_CHANNEL
+    and the other workers drop their copy. Call start() to listen for those and stop() when shutting down.
+    """
+
+    def __init__(
+        self,
+        redis,
+        max_bytes: int = L1_CACHE_MAX_BYTES,
+        max_age: float = L1_CACHE_MAX_AGE_SECONDS,
+        channel: str = CACHE_INVALIDATION_CHANNEL,
+    ):
+        self.redis = redis
+        self.l2 = RedisBackend(redis)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.channel = channel
+
+        # key -> (value, time.monotonic() it leaves the process at, time.monotonic() it expires in Redis at or None)
+        self.entries = OrderedDict()
+        self.size = 0
+
+        # Bumped whenever a key changes (or every key, for the generation), so a Redis read that raced with a
+        # change isn't kept in process
+        self.versions = {}
+        self.generation = 0
+
+        # so a worker can tell its own messages apart
+        self.origin = uuid.uuid4().hex
+        self._listener = None
+
+    def _l1_get(self, key: str):
+        entry = self.entries.get(key)
+
+        if entry is None:
+            return None
+
+        if entry[1] <= time.monotonic():
+            self._l1_drop(key)
+            return None
+
+        self.entries.move_to_end(key)
+        return entry
+
+    def _l1_set(self, key: str, value, ttl: Optional[float]):
+        self._l1_drop(key)
+
+        if value is None or len(value) > self.max_bytes:
+            return
+
+        now = time.monotonic()
+        expires = None if ttl is None or ttl < 0 else now + ttl
+        age = self.max_age if expires is None else min(ttl, self.max_age)
+
+        self.entries[key] = (value, now + age, expires)
+        self.size += len(value)
+
+        while self.size > self.max_bytes:
+            _, (evicted, _, _) = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def _l1_drop(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[0])
+
+    def _l1_clear(self, namespace: Optional[str] = None):
+        for key in list(self.entries):
+            if namespace is None or key.startswith(f"{namespace}:"):
+                self._l1_drop(key)
+
+        self.generation += 1
+        self.versions.clear()
+
+    def _changed(self, key: str):
+        """
+        Drops a key from the process and marks it changed, for reads of it that are still waiting on Redis
+        """
+        self._l1_drop(key)
+
+        if len(self.versions) >= len(self.entries) + 1024:
+            # a new generation invalidates the reads in flight for every key, which keeps this from growing
+            self.generation += 1
+            self.versions.clear()
+        else:
+            self.versions[key] = self.versions.get(key, 0) + 1
+
+    def _version(self, key: str) -> tuple:
+        return self.generation, self.versions.get(key, 0)
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[bytes]]:
+        entry = self._l1_get(key)
+        if entry is not None:
+            # what Redis would say, -1 for no expiry
+            expires = entry[2]
+            return (-1 if expires is None else max(0, int(expires - time.monotonic()))), entry[0]
+
+        version = self._version(key)
+        ttl, value = await self.l2.get_with_ttl(key)
+
+        # if the key changed while we were reading, the value read may already be outdated
+        if value is not None and self._version(key) == version:
+            self._l1_set(key, value, ttl)
+
+        return ttl, value
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return (await self.get_with_ttl(key))[1]
+
+    async def set(self, key: str, value, expire: Optional[int] = None) -> None:
+        # kept in process first, so this worker still has it if Redis is down
+        self._changed(key)
+        self._l1_set(key, value, expire)
+
+        await self.l2.set(key, value, expire)
+        await self._publish({"key": key})
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        if namespace:
+            self._l1_clear(namespace)
+            await self._publish({"namespace": namespace})
+        elif key:
+            self._changed(key)
+            await self._publish({"key": key})
+
+        return await self.l2.clear(namespace, key)
+
+    async def _publish(self, message: dict):
+        try:
+            await self.redis.publish(
+                self.channel, json.dumps(dict(message, origin=self.origin))
+            )
+        except RedisError:
+            # the other workers' copies run out after max_age
+            logger.warning("Failed to publish a cache invalidation", exc_info=True)
+
+    async def start(self):
+        if self._listener is None:
+            self._listener = asyncio.ensure_future(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def _listen(self):
+        attempt = 0
+
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    # anything could have changed while we weren't listening
+                    self._l1_clear()
+                    attempt = 0
+
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self._invalidate(message["data"])
+            except (RedisError, OSError):
+                attempt += 1
+                delay = retry_delay(attempt)
+                logger.warning(
+                    f"Lost the cache invalidation channel, reconnecting in {delay:.1f}s",
+                    exc_info=True,
+                )
+                self._l1_clear()
+                await asyncio.sleep(delay)
+
+    def _invalidate(self, data):
+        try:
+            message = json.loads(data)
+        except ValueError:
+            return
+
+        if message.get("origin") == self.origin:
+            return
+
+        if "namespace" in message:
+            self._l1_clear(message["namespace"])
+        elif "key" in message:
+            self._changed(message["key"])
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import os
+import time
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List
+
+from dotenv import load_dotenv
+from redis.exceptions import RedisError
+
+from helpers.single_flight import get_redis
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# How often the caches are warmed again after startup
+WARM_INTERVAL_SECONDS = int(os.environ.get("WARM_INTERVAL_SECONDS", 300))
+# How long startup waits for the first warm up before serving anyway
+WARM_STARTUP_TIMEOUT_SECONDS = float(os.environ.get("WARM_STARTUP_TIMEOUT_SECONDS", 60))
+# How many of the most requested clubs are warmed along with the collections
+WARM_POPULAR_CLUBS = int(os.environ.get("WARM_POPULAR_CLUBS", 20))
+# How many clubs the shared counts are kept for, the least requested ones are dropped
+POPULAR_CLUBS_KEEP = int(os.environ.get("POPULAR_CLUBS_KEEP", 1000))
+# Counts halve over this long so clubs that stopped being requested drop out
+POPULAR_CLUBS_HALF_LIFE_HOURS = float(os.environ.get("POPULAR_CLUBS_HALF_LIFE_HOURS", 24))
+# The counts are forgotten once no hits were added for this long
+POPULAR_CLUBS_EXPIRE_SECONDS = int(os.environ.get("POPULAR_CLUBS_EXPIRE_SECONDS", 7 * 24 * 60 * 60))
+
+# Sorted set of club id -> how often it was requested, shared by the workers
+POPULAR_CLUBS_KEY = "warmup:club-hits"
+# Set while the counts were decayed recently, so only one worker decays them every hour
+POPULAR_CLUBS_DECAYED_KEY = "warmup:club-hits:decayed"
+DECAY_INTERVAL_SECONDS = 60 * 60
+
+# Club hits counted since they were last added to POPULAR_CLUBS_KEY
+club_hits = Counter()
+
+
+def record_club_hit(club_id: int):
+    """
+    Counts a request for a club that exists, so made up ids can't push the real ones out
+    """
+    club_hits[club_id] += 1
+
+
+async def popular_club_ids(limit: int = WARM_POPULAR_CLUBS) -> List[int]:
+    """
+    This function adds the hits counted in this worker to the shared counts and returns the ids of the
+    most requested clubs, falling back to this worker's counts without Redis.
+    The shared counts are decayed every hour and trimmed to POPULAR_CLUBS_KEEP clubs.
+    """
+    redis = get_redis()
+
+    if redis is not None:
+        hits = dict(club_hits)
+        try:
+            if hits:
+                async with redis.pipeline(transaction=False) as pipe:
+                    for club_id, count in hits.items():
+                        pipe.zincrby(POPULAR_CLUBS_KEY, count, club_id)
+                    pipe.zremrangebyrank(POPULAR_CLUBS_KEY, 0, -POPULAR_CLUBS_KEEP - 1)
+                    pipe.expire(POPULAR_CLUBS_KEY, POPULAR_CLUBS_EXPIRE_SECONDS)
+                    await pipe.execute()
+                club_hits.subtract(hits)
+                for club_id in [club_id for club_id, count in club_hits.items() if count <= 0]:
+                    del club_hits[club_id]
+
+            if await redis.set(POPULAR_CLUBS_DECAYED_KEY, 1, nx=True, ex=DECAY_INTERVAL_SECONDS):
+                weight = 0.5 ** (DECAY_INTERVAL_SECONDS / (POPULAR_CLUBS_HALF_LIFE_HOURS * 60 * 60))
+                await redis.zunionstore(POPULAR_CLUBS_KEY, {POPULAR_CLUBS_KEY: weight})
+
+            return [int(club_id) for club_id in await redis.zrevrange(POPULAR_CLUBS_KEY, 0, limit - 1)]
+        except RedisError:
+            logger.warning("Redis unavailable for the popular clubs", exc_info=True)
+
+    return [club_id for club_id, _ in club_hits.most_common(limit)]
+
+
+class CacheWarmer:
+    """
+    Runs a set of named warm up jobs at startup and then every interval seconds.
+    It is ready once every job has succeeded at least once, status() reports how the jobs went for a health check.
+    """
+
+    def __init__(
+        self,
+        jobs: Dict[str, Callable[[], Awaitable]],
+        interval: float = WARM_INTERVAL_SECONDS,
+    ):
+        self.jobs = jobs
+        self.interval = interval
+        self.succeeded = set()
+        self.errors = {}
+        self.last_warmed = None
+        self._task = None
+
+    @property
+    def ready(self) -> bool:
+        return self.succeeded == set(self.jobs)
+
+    async def warm(self):
+        """
+        This function runs every job once, concurrently, and records which ones failed
+        """
+        names = list(self.jobs)
+        started = time.monotonic()
+
+        results = await asyncio.gather(
+            *(self.jobs[name]() for name in names), return_exceptions=True
+        )
+
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Warming {name} failed", exc_info=result)
+                self.errors[name] = repr(result)
+            else:
+                self.succeeded.add(name)
+                self.errors.pop(name, None)
+
+        self.last_warmed = time.time()
+        logger.info(f"Warmed caches in {time.monotonic() - started:.1f}s, {len(self.errors)} failed")
+
+    async def start(self, timeout: float = WARM_STARTUP_TIMEOUT_SECONDS):
+        """
+        This function warms everything, waiting at most timeout seconds, then keeps warming on the interval
+        """
+        try:
+            await asyncio.wait_for(asyncio.shield(self.warm()), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Warming caches took longer than {timeout}s, serving before it finished")
+
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.warm()
+            except Exception:
+                logger.warning("Warming caches failed", exc_info=True)
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "last_warmed": self.last_warmed,
+            "failed": self.errors,
+        }
@@ -0,0 +1,71 @@
+from pyairtable import Table
+
+# Airtable's batch endpoints take at most 10 records per request
+AIRTABLE_BATCH_SIZE = 10
+
+
+class WriteBatcher:
+    """
+    Collects writes to a table and sends them through Airtable's batch endpoints.
+    Field updates to the same record are merged, so a record is only written once per batch.
+    Call flush() once done to send whatever is still queued.
+    """
+
+    def __init__(self, table: Table, batch_size: int = AIRTABLE_BATCH_SIZE):
+        self.table = table
+        self.batch_size = batch_size
+        # record id -> fields waiting to be written
+        self.pending_updates = {}
+        self.pending_creates = []
+
+    def update(self, record_id: str, fields: dict):
+        """
+        This function queues a field update for a record, merging it with any update already queued
+        """
+        if not fields:
+            return
+
+        self.pending_updates.setdefault(record_id, {}).update(fields)
+
+        if len(self.pending_updates) >= self.batch_size:
+            self.flush_updates()
+
+    def create(self, fields: dict):
+        """
+        This function queues a new record
+        """
+        self.pending_creates.append(fields)
+
+        if len(self.pending_creates) >= self.batch_size:
+            self.flush_creates()
+
+    def flush_updates(self) -> list:
+        """
+        This function writes every queued update and returns the updated records
+        """
+        records = [
+            {"id": record_id, "fields": fields}
+            for record_id, fields in self.pending_updates.items()
+        ]
+        self.pending_updates = {}
+
+        if not records:
+            return []
+
+        return self.table.batch_update(records)
+
+    def flush_creates(self) -> list:
+        """
+        This function creates every queued record and returns the new records
+        """
+        records = self.pending_creates
+        self.pending_creates = []
+
+        if not records:
+            return []
+
+        return self.table.batch_create(records)
+
+    def flush(self):
+        self.flush_creates()
+        self.flush_updates()
@@ -1,20 +1,42 @@
+import asyncio
 import os
-from typing import List
+from typing import List, Optional, Tuple
+from urllib.parse import urlencode
 
 from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse
 from fastapi_cache import FastAPICache
-from fastapi_cache.backends.redis import RedisBackend
 from fastapi_cache.decorator import cache
 from redis import asyncio as aioredis
 
-from helpers.air_table import (get_all_clubs, get_all_leaders, get_club_by_id,
-                               get_club_by_name, get_old_clubs)
-from helpers.classes import ClubElement, Leader, OldClub
+from helpers.air_table import (airtable_async, autocomplete_clubs_async,
+                               get_all_clubs_async, get_club_by_id_async,
+                               get_club_by_name_async, get_clubs_in_bbox_async,
+                               get_leader_records_async,
+                               get_map_clusters_async, get_old_clubs_async,
+                               get_tile_async,
+                               nearby_clubs_async, search_clubs_async)
+from helpers.classes import (ClubElement, Leader, MapFeature, NearbyClub,
+                             OldClub, Suggestion)
+from helpers.pagination import (PaginationError, paginate, parse_fields,
+                                select_fields)
+from helpers.rendered import (RenderedBody, choose_encoding, encoded_etag,
+                              etag_matches, make_etag, not_modified, render,
+                              rendered_response)
+from helpers.single_flight import single_flight
+from helpers.swr import swr_cache
+from helpers.tiles import TILE_MAX_ZOOM
+from helpers.two_tier import TwoTierBackend
+from helpers.warmup import CacheWarmer, popular_club_ids, record_club_hit
 from scripts.old_clubs_update import update_old_clubs
 
 load_dotenv()
 
+# Used when a cursor is given without a limit
+DEFAULT_PAGE_SIZE = int(os.environ.get("DEFAULT_PAGE_SIZE", 100))
+MAX_PAGE_SIZE = 1000
+
 app = FastAPI()
 
 
@@ -42,7 +64,20 @@ app = FastAPI(
 @app.on_event("startup")
 async def startup():
     redis = aioredis.from_url(os.environ.get("REDIS_URL"))
-    FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
+    # an in-process cache in front of Redis, kept in sync with the other workers over pub/sub
+    backend = TwoTierBackend(redis)
+    FastAPICache.init(backend, prefix="fastapi-cache")
+    await backend.start()
+
+    # fill the caches before taking requests, then keep them warm
+    await warmer.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await warmer.stop()
+    await FastAPICache.get_backend().stop()
+    await airtable_async.aclose()
 
 # Define middleware function to add CORS headers
 
@@ -52,40 +87,241 @@ async def add_cors_header(request, call_next):
     response = await call_next(request)
     response.headers["Access-Control-Allow-Origin"] = "*"
     response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
-    response.headers["Access-Control-Allow-Headers"] = "Content-Type"
+    response.headers["Access-Control-Allow-Headers"] = "Content-Type, If-None-Match"
+    response.headers["Access-Control-Expose-Headers"] = "ETag, X-Next-Cursor, Link"
     return response
 
 
-@app.get("/leaders")
-@cache(expire=1800)
-def leaders() -> List[Leader]:
-    return get_all_leaders()
+@single_flight()
+async def fetch_leaders() -> List[Tuple[str, Leader]]:
+    return await get_leader_records_async()
+
+
+@single_flight()
+async def fetch_clubs() -> List[ClubElement]:
+    return await get_all_clubs_async()
+
+
+@swr_cache()
+async def cached_leaders() -> RenderedBody:
+    records = await fetch_leaders()
+
+    # leaders are paged on their airtable record ids, which they don't include
+    return await render(
+        [leader for _, leader in records], keys=[record_id for record_id, _ in records]
+    ).precompress()
+
+
+@swr_cache()
+async def cached_clubs() -> RenderedBody:
+    return await render(await fetch_clubs()).precompress()
+
+
+def list_response(
+    request: Request,
+    rendered: RenderedBody,
+    model,
+    key: Optional[str],
+    limit: Optional[int],
+    cursor: Optional[str],
+    fields: Optional[str],
+) -> Response:
+    """
+    Pages and trims a cached list, the cursor for the next page is sent in the X-Next-Cursor and Link headers
+    so the body stays a plain list. Pages go by the key field of the items, or the keys rendered with the list
+    when key is None.
+    A page's ETag is derived from the whole list's and the query, so a 304 doesn't need the list parsed.
+    Whether the page gets compressed isn't known until it is built, so both the ETag it is sent with
+    compressed and the plain one small pages are sent with are matched.
+    """
+    if limit == None and not cursor and not fields:
+        return rendered_response(request, rendered)
+
+    query = urlencode(sorted(request.query_params.multi_items()))
+    etag = make_etag(rendered.etag.encode("ascii"), query.encode("utf-8"))
+    encoding = choose_encoding(request.headers.get("accept-encoding"))
+
+    for candidate in (encoded_etag(etag, encoding), etag):
+        if etag_matches(request.headers.get("if-none-match"), candidate):
+            return not_modified(candidate)
+
+    items = rendered.json()
+    headers = {}
+
+    try:
+        if limit != None or cursor:
+            keys = rendered.keys if key == None else [item.get(key) for item in items]
+            items, next_cursor = paginate(items, keys, limit or DEFAULT_PAGE_SIZE, cursor)
+
+            if next_cursor != None:
+                next_url = request.url.include_query_params(cursor=next_cursor)
+                headers["X-Next-Cursor"] = next_cursor
+                headers["Link"] = f'<{next_url}>; rel="next"'
+
+        if fields:
+            items = select_fields(items, parse_fields(fields, model))
+    except PaginationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return rendered_response(request, render(items), etag, headers)
+
+
+@app.get("/leaders", response_model=List[Leader])
+async def leaders(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma separated, like name,socials.github"),
+):
+    return list_response(
+        request, await cached_leaders(), Leader, None, limit, cursor, fields
+    )
+
+
+@app.get("/clubs", response_model=List[ClubElement])
+async def clubs(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma separated, like id,name,geo_data.coordinates"),
+):
+    return list_response(
+        request, await cached_clubs(), ClubElement, "id", limit, cursor, fields
+    )
+
+
+@app.get("/clubs/search", response_model=List[ClubElement])
+async def clubs_search(
+    request: Request, q: str = Query(..., min_length=1), limit: int = Query(20, ge=1, le=100)
+):
+    return rendered_response(request, render(await search_clubs_async(q, limit)))
+
 
+@app.get("/clubs/autocomplete")
+async def clubs_autocomplete(
+    prefix: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=50)
+) -> List[Suggestion]:
+    return await autocomplete_clubs_async(prefix, limit)
 
-@app.get("/clubs")
-@cache(expire=1800)
-def clubs() -> List[ClubElement]:
-    clubs = get_all_clubs()
-    return clubs
 
+@app.get("/clubs/nearby")
+async def clubs_nearby(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(50, gt=0, le=20000),
+    limit: int = Query(20, ge=1, le=100),
+) -> List[NearbyClub]:
+    return await nearby_clubs_async(lat, lon, radius_km, limit)
 
-@app.get("/club/name/{name}")
-@cache(expire=1800)
-def club_by_name(name: str) -> ClubElement:
-    return get_club_by_name(name)
 
+@app.get("/clubs/bbox", response_model=List[ClubElement])
+async def clubs_in_bbox(
+    request: Request,
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+):
+    """
+    Returns every club inside the box, min_lon > max_lon means the box crosses the antimeridian
+    """
+    return rendered_response(
+        request, render(await get_clubs_in_bbox_async(min_lat, min_lon, max_lat, max_lon))
+    )
 
-@app.get("/club/id/{id}")
-@cache(expire=1800)
-def club_by_id(id: int) -> ClubElement:
-    return get_club_by_id(id)
 
+def not_found(rendered: RenderedBody) -> bool:
+    return rendered.body == b"null"
 
-@app.get('/clubs/old')
-@cache(expire=1800)
-def old_clubs() -> List[OldClub]:
-    return get_old_clubs()
+
+@swr_cache(is_missing=not_found)
+async def cached_club_by_name(name: str) -> RenderedBody:
+    return await render(await get_club_by_name_async(name)).precompress()
+
+
+@swr_cache(is_missing=not_found)
+async def cached_club_by_id(id: int) -> RenderedBody:
+    return await render(await get_club_by_id_async(id)).precompress()
+
+
+@swr_cache()
+async def cached_old_clubs() -> RenderedBody:
+    return await render(await get_old_clubs_async()).precompress()
+
+
+async def warm_popular_clubs():
+    await asyncio.gather(
+        *(cached_club_by_id.warm(id) for id in await popular_club_ids())
+    )
+
+
+warmer = CacheWarmer(
+    {
+        "clubs": cached_clubs.warm,
+        "leaders": cached_leaders.warm,
+        "old_clubs": cached_old_clubs.warm,
+        "popular_clubs": warm_popular_clubs,
+    }
+)
+
+
+@app.get("/health")
+async def health():
+    """
+    Reports whether the caches have been warmed, with a 503 until every collection has been at least once
+    """
+    status = warmer.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.get("/club/name/{name}", response_model=ClubElement)
+async def club_by_name(request: Request, name: str):
+    return rendered_response(request, await cached_club_by_name(name))
+
+
+@app.get("/club/id/{id}", response_model=ClubElement)
+async def club_by_id(request: Request, id: int):
+    rendered = await cached_club_by_id(id)
+
+    if not not_found(rendered):
+        record_club_hit(id)
+
+    return rendered_response(request, rendered)
+
+
+@app.get('/clubs/old', response_model=List[OldClub])
+async def old_clubs(request: Request):
+    return rendered_response(request, await cached_old_clubs())
 
 @app.get('/refresh_old_missing')
 def refresh_old_missing() -> bool:
-    return update_old_clubs() == True
\ No newline at end of file
+    return update_old_clubs() == True
+
+
+@app.get("/map/clusters")
+async def map_clusters(
+    bbox: str = Query(..., description="min_lon,min_lat,max_lon,max_lat"),
+    zoom: int = Query(..., ge=0, le=24),
+) -> List[MapFeature]:
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(x) for x in bbox.split(","))
+    except ValueError:
+        raise HTTPException(
+            status_code=422, detail="bbox must be min_lon,min_lat,max_lon,max_lat"
+        )
+
+    return await get_map_clusters_async(min_lon, min_lat, max_lon, max_lat, zoom)
+
+
+@app.get("/tiles/{z}/{x}/{y}.mvt")
+async def vector_tile(z: int, x: int, y: int):
+    """
+    Returns a Mapbox Vector Tile of the clubs (club layer) and old clubs (old_club layer)
+    """
+    if not 0 <= z <= TILE_MAX_ZOOM or not 0 <= x < 2**z or not 0 <= y < 2**z:
+        raise HTTPException(status_code=404, detail="Tile not found")
+
+    return Response(
+        await get_tile_async(z, x, y),
+        media_type="application/vnd.mapbox-vector-tile",
+    )
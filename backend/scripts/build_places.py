@@ -0,0 +1,64 @@
+# Description: This script builds helpers/data/places.csv.gz, the dataset the offline reverse geocoder searches
+# Usage: python -m scripts.build_places <cities.csv>
+# The input is a GeoNames cities export as lat,lon,name,admin1,admin2,cc (like rg_cities1000.csv from the reverse_geocoder
+# package). GeoNames data is licensed under CC BY 4.0, https://www.geonames.org
+
+import csv
+import gettext
+import gzip
+import sys
+
+import pycountry
+
+from helpers.offline_geocoder import PLACES_PATH
+from helpers.search import normalize
+
+
+def subdivision_codes() -> dict:
+    """
+    This function returns (country code, normalized name) -> ISO 3166-2 code for every top level subdivision,
+    under both its local and English name
+    """
+    english = gettext.translation(
+        "iso3166-2", pycountry.LOCALES_DIR, languages=["en"], fallback=True
+    )
+    codes = {}
+
+    for subdivision in pycountry.subdivisions:
+        if subdivision.parent_code is not None:
+            continue
+
+        for name in (subdivision.name, english.gettext(subdivision.name)):
+            codes[(subdivision.country_code, normalize(name))] = subdivision.code
+
+    return codes
+
+
+def build_places(source: str):
+    codes = subdivision_codes()
+    places = set()
+
+    with open(source, encoding="utf-8") as file:
+        for row in csv.DictReader(file):
+            places.add(
+                (
+                    round(float(row["lat"]), 4),
+                    round(float(row["lon"]), 4),
+                    row["cc"],
+                    row["admin1"],
+                    codes.get((row["cc"], normalize(row["admin1"])), ""),
+                )
+            )
+
+    with gzip.open(PLACES_PATH, "wt", encoding="utf-8", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["lat", "lon", "cc", "admin1", "iso"])
+        writer.writerows(sorted(places, key=lambda place: (place[2], place[3])))
+
+    print(f"Wrote {len(places)} places to {PLACES_PATH}")
+
+    return True
+
+
+if __name__ == "__main__":
+    build_places(sys.argv[1])
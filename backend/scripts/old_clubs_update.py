@@ -1,37 +1,49 @@
 from helpers.air_table import old_clubs_table
-from helpers.geo import get_continent, lookup_lat_long
+from helpers.geo import get_continent, lookup_lat_longs
+from helpers.rate_limit import BACKGROUND, use_lane
+from helpers.write_batcher import WriteBatcher
 
 from pyairtable.formulas import match, AND
 
 formula = match({"Status": "active"})
 
+fields = ["Venue", "Status", "Latitude", "Longitude", "Address Country", "Continent"]
 
-def update_old_clubs():
 
-    print(formula)
+def needs_update(club: dict) -> bool:
+    """
+    This function takes an old club record and returns whether it is active, placed and missing its continent
+    """
+    if "Venue" not in club["fields"]:
+        return False
+
+    if "Status" not in club["fields"] or club["fields"]["Status"] != "active":
+        return False
+
+    if not "Latitude" in club["fields"] or not "Longitude" in club["fields"]:
+        return False
 
-    for club in old_clubs_table.all(formula=formula):
-        if "Venue" not in club["fields"]:
-            continue
+    return "Continent" not in club["fields"]
 
-        if "Status" not in club["fields"] or club["fields"]["Status"] != "active":
-            continue
 
-        if not "Latitude" in club["fields"] or not "Longitude" in club["fields"]:
-            continue
- 
-        if "Continent" in club["fields"]:
-            continue
+@use_lane(BACKGROUND)
+def update_old_clubs():
+
+    print(formula)
 
-        look_up = lookup_lat_long(
-            club["fields"]["Latitude"], club["fields"]["Longitude"]
-        )
+    # Updates are queued and sent 10 records at a time
+    updates = WriteBatcher(old_clubs_table)
 
+    # Clubs are geocoded concurrently, a club whose lookup fails is skipped until the next run
+    for club, look_up in lookup_lat_longs(
+        filter(needs_update, old_clubs_table.all(formula=formula, fields=fields)),
+        lambda club: (club["fields"]["Latitude"], club["fields"]["Longitude"]),
+    ):
         if "Address Country" in club["fields"] and "country" in look_up:
             if club["fields"]["Address Country"] != look_up["country"]:
                 continue
 
-            old_clubs_table.update(
+            updates.update(
                 club["id"],
                 {
                     "Continent": get_continent(look_up["country_code"].upper()),
@@ -41,7 +53,7 @@ def update_old_clubs():
             if "country" not in look_up:
                 continue
 
-            old_clubs_table.update(
+            updates.update(
                 club["id"],
                 {
                     "Address Country": look_up["country"],
@@ -49,6 +61,8 @@ def update_old_clubs():
                 },
             )
 
+    updates.flush()
+
     return True
 
 
@@ -2,10 +2,24 @@
 
 
 from helpers.air_table import club_leaders, clubs_table
-from helpers.geo import get_continent, lookup_lat_long
+from helpers.geo import get_continent, lookup_lat_longs
+from helpers.rate_limit import BACKGROUND, set_lane
 from helpers.slack_minor import slack_lookup_user_display
+from helpers.write_batcher import WriteBatcher
 
-for leader in club_leaders.all():
+# Leave the bot's share of the Airtable budget alone
+set_lane(BACKGROUND)
+
+# Every missing field of a record is merged into one update, and updates are sent 10 records at a time
+leader_updates = WriteBatcher(club_leaders)
+club_updates = WriteBatcher(clubs_table)
+
+# Only the columns the loops below look at are downloaded
+leader_fields = ['Name', 'Slack ID', 'Pronouns', 'Website', 'Scrapbook', 'Avatar', 'Github']
+club_fields = ['Club Name', 'Latitude', 'Longitude', 'Country',
+               'Postcode', 'State', 'State ISO Code', 'Continent']
+
+for leader in club_leaders.all(fields=leader_fields):
 
     """
     This loop checks if the leader's profile is up to date and updates it if it isn't
@@ -17,24 +31,29 @@ for leader in club_leaders.all():
 
         if slack_data != -1:
             if 'Pronouns' not in leader['fields'] and slack_data['pronouns']:
-                club_leaders.update(
+                leader_updates.update(
                     leader['id'], {'Pronouns': slack_data['pronouns']})
             if 'Website' not in leader['fields'] and slack_data['website']:
-                club_leaders.update(
+                leader_updates.update(
                     leader['id'], {'Website': slack_data['website']})
             if 'Scrapbook' not in leader['fields'] and slack_data['scrapbook']:
-                club_leaders.update(
+                leader_updates.update(
                     leader['id'], {'Scrapbook': slack_data['scrapbook']})
             if 'Avatar' not in leader['fields'] and slack_data['avatar']:
-                club_leaders.update(
+                leader_updates.update(
                     leader['id'], {'Avatar': slack_data['avatar']})
             if 'Github' not in leader['fields'] and slack_data['github']:
-                club_leaders.update(
+                leader_updates.update(
                     leader['id'], {'Github': slack_data['github']})
 
             print(f"Updated {leader['fields']['Name']}'s profile")
 
-for club in clubs_table.all():
+leader_updates.flush()
+
+# Clubs are geocoded concurrently, a club whose lookup fails is skipped until the next run
+for club, look_up in lookup_lat_longs(
+        clubs_table.all(fields=club_fields),
+        lambda club: (club['fields']['Latitude'][0], club['fields']['Longitude'][0])):
 
     """
     This loop checks if the club's profile (geo_data) is up to date and updates it if it isn't
@@ -42,26 +61,29 @@ for club in clubs_table.all():
 
     print(club['fields'])
 
-    look_up = lookup_lat_long(
-        club['fields']['Latitude'][0], club['fields']['Longitude'][0])
+    if 'country_code' not in look_up:
+        print(f"Couldn't look up {club['fields']['Club Name']}'s location, skipping")
+        continue
 
     if 'Country' not in club['fields']:
-        clubs_table.update(club['id'], {'Country': look_up['country'], 'Country Code': look_up['country_code'].upper(
+        club_updates.update(club['id'], {'Country': look_up['country'], 'Country Code': look_up['country_code'].upper(
         ), 'Continent': get_continent(look_up['country_code'].upper())})
 
     if 'Postcode' not in club['fields'] and 'postcode' in look_up:
-        clubs_table.update(club['id'], {'Postcode': look_up['postcode']})
+        club_updates.update(club['id'], {'Postcode': look_up['postcode']})
 
     if 'State' not in club['fields'] and 'state' in look_up:
-        clubs_table.update(club['id'], {'State': look_up['state']})
+        club_updates.update(club['id'], {'State': look_up['state']})
 
     if 'State ISO Code' not in club['fields'] and 'ISO3166-2-lvl4' in look_up:
-        clubs_table.update(
+        club_updates.update(
             club['id'], {'State ISO Code': look_up['ISO3166-2-lvl4']})
 
     if 'Continent' not in club['fields']:
-        clubs_table.update(
+        club_updates.update(
             club['id'], {'Continent': get_continent(look_up['country_code'].upper())})
 
     print(look_up)
     print(f"Updated {club['fields']['Club Name']}'s profile")
+
+club_updates.flush()
@@ -0,0 +1,30 @@
+# Description: This script syncs the local SQLite mirror of the Airtable base, run it from cron or a release phase to keep the mirror warm
+
+import sys
+
+from helpers.air_table import (AIRTABLE_SQLITE_PATH, club_leaders, clubs_table,
+                               mirror, old_clubs_table)
+from helpers.mirror import SQLiteMirror
+from helpers.rate_limit import BACKGROUND, set_lane
+
+# A full sync pages through every table, keep it out of the budget the API serves requests from
+set_lane(BACKGROUND)
+
+
+def sync_mirror(full: bool = False):
+    """
+    This function syncs every table into the SQLite mirror, only fetching what changed since the last sync unless full is set
+    """
+    sqlite_mirror = mirror if mirror is not None else SQLiteMirror(AIRTABLE_SQLITE_PATH)
+
+    for table in (clubs_table, club_leaders, old_clubs_table):
+        table.snapshot.mirror = sqlite_mirror
+        table.snapshot.refresh(full=full)
+
+        print(f"Synced {len(table.snapshot.records)} records from {table.table_name}")
+
+    return True
+
+
+if __name__ == "__main__":
+    sync_mirror(full="--full" in sys.argv)
@@ -0,0 +1,53 @@
+from helpers.autocomplete import Autocomplete
+
+
+def make_autocomplete() -> Autocomplete:
+    return Autocomplete(
+        [
+            ("Club 1 Robotics", "club"),
+            ("Robotics Lab", "venue"),
+            ("Río de Janeiro", "location"),
+            ("Hack Club", "club"),
+            ("Hack Club", "old_club"),
+            ("", "venue"),
+            (None, "location"),
+        ]
+    )
+
+
+def test_prefix_matches_come_before_word_matches():
+    suggestions = make_autocomplete().complete("robo")
+
+    assert suggestions == [
+        {"text": "Robotics Lab", "kind": "venue"},
+        {"text": "Club 1 Robotics", "kind": "club"},
+    ]
+
+
+def test_prefix_is_normalized():
+    assert make_autocomplete().complete("  RIO ") == [
+        {"text": "Río de Janeiro", "kind": "location"}
+    ]
+
+
+def test_same_text_of_different_kinds():
+    assert make_autocomplete().complete("hack") == [
+        {"text": "Hack Club", "kind": "club"},
+        {"text": "Hack Club", "kind": "old_club"},
+    ]
+
+
+def test_limit_and_no_duplicates():
+    suggestions = make_autocomplete().complete("club", limit=10)
+
+    # "Hack Club" matches on a later word only once per kind
+    assert [suggestion["text"] for suggestion in suggestions] == [
+        "Club 1 Robotics",
+        "Hack Club",
+        "Hack Club",
+    ]
+    assert len(make_autocomplete().complete("club", limit=1)) == 1
+
+
+def test_empty_prefix():
+    assert make_autocomplete().complete("   ") == []
@@ -0,0 +1,83 @@
+import pytest
+
+from helpers.clusters import (ClusterIndex, mercator_latitude,
+                              mercator_longitude, mercator_x, mercator_y)
+
+
+def place(name: str, latitude: float, longitude: float) -> dict:
+    return {"id": name, "name": name, "kind": "club", "latitude": latitude, "longitude": longitude}
+
+
+PLACES = [
+    place("a", 40.0, -74.0),
+    place("b", 40.01, -74.01),
+    place("c", 40.02, -73.99),
+    place("d", -33.9, 151.2),
+    place("e", 10.0, 179.9),
+]
+
+WORLD = (-180, -85, 180, 85)
+
+
+def total(features: list) -> int:
+    return sum(feature["count"] for feature in features)
+
+
+def test_mercator_round_trip():
+    for latitude, longitude in [(0, 0), (51.5, -0.12), (-33.9, 151.2)]:
+        assert mercator_longitude(mercator_x(longitude)) == pytest.approx(longitude)
+        assert mercator_latitude(mercator_y(latitude)) == pytest.approx(latitude)
+
+
+def test_mercator_clamps_the_poles():
+    assert mercator_y(90) == mercator_y(89)
+    assert mercator_y(90) == pytest.approx(0, abs=1e-9)
+    assert mercator_y(-90) == pytest.approx(1)
+
+
+def test_every_place_is_counted_once_per_zoom():
+    index = ClusterIndex(PLACES)
+
+    for zoom in range(0, index.max_zoom + 2):
+        assert total(index.get_clusters(*WORLD, zoom)) == len(PLACES)
+
+
+def test_close_places_merge_when_zoomed_out():
+    index = ClusterIndex(PLACES)
+
+    zoomed_out = index.get_clusters(*WORLD, 2)
+    cluster = next(feature for feature in zoomed_out if feature["kind"] == "cluster")
+
+    assert cluster["count"] == 3
+    assert cluster["latitude"] == pytest.approx(40.01, abs=0.01)
+    assert cluster["longitude"] == pytest.approx(-74.0, abs=0.01)
+    assert cluster["expansion_zoom"] > 2
+
+    # at the zoom it expands at, it's split up
+    expanded = index.get_clusters(*WORLD, cluster["expansion_zoom"])
+    assert max(feature["count"] for feature in expanded) < 3
+
+
+def test_places_come_back_on_their_own_past_max_zoom():
+    index = ClusterIndex(PLACES)
+
+    features = index.get_clusters(*WORLD, 30)
+
+    assert sorted(feature["name"] for feature in features) == ["a", "b", "c", "d", "e"]
+    assert all(feature["count"] == 1 and feature["expansion_zoom"] is None for feature in features)
+
+
+def test_bounding_box_across_the_antimeridian():
+    index = ClusterIndex(PLACES)
+
+    features = index.get_clusters(170, 0, -170, 20, 5)
+
+    assert [feature["name"] for feature in features] == ["e"]
+
+
+def test_bounding_box_filters():
+    index = ClusterIndex(PLACES)
+
+    features = index.get_clusters(140, -40, 160, -30, 10)
+
+    assert [feature["name"] for feature in features] == ["d"]
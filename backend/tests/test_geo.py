@@ -0,0 +1,208 @@
+import time
+
+import numpy as np
+import pytest
+from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
+
+from helpers import geo
+from helpers.geocode_cache import GeocodeCache
+from helpers.offline_geocoder import KDTree, OfflineGeocoder, to_xyz
+
+
+class FakeBucket:
+    def __init__(self, wait: float = 0):
+        self.wait = wait
+
+    def try_acquire(self, reserve: float = 0) -> float:
+        return self.wait
+
+
+class FakeLocation:
+    def __init__(self, address: dict):
+        self.raw = {"address": address}
+
+
+class FakeGeolocator:
+    """
+    Raises the given errors in turn, then answers with the coordinates it was asked for
+    """
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def reverse(self, query, language=None, timeout=None):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return FakeLocation({"query": query})
+
+
+@pytest.fixture
+def geolocator(monkeypatch):
+    """
+    Replaces the Nominatim client and its rate limit, retries wait 0.1s
+    """
+    monkeypatch.setattr(geo, "nominatim_bucket", FakeBucket())
+    monkeypatch.setattr(geo, "retry_delay", lambda attempt: 0.1)
+
+    def use(fake):
+        monkeypatch.setattr(geo, "geolocator", fake)
+        return fake
+
+    return use
+
+
+@pytest.fixture(scope="module")
+def offline():
+    return OfflineGeocoder()
+
+
+@pytest.fixture
+def nominatim(monkeypatch, tmp_path):
+    """
+    Replaces Nominatim with a stub, returns the coordinates it was asked for
+    """
+    asked = []
+
+    def reverse(latitude, longitude, deadline):
+        asked.append((latitude, longitude))
+        return {"country": "Nominatim", "postcode": "12345"}
+
+    monkeypatch.setattr(geo, "reverse_nominatim", reverse)
+    monkeypatch.setattr(
+        geo, "geocode_cache", GeocodeCache(str(tmp_path / "geocode.sqlite3"), 4, 60, 100)
+    )
+    return asked
+
+
+def test_kd_tree_nearest_matches_a_full_scan():
+    rng = np.random.default_rng(1)
+    points = rng.normal(size=(500, 3))
+    points /= np.linalg.norm(points, axis=1)[:, None]
+    tree = KDTree(points)
+
+    for query in rng.normal(size=(20, 3)):
+        index, distance = tree.nearest(query)
+        distances = ((points - query) ** 2).sum(axis=1)
+
+        assert index == int(distances.argmin())
+        assert distance == pytest.approx(distances.min())
+
+
+def test_offline_uses_nominatims_country_names(offline):
+    assert offline.reverse(55.75, 37.62)["country"] == "Russia"
+    assert offline.reverse(37.56, 126.97)["country"] == "South Korea"
+
+    london = offline.reverse(51.5, -0.12)
+    assert london["country"] == "United Kingdom"
+    assert london["country_code"] == "gb"
+    assert london["ISO3166-2-lvl4"] == "GB-ENG"
+
+
+def test_offline_nothing_nearby(offline):
+    # the middle of the Pacific
+    assert offline.reverse(-30, -140) is None
+
+
+def test_nominatim_by_default(monkeypatch, nominatim):
+    monkeypatch.setattr(geo, "GEOCODER", "nominatim")
+
+    assert geo.lookup_lat_long(51.5, -0.12)["postcode"] == "12345"
+    # the second lookup is cached
+    geo.lookup_lat_long(51.5, -0.12)
+    assert nominatim == [(51.5, -0.12)]
+
+
+def test_offline_with_an_iso_code(monkeypatch, nominatim):
+    monkeypatch.setattr(geo, "GEOCODER", "offline")
+
+    assert geo.lookup_lat_long(51.5, -0.12)["ISO3166-2-lvl4"] == "GB-ENG"
+    assert nominatim == []
+
+
+def test_offline_falls_back_without_an_iso_code(monkeypatch, nominatim):
+    monkeypatch.setattr(geo, "GEOCODER", "offline")
+
+    assert geo.lookup_lat_long(55.75, 37.62)["country"] == "Nominatim"
+    assert nominatim == [(55.75, 37.62)]
+
+
+def test_offline_without_fallback(monkeypatch, nominatim):
+    monkeypatch.setattr(geo, "GEOCODER", "offline")
+    monkeypatch.setattr(geo, "GEOCODER_FALLBACK", False)
+
+    assert geo.lookup_lat_long(55.75, 37.62)["country"] == "Russia"
+    assert geo.lookup_lat_long(-30, -140) == {}
+    assert nominatim == []
+
+
+def test_offline_result_when_nominatim_fails(monkeypatch, nominatim):
+    monkeypatch.setattr(geo, "GEOCODER", "offline")
+    monkeypatch.setattr(geo, "reverse_nominatim", lambda *args: None)
+
+    assert geo.lookup_lat_long(55.75, 37.62)["country"] == "Russia"
+    assert geo.lookup_lat_long(-30, -140) == {}
+
+
+def test_to_xyz_is_on_the_unit_sphere():
+    assert np.linalg.norm(to_xyz(12.3, -45.6)) == pytest.approx(1)
+    assert to_xyz(0, 180) == pytest.approx(to_xyz(0, -180))
+
+
+def test_reverse_nominatim_retries(geolocator):
+    fake = geolocator(FakeGeolocator(GeocoderTimedOut(), GeocoderUnavailable()))
+
+    assert geo.reverse_nominatim(1, 2, time.monotonic() + 5) == {"query": "1, 2"}
+    assert fake.calls == 3
+
+
+def test_reverse_nominatim_gives_up_at_the_deadline(geolocator):
+    fake = geolocator(FakeGeolocator(*[GeocoderTimedOut()] * 100))
+    started = time.monotonic()
+
+    assert geo.reverse_nominatim(1, 2, started + 0.35) == None
+    assert time.monotonic() - started < 0.35
+    # tried at 0, 0.1, 0.2 and 0.3, the next retry would be past the deadline
+    assert 2 <= fake.calls <= 4
+
+
+def test_reverse_nominatim_does_not_wait_past_the_deadline_for_the_rate_limit(monkeypatch, geolocator):
+    fake = geolocator(FakeGeolocator())
+    monkeypatch.setattr(geo, "nominatim_bucket", FakeBucket(wait=60))
+    started = time.monotonic()
+
+    assert geo.reverse_nominatim(1, 2, started + 5) == None
+    assert time.monotonic() - started < 1
+    assert fake.calls == 0
+
+
+def test_lookup_lat_longs_keeps_the_order(monkeypatch):
+    def lookup(latitude, longitude, timeout):
+        # later items finish first
+        time.sleep((10 - latitude) / 200)
+        return {"latitude": latitude}
+
+    monkeypatch.setattr(geo, "lookup_lat_long", lookup)
+    items = [{"n": n} for n in range(10)]
+
+    results = list(geo.lookup_lat_longs(items, lambda item: (item["n"], 0), workers=3))
+
+    assert [item for item, _ in results] == items
+    assert [location["latitude"] for _, location in results] == list(range(10))
+
+
+def test_lookup_lat_longs_failures_dont_stop_the_batch(monkeypatch, nominatim):
+    monkeypatch.setattr(geo, "GEOCODER", "nominatim")
+    reverse = geo.reverse_nominatim
+    monkeypatch.setattr(
+        geo,
+        "reverse_nominatim",
+        lambda latitude, longitude, deadline: None if latitude == 2 else reverse(latitude, longitude, deadline),
+    )
+
+    results = list(geo.lookup_lat_longs(range(4), lambda n: (n, 0), workers=2))
+
+    assert [n for n, _ in results] == [0, 1, 2, 3]
+    assert [location.get("country") for _, location in results] == ["Nominatim", "Nominatim", None, "Nominatim"]
+    assert results[2][1] == {}
@@ -0,0 +1,77 @@
+import threading
+
+from helpers.geocode_cache import GeocodeCache
+
+
+def test_file_is_created_on_first_use(tmp_path):
+    path = tmp_path / "geocode.sqlite3"
+    cache = GeocodeCache(str(path), precision=4, ttl=60, max_entries=10)
+
+    assert not path.exists()
+
+    assert cache.get(1, 2) is None
+    assert path.exists()
+
+
+def test_set_and_get_rounded(tmp_path):
+    cache = GeocodeCache(str(tmp_path / "geocode.sqlite3"), precision=2, ttl=60, max_entries=10)
+
+    cache.set(51.50001, -0.12001, {"country": "United Kingdom"})
+
+    assert cache.get(51.5, -0.12) == {"country": "United Kingdom"}
+    assert cache.get(51.51, -0.12) is None
+
+
+def test_entries_expire(tmp_path):
+    cache = GeocodeCache(str(tmp_path / "geocode.sqlite3"), precision=4, ttl=-1, max_entries=10)
+
+    cache.set(1, 2, {"country": "Somewhere"})
+
+    assert cache.get(1, 2) is None
+
+
+def test_least_recently_used_are_evicted(tmp_path):
+    cache = GeocodeCache(str(tmp_path / "geocode.sqlite3"), precision=4, ttl=60, max_entries=2)
+
+    cache.set(1, 1, {"n": 1})
+    cache.set(2, 2, {"n": 2})
+    cache.get(1, 1)
+    cache.set(3, 3, {"n": 3})
+
+    assert cache.get(2, 2) is None
+    assert cache.get(1, 1) == {"n": 1}
+    assert cache.get(3, 3) == {"n": 3}
+
+
+def test_threads_share_the_file(tmp_path):
+    cache = GeocodeCache(str(tmp_path / "geocode.sqlite3"), precision=4, ttl=60, max_entries=10)
+    cache.set(1, 2, {"n": 1})
+    found = []
+
+    thread = threading.Thread(target=lambda: found.append(cache.get(1, 2)))
+    thread.start()
+    thread.join()
+
+    assert found == [{"n": 1}]
+
+
+def test_threads_opening_a_new_file_at_once(tmp_path):
+    cache = GeocodeCache(str(tmp_path / "geocode.sqlite3"), precision=4, ttl=60, max_entries=100)
+    barrier = threading.Barrier(8)
+    errors = []
+
+    def use(n):
+        barrier.wait()
+        try:
+            cache.set(n, n, {"n": n})
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=use, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert [cache.get(n, n) for n in range(8)] == [{"n": n} for n in range(8)]
@@ -0,0 +1,110 @@
+from helpers.classes import ClubElement, Leader
+from helpers.mapper import map_club, map_leader, map_old_club
+
+
+def leader_fields(**fields):
+    return {
+        "Name": "Ada",
+        "Email": "ada@example.com",
+        "Slack ID": "U123",
+        "Github": "ada",
+        "Twitter": "ada_tweets",
+        **fields,
+    }
+
+
+def club_fields(**fields):
+    return {
+        "ID": 7,
+        "Club Name": "Code Club",
+        "To Display": True,
+        "Approved": True,
+        "Venue": ["Central High"],
+        "Location": ["Springfield"],
+        "Latitude": [51.5],
+        "Longitude": [-0.12],
+        "Country": ["United Kingdom"],
+        "Country Code": ["GB"],
+        "Continent": ["Europe"],
+        "Twitter": "codeclub",
+        "Github": "codeclub",
+        **fields,
+    }
+
+
+def test_columns_are_gated_by_their_display_field():
+    hidden = map_leader(leader_fields(**{"To Display": ["Github"]}))
+
+    assert hidden.email == None
+    assert hidden.socials.github == "ada"
+    assert hidden.socials.twitter == None
+    # slack_id has no display field
+    assert hidden.slack_id == "U123"
+
+    shown = map_leader(leader_fields(**{"To Display": ["Email", "Twitter"]}))
+
+    assert shown.email == "ada@example.com"
+    assert shown.socials.twitter == "ada_tweets"
+    assert shown.socials.github == None
+
+
+def test_club_socials_use_socials_to_display():
+    club = map_club(club_fields(**{"Socials to Display": ["Twitter"]}))
+
+    assert club.socials.twitter == "codeclub"
+    assert club.socials.github == None
+    assert map_club(club_fields()).socials.twitter == None
+
+
+def test_lookup_lists_are_unwrapped():
+    club = map_club(club_fields(), leaders=[])
+
+    assert club.venue == "Central High"
+    assert club.location == "Springfield"
+    assert club.geo_data.coordinates.latitude == 51.5
+    assert club.geo_data.country_code == "GB"
+    # an empty lookup is the same as a missing one
+    assert map_club(club_fields(Venue=[])).venue == None
+
+
+def test_defaults():
+    leader = map_leader({"Name": "Ada"})
+
+    assert leader.is_primary is False
+    assert leader.pronouns == None
+    assert leader.email == None
+    assert leader.slack_id == None
+
+    club = map_club({"ID": 1, "Club Name": "New"})
+
+    assert club.to_display is False
+    assert club.approved is False
+    assert club.geo_data.country == None
+    assert club.leaders == []
+
+
+def test_overrides():
+    leader = map_leader(leader_fields())
+    club = map_club(club_fields(), leaders=[leader])
+
+    assert club.leaders == [leader]
+
+
+def test_matches_a_validated_model():
+    fields = club_fields(**{"Socials to Display": ["Github"]})
+    leader = map_leader(leader_fields(**{"To Display": ["Email"]}))
+    club = map_club(fields, leaders=[leader])
+
+    # what the mapper builds is something validation accepts as is, hidden fields and all
+    assert ClubElement.parse_obj(club.dict()) == club
+    assert Leader.parse_obj(map_leader({"Name": "Ada"}).dict()).email == None
+    assert list(club.dict()) == list(ClubElement.__fields__)
+
+
+def test_old_clubs_read_plain_coordinates():
+    old_club = map_old_club({"Venue": "Library", "Latitude": 1.5, "Longitude": 2.5, "Continent": "Africa"})
+
+    assert old_club.name == "Library"
+    assert old_club.coordinates.latitude == 1.5
+    assert old_club.continent == "Africa"
+    assert old_club.country == None
@@ -0,0 +1,112 @@
+from typing import List, Optional
+
+import pytest
+from pydantic import BaseModel
+
+from helpers.pagination import (PaginationError, decode_cursor, encode_cursor,
+                                paginate, parse_fields, select_fields)
+
+
+class Coordinates(BaseModel):
+    latitude: float
+    longitude: float
+
+
+class Geo(BaseModel):
+    country: Optional[str]
+    coordinates: Coordinates
+
+
+class Item(BaseModel):
+    id: int
+    name: str
+    geo: Geo
+    tags: List[str]
+
+
+def pages(items: list, keys: list, limit: int) -> list:
+    result, cursor = [], None
+
+    while True:
+        page, cursor = paginate(items, keys, limit, cursor)
+        result.append(page)
+        if cursor == None:
+            return result
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(10, "recABC")
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (10, "recABC")
+
+
+@pytest.mark.parametrize("cursor", ["!!", "e30", encode_cursor(-1, "x")])
+def test_invalid_cursor(cursor):
+    with pytest.raises(PaginationError):
+        decode_cursor(cursor)
+
+
+def test_pages_cover_everything_once():
+    items = list(range(7))
+
+    assert pages(items, items, 3) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert pages(items, items, 7) == [items]
+    assert paginate([], [], 3) == ([], None)
+
+
+def test_next_page_after_an_insert_before_the_cursor():
+    keys = ["a", "b", "c", "d", "e"]
+    page, cursor = paginate(keys, keys, 2)
+    assert page == ["a", "b"]
+
+    keys = ["new", "a", "b", "c", "d", "e"]
+    assert paginate(keys, keys, 2, cursor)[0] == ["c", "d"]
+
+
+def test_next_page_after_a_removal_before_the_cursor():
+    keys = ["a", "b", "c", "d", "e"]
+    _, cursor = paginate(keys, keys, 3)
+
+    keys = ["b", "c", "d", "e"]
+    assert paginate(keys, keys, 3, cursor)[0] == ["d", "e"]
+
+
+def test_keys_are_separate_from_items():
+    # items with duplicate or missing fields, paged on keys they don't include
+    items = [{"slack_id": None}, {"slack_id": None}, {"slack_id": "U1"}]
+    keys = ["rec1", "rec2", "rec3"]
+
+    page, cursor = paginate(items, keys, 1)
+    page, cursor = paginate(items, keys, 1, cursor)
+    assert page == [items[1]]
+    assert decode_cursor(cursor) == (2, "rec2")
+
+
+def test_parse_fields():
+    assert parse_fields("id, geo.coordinates.latitude,geo.country", Item) == {
+        "id": None,
+        "geo": {"coordinates": {"latitude": None}, "country": None},
+    }
+    # the whole field wins over a part of it asked for after
+    assert parse_fields("geo,geo.country", Item) == {"geo": None}
+
+
+@pytest.mark.parametrize("fields", ["", " , ", "nope", "geo.nope", "tags.length", "id.value"])
+def test_parse_fields_rejects(fields):
+    with pytest.raises(PaginationError):
+        parse_fields(fields, Item)
+
+
+def test_select_fields():
+    items = [
+        {"id": 1, "name": "a", "geo": {"country": "US", "coordinates": {"latitude": 1, "longitude": 2}}},
+        {"id": 2, "name": "b", "geo": {"country": None, "coordinates": {"latitude": 3, "longitude": 4}}},
+    ]
+
+    spec = parse_fields("name,geo.coordinates.latitude", Item)
+
+    assert select_fields(items, spec) == [
+        {"name": "a", "geo": {"coordinates": {"latitude": 1}}},
+        {"name": "b", "geo": {"coordinates": {"latitude": 3}}},
+    ]
@@ -0,0 +1,176 @@
+import asyncio
+import gzip
+import json
+
+import brotli
+from starlette.requests import Request
+
+from helpers.rendered import (COMPRESS_MIN_BYTES, RenderedCoder,
+                              choose_encoding, encoded_etag, etag_matches,
+                              make_etag, render, rendered_response)
+
+
+def request(**headers) -> Request:
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/",
+            "headers": [
+                (name.replace("_", "-").encode("latin-1"), value.encode("latin-1"))
+                for name, value in headers.items()
+            ],
+        }
+    )
+
+
+def test_render_matches_fastapi_json():
+    rendered = render({"name": "Café", "count": 1, "nested": [None, True]})
+
+    assert rendered.body == '{"name":"Café","count":1,"nested":[null,true]}'.encode("utf-8")
+    assert rendered.json() == {"name": "Café", "count": 1, "nested": [None, True]}
+
+
+def test_etag_depends_on_the_body():
+    assert render([1]).etag == render([1]).etag
+    assert render([1]).etag != render([2]).etag
+    assert make_etag(b"a", b"b") != make_etag(b"ab")
+    assert render([1]).etag.startswith('"') and render([1]).etag.endswith('"')
+
+
+def test_etag_matches():
+    etag = '"abc"'
+
+    assert etag_matches('"abc"', etag)
+    assert etag_matches('"x", W/"abc"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"abcd"', etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches("", etag)
+
+
+def test_response_has_the_etag():
+    rendered = render({"a": 1})
+
+    response = rendered_response(request(), rendered, headers={"X-Next-Cursor": "c"})
+
+    assert response.status_code == 200
+    assert response.body == rendered.body
+    assert response.headers["etag"] == rendered.etag
+    assert response.headers["x-next-cursor"] == "c"
+    assert response.media_type == "application/json"
+
+
+def test_not_modified():
+    rendered = render({"a": 1})
+
+    response = rendered_response(request(if_none_match=rendered.etag), rendered)
+
+    assert response.status_code == 304
+    assert response.body == b""
+    assert response.headers["etag"] == rendered.etag
+
+
+def test_etag_override():
+    rendered = render([1, 2, 3])
+    etag = make_etag(rendered.etag.encode("ascii"), b"limit=1")
+
+    response = rendered_response(request(if_none_match=etag), rendered, etag)
+
+    assert response.status_code == 304
+    assert json.loads(rendered_response(request(), rendered, etag).body) == [1, 2, 3]
+
+
+def big_body() -> list:
+    return [{"id": i, "name": f"Club {i}"} for i in range(COMPRESS_MIN_BYTES // 10)]
+
+
+def test_choose_encoding():
+    assert choose_encoding(None) is None
+    assert choose_encoding("identity") is None
+    assert choose_encoding("gzip, deflate, br") == "br"
+    assert choose_encoding("gzip") == "gzip"
+    assert choose_encoding("br;q=0.5, gzip;q=0.8") == "gzip"
+    assert choose_encoding("br;q=0, gzip;q=0") is None
+    assert choose_encoding("*") == "br"
+    assert choose_encoding("*;q=0.1, br;q=0") == "gzip"
+    assert choose_encoding("GZIP;q=bad, br;q=0") is None
+
+
+def test_precompress():
+    rendered = asyncio.run(render(big_body()).precompress())
+
+    assert set(rendered.variants) == {"br", "gzip"}
+    assert brotli.decompress(rendered.variants["br"]) == rendered.body
+    assert gzip.decompress(rendered.variants["gzip"]) == rendered.body
+
+    small = asyncio.run(render([1]).precompress())
+    assert small.variants == {}
+
+
+def test_compressed_response_has_its_own_etag():
+    rendered = asyncio.run(render(big_body()).precompress())
+
+    response = rendered_response(request(accept_encoding="gzip, br"), rendered)
+
+    assert response.headers["content-encoding"] == "br"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"] == rendered.etag[:-1] + '-br"'
+    assert brotli.decompress(response.body) == rendered.body
+
+    # the uncompressed ETag doesn't match the compressed body and the other way around
+    assert rendered_response(
+        request(accept_encoding="br", if_none_match=rendered.etag), rendered
+    ).status_code == 200
+    assert rendered_response(
+        request(if_none_match=response.headers["etag"]), rendered
+    ).status_code == 200
+    assert rendered_response(
+        request(accept_encoding="br", if_none_match=response.headers["etag"]), rendered
+    ).status_code == 304
+
+
+def test_encoded_etag_matches_the_response():
+    rendered = render(big_body())
+
+    for encoding in ("br", "gzip", None):
+        response = rendered_response(request(accept_encoding=encoding or "identity"), rendered)
+        assert response.headers["etag"] == encoded_etag(rendered.etag, encoding)
+
+
+def test_small_bodies_are_not_compressed():
+    response = rendered_response(request(accept_encoding="br"), render([1]))
+
+    assert "content-encoding" not in response.headers
+    assert response.body == b"[1]"
+
+
+def test_bodies_not_precompressed_are_compressed_on_demand():
+    rendered = render(big_body())
+
+    response = rendered_response(request(accept_encoding="gzip"), rendered)
+
+    assert gzip.decompress(response.body) == rendered.body
+    assert "gzip" in rendered.variants
+
+
+def test_coder_round_trip():
+    rendered = asyncio.run(render(big_body(), keys=["rec1", "rec2"]).precompress())
+
+    decoded = RenderedCoder.decode(RenderedCoder.encode(rendered))
+
+    assert decoded.body == rendered.body
+    assert decoded.etag == rendered.etag
+    assert decoded.variants == rendered.variants
+    assert decoded.keys == ["rec1", "rec2"]
+
+    plain = RenderedCoder.decode(RenderedCoder.encode(render(None)))
+    assert plain.body == b"null" and plain.variants == {} and plain.keys is None
+
+
+def test_coder_reads_the_old_format():
+    decoded = RenderedCoder.decode('"abc"\n[1,2]')
+
+    assert decoded.etag == '"abc"'
+    assert decoded.body == b"[1,2]"
+    assert decoded.variants == {}
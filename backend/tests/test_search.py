@@ -0,0 +1,71 @@
+from helpers.search import SearchIndex, normalize, tokenize, trigrams
+
+
+def record(id: str, **fields) -> dict:
+    return {"id": id, "fields": fields}
+
+
+def make_index() -> SearchIndex:
+    index = SearchIndex({"Club Name": 4, "Venue": 2, "Description": 1})
+    index.rebuild(
+        {
+            "rec1": record("rec1", **{"Club Name": "Robotics Club", "Venue": "Lincoln High"}),
+            "rec2": record("rec2", **{"Club Name": "Hack Club Lincoln", "Description": "We build robots"}),
+            "rec3": record("rec3", **{"Club Name": "Café Coders", "Venue": ["Library", "Annex"]}),
+        }
+    )
+    return index
+
+
+def ids(records: list) -> list:
+    return [record["id"] for record in records]
+
+
+def test_normalize_strips_case_and_accents():
+    assert normalize("Café ÉCOLE") == "cafe ecole"
+    assert tokenize("Hack-Club, São Paulo!") == ["hack", "club", "sao", "paulo"]
+
+
+def test_trigrams_are_padded():
+    assert trigrams("ab") == {" ab", "ab "}
+
+
+def test_lookup_ranks_name_matches_first():
+    assert ids(make_index().lookup("lincoln")) == ["rec2", "rec1"]
+
+
+def test_lookup_survives_a_typo():
+    # rec2's description says robots, a weaker match
+    assert ids(make_index().lookup("robotcs")) == ["rec1", "rec2"]
+
+
+def test_lookup_ignores_accents_and_reads_lookup_fields():
+    index = make_index()
+
+    assert ids(index.lookup("cafe")) == ["rec3"]
+    assert ids(index.lookup("library")) == ["rec3"]
+
+
+def test_lookup_without_matches():
+    index = make_index()
+
+    assert index.lookup("zzzz") == []
+    assert index.lookup("   ") == []
+
+
+def test_limit():
+    index = make_index()
+
+    assert len(index.lookup("club", limit=1)) == 1
+    assert len(index.lookup("club", limit=None)) == 2
+
+
+def test_add_and_remove():
+    index = make_index()
+
+    index.add(record("rec4", **{"Club Name": "Lincoln Makers"}))
+    assert "rec4" in ids(index.lookup("lincoln"))
+
+    index.remove(index.records["rec2"])
+    assert ids(index.lookup("lincoln")) == ["rec4", "rec1"]
+    assert not any("rec2" in bucket for bucket in index.postings.values())
@@ -0,0 +1,234 @@
+import asyncio
+import threading
+from datetime import timedelta
+
+import pytest
+
+from helpers import snapshot as snapshot_module
+from helpers.snapshot import (SNAPSHOT_SYNC_OVERLAP_SECONDS, TableSnapshot,
+                              modified_since)
+
+
+class FakeTable:
+    """
+    Serves whatever records are set on it and remembers the options of every fetch
+    """
+
+    table_name = "Clubs"
+
+    def __init__(self, records=()):
+        self.records = list(records)
+        self.calls = []
+        self.fail = False
+
+    def all(self, **options):
+        self.calls.append(options)
+        if self.fail:
+            raise RuntimeError("Airtable is down")
+        return list(self.records)
+
+
+class FakeClient:
+    def __init__(self, table: FakeTable):
+        self.table = table
+
+    async def all(self, table_name, formula=None, fields=None):
+        await asyncio.sleep(0)
+        return self.table.all(formula=formula)
+
+
+def record(record_id: str, name: str) -> dict:
+    return {"id": record_id, "fields": {"Name": name}}
+
+
+def by_name(snapshot: TableSnapshot) -> TableSnapshot:
+    snapshot.add_index("name", lambda record: [record["fields"]["Name"]])
+    return snapshot
+
+
+def test_first_sync_is_full_then_incremental():
+    table = FakeTable([record("rec1", "a")])
+    snapshot = TableSnapshot(table, refresh_interval=0)
+
+    snapshot.refresh()
+    first_started = snapshot._last_sync_started
+    snapshot.refresh()
+
+    assert table.calls[0] == {}
+    assert table.calls[1] == {
+        "formula": modified_since(first_started - timedelta(seconds=SNAPSHOT_SYNC_OVERLAP_SECONDS))
+    }
+
+
+def test_full_sync_after_the_interval():
+    table = FakeTable([record("rec1", "a")])
+    snapshot = TableSnapshot(table, full_sync_interval=3600)
+
+    snapshot.refresh()
+    snapshot._last_full_sync_started -= timedelta(seconds=3601)
+    snapshot.refresh()
+    snapshot.refresh(full=True)
+
+    assert table.calls == [{}, {}, {}]
+
+
+def test_only_full_syncs_remove_records():
+    table = FakeTable([record("rec1", "a"), record("rec2", "b")])
+    snapshot = TableSnapshot(table)
+    snapshot.refresh()
+
+    table.records = [record("rec1", "a")]
+
+    assert snapshot.refresh() is False
+    assert set(snapshot.records) == {"rec1", "rec2"}
+
+    assert snapshot.refresh(full=True) is True
+    assert set(snapshot.records) == {"rec1"}
+
+
+def test_version_only_changes_with_the_records():
+    table = FakeTable([record("rec1", "a")])
+    snapshot = TableSnapshot(table)
+
+    snapshot.refresh()
+    version = snapshot.version
+    snapshot.refresh(full=True)
+
+    assert snapshot.version == version
+
+    table.records = [record("rec1", "b")]
+    snapshot.refresh()
+
+    assert snapshot.version == version + 1
+
+
+def test_indexes_are_patched():
+    table = FakeTable([record("rec1", "a"), record("rec2", "b")])
+    snapshot = by_name(TableSnapshot(table))
+    snapshot.refresh()
+
+    # rec1 renamed, rec2 deleted, rec3 added
+    table.records = [record("rec1", "c"), record("rec3", "c")]
+    snapshot.refresh(full=True)
+    index = snapshot.indexes["name"]
+
+    assert index.buckets.keys() == {"c"}
+    assert {found["id"] for found in index.lookup("c")} == {"rec1", "rec3"}
+    assert index.lookup("a") == index.lookup("b") == []
+
+
+def test_put_and_drop_patch_indexes():
+    snapshot = by_name(TableSnapshot(FakeTable()))
+    snapshot.refresh()
+
+    snapshot.put(record("rec1", "a"))
+    snapshot.put(record("rec1", "b"))
+
+    assert snapshot.indexes["name"].lookup("a") == []
+    assert snapshot.indexes["name"].lookup("b") == [record("rec1", "b")]
+
+    snapshot.drop("rec1")
+    snapshot.drop("missing")
+
+    assert snapshot.records == {}
+    assert snapshot.indexes["name"].buckets == {}
+
+
+def test_failed_background_syncs_back_off(monkeypatch):
+    monkeypatch.setattr(snapshot_module, "SNAPSHOT_RETRY_SECONDS", 3600)
+    table = FakeTable([record("rec1", "a")])
+    snapshot = TableSnapshot(table, refresh_interval=0)
+    snapshot.refresh()
+
+    table.fail = True
+    snapshot.ensure_fresh()
+    # the background thread holds the sync lock until it's done
+    with snapshot._sync_lock:
+        pass
+
+    assert len(table.calls) == 2
+    assert snapshot._last_failure != None
+    assert snapshot.records == {"rec1": record("rec1", "a")}
+
+    # inside the retry window reads don't start another sync
+    assert snapshot.is_stale() is False
+    assert snapshot.all() == [record("rec1", "a")]
+    assert len(table.calls) == 2
+
+    monkeypatch.setattr(snapshot_module, "SNAPSHOT_RETRY_SECONDS", 0)
+    table.fail = False
+
+    assert snapshot.is_stale() is True
+    snapshot.refresh()
+    assert snapshot._last_failure == None
+
+
+def test_first_load_failures_reach_the_caller():
+    table = FakeTable()
+    table.fail = True
+    snapshot = TableSnapshot(table)
+
+    # the first load has nothing to fall back on
+    with pytest.raises(RuntimeError):
+        snapshot.ensure_fresh()
+
+    assert snapshot.loaded is False
+    assert snapshot._sync_owner == None
+    assert not snapshot._sync_lock.locked()
+
+
+def test_sync_on_the_thread_holding_the_lock_does_not_wait():
+    table = FakeTable([record("rec1", "a")])
+    snapshot = TableSnapshot(table)
+
+    # what an async sync on this thread's event loop looks like while it's fetching
+    snapshot._sync_lock.acquire()
+    snapshot._sync_owner = threading.get_ident()
+
+    assert snapshot.refresh() is True
+    assert snapshot._sync_lock.locked()
+
+    snapshot._release_sync_lock()
+
+
+def test_sync_on_another_thread_waits_for_the_lock():
+    table = FakeTable([record("rec1", "a")])
+    snapshot = TableSnapshot(table)
+    snapshot._sync_lock.acquire()
+    snapshot._sync_owner = threading.get_ident()
+
+    thread = threading.Thread(target=snapshot.refresh)
+    thread.start()
+    thread.join(0.1)
+
+    assert thread.is_alive()
+    assert table.calls == []
+
+    snapshot._release_sync_lock()
+    thread.join()
+
+    assert len(table.calls) == 1
+    assert snapshot._sync_owner == None
+
+
+def test_async_background_sync_releases_the_lock():
+    table = FakeTable([record("rec1", "a")])
+    client = FakeClient(table)
+    snapshot = TableSnapshot(table, refresh_interval=0)
+
+    async def run():
+        await snapshot.ensure_fresh_async(client)
+        table.records.append(record("rec2", "b"))
+
+        await snapshot.ensure_fresh_async(client)
+        # the sync is running in a task, the current records are still served
+        assert set(snapshot.records) == {"rec1"}
+        await snapshot._background_task
+
+    asyncio.run(run())
+
+    assert set(snapshot.records) == {"rec1", "rec2"}
+    assert table.calls[0] == {"formula": None}
+    assert table.calls[1]["formula"].startswith("IS_AFTER")
+    assert snapshot._sync_owner == None
+    assert not snapshot._sync_lock.locked()
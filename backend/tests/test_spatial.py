@@ -0,0 +1,124 @@
+import math
+import random
+
+import numpy as np
+
+from helpers.spatial import GeoGrid, PlaceIndex, haversine_km
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    return float(
+        haversine_km(
+            math.radians(lat1),
+            math.radians(lon1),
+            np.radians([lat2]),
+            np.radians([lon2]),
+        )[0]
+    )
+
+
+def random_points(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    latitudes = [math.degrees(math.asin(rng.uniform(-1, 1))) for _ in range(count)]
+    longitudes = [rng.uniform(-180, 180) for _ in range(count)]
+    return latitudes, longitudes
+
+
+def test_haversine_km():
+    # a degree of latitude is about 111km
+    assert abs(distance_km(0, 0, 1, 0) - 111.19) < 0.01
+    assert distance_km(10, 20, 10, 20) == 0
+
+
+def test_nearest_matches_a_full_scan():
+    latitudes, longitudes = random_points(2000)
+    grid = GeoGrid(latitudes, longitudes)
+
+    for latitude, longitude, radius_km in [(0, 0, 1500), (51.5, -0.1, 800), (-33.9, 151.2, 3000)]:
+        indexes, distances = grid.nearest(latitude, longitude, radius_km, limit=25)
+
+        expected = sorted(
+            (distance_km(latitude, longitude, lat, lon), i)
+            for i, (lat, lon) in enumerate(zip(latitudes, longitudes))
+        )
+        expected = [i for distance, i in expected if distance <= radius_km][:25]
+
+        assert indexes.tolist() == expected
+        assert list(distances) == sorted(distances)
+
+
+def test_nearest_across_the_antimeridian():
+    grid = GeoGrid([0, 0, 0], [179.9, -179.9, 170])
+
+    indexes, distances = grid.nearest(0, 179.95, 50, limit=10)
+
+    assert sorted(indexes.tolist()) == [0, 1]
+    assert all(distance < 50 for distance in distances)
+
+
+def test_nearest_around_a_pole():
+    grid = GeoGrid([89.5, 89.5, 80], [0, 180, 0])
+
+    indexes, _ = grid.nearest(89.9, 90, 200, limit=10)
+
+    assert sorted(indexes.tolist()) == [0, 1]
+
+
+def test_nearest_without_points():
+    grid = GeoGrid([], [])
+
+    indexes, distances = grid.nearest(0, 0, 100, limit=10)
+
+    assert len(grid) == 0
+    assert indexes.tolist() == [] and distances.tolist() == []
+
+
+def test_place_index_nearby():
+    places = [
+        {"id": 1, "name": "Near", "kind": "club", "latitude": 0.1, "longitude": 0},
+        {"id": None, "name": "Old", "kind": "old_club", "latitude": 0.5, "longitude": 0},
+        {"id": 2, "name": "Far", "kind": "club", "latitude": 10, "longitude": 0},
+    ]
+
+    nearby = PlaceIndex(places).nearby(0, 0, 100, limit=5)
+
+    assert [place["name"] for place in nearby] == ["Near", "Old"]
+    assert nearby[0]["distance_km"] == round(distance_km(0, 0, 0.1, 0), 3)
+    assert "distance_km" not in places[0]
+
+
+def in_bbox_scan(latitudes, longitudes, min_lat, min_lon, max_lat, max_lon) -> list:
+    return [
+        i
+        for i, (lat, lon) in enumerate(zip(latitudes, longitudes))
+        if min_lat <= lat <= max_lat
+        and (
+            min_lon <= lon <= max_lon
+            if min_lon <= max_lon
+            else lon >= min_lon or lon <= max_lon
+        )
+    ]
+
+
+def test_in_bbox_matches_a_full_scan():
+    latitudes, longitudes = random_points(2000, seed=2)
+    grid = GeoGrid(latitudes, longitudes)
+
+    for box in [(-10, -10, 10, 10), (30, -130, 50, -60), (-90, -180, 90, 180), (0, 0.5, 0.7, 0.9)]:
+        assert grid.in_bbox(*box).tolist() == in_bbox_scan(latitudes, longitudes, *box)
+
+
+def test_in_bbox_across_the_antimeridian():
+    latitudes, longitudes = random_points(2000, seed=3)
+    grid = GeoGrid(latitudes, longitudes)
+
+    box = (-20, 170, 20, -170)
+
+    assert grid.in_bbox(*box).tolist() == in_bbox_scan(latitudes, longitudes, *box)
+    assert len(grid.in_bbox(*box)) > 0
+
+
+def test_in_bbox_includes_the_edges():
+    grid = GeoGrid([0, 10, 10.0001], [0, 10, 10])
+
+    assert grid.in_bbox(0, 0, 10, 10).tolist() == [0, 1]
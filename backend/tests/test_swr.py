@@ -0,0 +1,162 @@
+import asyncio
+
+import pytest
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+
+from helpers import swr
+from helpers.rendered import render
+from helpers.swr import swr_cache
+
+
+class RecordingBackend(InMemoryBackend):
+    def __init__(self):
+        super().__init__()
+        # InMemoryBackend's store is shared by every instance
+        self._store = {}
+        self.expires = []
+
+    async def set(self, key, value, expire=None):
+        self.expires.append(expire)
+        await super().set(key, value, expire)
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    backend = RecordingBackend()
+    monkeypatch.setattr(FastAPICache, "_backend", backend)
+    monkeypatch.setattr(FastAPICache, "_prefix", "test")
+    monkeypatch.setattr(swr, "refreshing", {})
+    monkeypatch.setattr(swr, "failed_at", {})
+    return backend
+
+
+def counting(soft_ttl: int, **kwargs):
+    """
+    Returns a cached function returning how often it was called, and its state to make it fail
+    """
+    state = {"calls": 0, "fail": False}
+
+    @swr_cache(soft_ttl=soft_ttl, **kwargs)
+    async def value(name: str):
+        state["calls"] += 1
+        await asyncio.sleep(0)
+        if state["fail"]:
+            raise RuntimeError("Airtable is down")
+        return render(None if name == "missing" else [name, state["calls"]])
+
+    return value, state
+
+
+async def settle():
+    # lets the background refreshes finish
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_fresh_values_are_served_from_the_cache(backend):
+    value, state = counting(soft_ttl=3600)
+
+    async def run():
+        first = await value("a")
+        second = await value("a")
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert first.json() == second.json() == ["a", 1]
+    assert state["calls"] == 1
+
+
+def test_concurrent_misses_build_once(backend):
+    value, state = counting(soft_ttl=3600)
+
+    async def run():
+        return await asyncio.gather(*(value("a") for _ in range(5)))
+
+    results = asyncio.run(run())
+
+    assert {tuple(result.json()) for result in results} == {("a", 1)}
+    assert state["calls"] == 1
+
+
+def test_stale_values_are_served_while_refreshing(backend):
+    value, state = counting(soft_ttl=0)
+
+    async def run():
+        await value("a")
+        stale = await value("a")
+        await settle()
+        fresh = await value("a")
+        return stale, fresh
+
+    stale, fresh = asyncio.run(run())
+
+    assert stale.json() == ["a", 1]
+    assert fresh.json() == ["a", 2]
+
+
+def test_failed_refreshes_back_off(backend, monkeypatch):
+    monkeypatch.setattr(swr, "CACHE_RETRY_SECONDS", 3600)
+    value, state = counting(soft_ttl=0)
+
+    async def run():
+        await value("a")
+        state["fail"] = True
+
+        results = []
+        for _ in range(5):
+            results.append(await value("a"))
+            await settle()
+        return results
+
+    results = asyncio.run(run())
+
+    assert all(result.json() == ["a", 1] for result in results)
+    # the first stale hit tried once, the others were inside the retry window
+    assert state["calls"] == 2
+    assert len(swr.failed_at) == 1
+
+
+def test_refreshes_resume_after_the_backoff(backend, monkeypatch):
+    monkeypatch.setattr(swr, "CACHE_RETRY_SECONDS", 0)
+    value, state = counting(soft_ttl=0)
+
+    async def run():
+        await value("a")
+        state["fail"] = True
+        await value("a")
+        await settle()
+
+        state["fail"] = False
+        await value("a")
+        await settle()
+        return await value("a")
+
+    assert asyncio.run(run()).json()[0] == "a"
+    assert state["calls"] >= 3
+    assert swr.failed_at == {}
+
+
+def test_missing_values_expire_sooner(backend):
+    value, _ = counting(
+        soft_ttl=3600, hard_ttl=86400, is_missing=lambda rendered: rendered.body == b"null", missing_ttl=60
+    )
+
+    async def run():
+        await value("missing")
+        await value("a")
+
+    asyncio.run(run())
+
+    assert backend.expires == [60, 86400]
+
+
+def test_warm(backend):
+    value, state = counting(soft_ttl=3600)
+
+    async def run():
+        return await value.warm("a"), await value.warm("a")
+
+    assert asyncio.run(run()) == (True, False)
+    assert state["calls"] == 1
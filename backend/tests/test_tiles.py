@@ -0,0 +1,164 @@
+import struct
+
+from helpers.tiles import TILE_EXTENT, TileIndex, encode_value, varint, zigzag
+
+
+def read_varint(data: bytes, i: int):
+    value = shift = 0
+    while True:
+        byte = data[i]
+        i += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if byte < 0x80:
+            return value, i
+
+
+def read_message(data: bytes) -> list:
+    """
+    Splits a protobuf message into (field number, value) pairs, enough to read back a vector tile
+    """
+    fields = []
+    i = 0
+
+    while i < len(data):
+        key, i = read_varint(data, i)
+        number, wire_type = key >> 3, key & 7
+
+        if wire_type == 0:
+            value, i = read_varint(data, i)
+        elif wire_type == 1:
+            value, i = data[i:i + 8], i + 8
+        elif wire_type == 2:
+            length, i = read_varint(data, i)
+            value, i = data[i:i + length], i + length
+        else:
+            raise ValueError(f"Unexpected wire type {wire_type}")
+
+        fields.append((number, value))
+
+    return fields
+
+
+def unzigzag(value: int) -> int:
+    return (value >> 1) ^ -(value & 1)
+
+
+def read_value(data: bytes):
+    number, value = read_message(data)[0]
+
+    if number == 1:
+        return value.decode("utf-8")
+    if number == 3:
+        return struct.unpack("<d", value)[0]
+    if number == 6:
+        return unzigzag(value)
+    if number == 7:
+        return bool(value)
+    return value
+
+
+def decode_tile(data: bytes) -> dict:
+    """
+    Returns layer name -> list of (x, y, properties) for a tile of points
+    """
+    layers = {}
+
+    for number, layer_data in read_message(data):
+        assert number == 3
+
+        fields = read_message(layer_data)
+        name = next(value for number, value in fields if number == 1).decode("utf-8")
+        keys = [value.decode("utf-8") for number, value in fields if number == 3]
+        values = [read_value(value) for number, value in fields if number == 4]
+
+        assert dict(fields)[15] == 2
+        assert dict(fields)[5] == TILE_EXTENT
+
+        features = []
+        for number, feature_data in fields:
+            if number != 2:
+                continue
+
+            feature = dict(read_message(feature_data))
+            assert feature[3] == 1
+
+            command, i = read_varint(feature[4], 0)
+            assert command == (1 << 3) | 1
+            x, i = read_varint(feature[4], i)
+            y, i = read_varint(feature[4], i)
+
+            tags, i = [], 0
+            while i < len(feature[2]):
+                tag, i = read_varint(feature[2], i)
+                tags.append(tag)
+
+            properties = {keys[k]: values[v] for k, v in zip(tags[::2], tags[1::2])}
+            features.append((unzigzag(x), unzigzag(y), properties))
+
+        layers[name] = features
+
+    return layers
+
+
+PLACES = [
+    {"id": 1, "name": "Equator", "kind": "club", "latitude": 0.0, "longitude": 0.0},
+    {"id": None, "name": "Old", "kind": "old_club", "latitude": 10.0, "longitude": 100.0},
+    {"id": 2, "name": "Edge", "kind": "club", "latitude": 0.0, "longitude": 179.5},
+]
+
+
+def test_varint_and_zigzag():
+    assert varint(1) == b"\x01"
+    assert varint(300) == b"\xac\x02"
+    assert read_varint(varint(2**40), 0)[0] == 2**40
+    assert [unzigzag(zigzag(value)) for value in (0, -1, 1, -64)] == [0, -1, 1, -64]
+
+
+def test_encode_value():
+    assert read_value(encode_value("Café")) == "Café"
+    assert read_value(encode_value(1.5)) == 1.5
+    assert read_value(encode_value(-3)) == -3
+    assert read_value(encode_value(7)) == 7
+    assert read_value(encode_value(True)) is True
+
+
+def test_world_tile():
+    layers = decode_tile(TileIndex(PLACES, ["id", "name"]).tile(0, 0, 0))
+
+    assert sorted(layers) == ["club", "old_club"]
+    assert layers["club"][0] == (TILE_EXTENT // 2, TILE_EXTENT // 2, {"id": 1, "name": "Equator"})
+    # None properties are left out
+    assert layers["old_club"][0][2] == {"name": "Old"}
+    assert len(layers["club"]) == 2
+
+
+def test_points_are_in_tile_coordinates():
+    # zoom 1, the top right quarter holds longitude 100 latitude 10
+    layers = decode_tile(TileIndex(PLACES, ["name"]).tile(1, 1, 0))
+
+    x, y, properties = layers["old_club"][0]
+    assert properties == {"name": "Old"}
+    assert 0 <= x <= TILE_EXTENT and 0 <= y <= TILE_EXTENT
+
+
+def test_buffer_wraps_around_the_antimeridian():
+    index = TileIndex(PLACES, ["name"])
+
+    # the point just west of the antimeridian shows in the buffer of the westernmost tile, left of its edge
+    west = decode_tile(index.tile(2, 0, 1))
+    x, _, properties = west["club"][0]
+    assert properties == {"name": "Edge"}
+    assert x < 0
+
+
+def test_empty_tile_and_cache():
+    index = TileIndex(PLACES, ["name"], cache_size=1)
+
+    assert index.tile(5, 0, 0) == b""
+
+    first = index.tile(0, 0, 0)
+    assert index.tile(0, 0, 0) is first
+
+    index.tile(1, 0, 0)
+    assert list(index._cache) == [(1, 0, 0)]
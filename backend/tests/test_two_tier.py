@@ -0,0 +1,173 @@
+import asyncio
+import json
+
+from helpers.two_tier import TwoTierBackend
+
+
+class FakeRedis:
+    """
+    The parts of redis.asyncio RedisBackend and TwoTierBackend use, with TTLs that never run out
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+        self.reads = 0
+        self.published = []
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+        self.ttls[key] = ex
+
+    async def delete(self, key):
+        self.ttls.pop(key, None)
+        return int(self.data.pop(key, None) is not None)
+
+    async def eval(self, script, numkeys=0):
+        # only used by RedisBackend.clear for a namespace
+        return 0
+
+    async def publish(self, channel, message):
+        self.published.append(json.loads(message))
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    def ttl(self, key):
+        self.commands.append(
+            lambda: -2 if key not in self.redis.data else (self.redis.ttls[key] or -1)
+        )
+        return self
+
+    def get(self, key):
+        def read():
+            self.redis.reads += 1
+            return self.redis.data.get(key)
+
+        self.commands.append(read)
+        return self
+
+    async def execute(self):
+        return [command() for command in self.commands]
+
+
+def test_reads_are_kept_in_process():
+    redis = FakeRedis()
+    redis.data["k"], redis.ttls["k"] = b"v", 100
+    backend = TwoTierBackend(redis)
+
+    async def run():
+        return [await backend.get("k") for _ in range(3)]
+
+    assert asyncio.run(run()) == [b"v"] * 3
+    assert redis.reads == 1
+
+
+def test_l1_hits_report_the_redis_ttl():
+    redis = FakeRedis()
+    backend = TwoTierBackend(redis, max_age=5)
+
+    async def run():
+        await backend.set("k", b"v", 1000)
+        await backend.set("forever", b"v")
+        return await backend.get_with_ttl("k"), await backend.get_with_ttl("forever")
+
+    (ttl, value), (forever_ttl, _) = asyncio.run(run())
+
+    assert value == b"v"
+    assert 990 < ttl <= 1000
+    assert forever_ttl == -1
+    assert redis.reads == 0
+
+
+def test_writes_are_announced():
+    redis = FakeRedis()
+    backend = TwoTierBackend(redis)
+
+    async def run():
+        await backend.set("k", b"v", 10)
+        await backend.clear(namespace="ns")
+
+    asyncio.run(run())
+
+    assert [{k: v for k, v in message.items() if k != "origin"} for message in redis.published] == [
+        {"key": "k"},
+        {"namespace": "ns"},
+    ]
+    assert all(message["origin"] == backend.origin for message in redis.published)
+
+
+def test_invalidations_from_other_workers():
+    redis = FakeRedis()
+    backend = TwoTierBackend(redis)
+
+    async def run():
+        await backend.set("ns:a", b"1", 10)
+        await backend.set("ns:b", b"2", 10)
+        await backend.set("other", b"3", 10)
+
+        backend._invalidate(json.dumps({"key": "ns:a", "origin": "someone else"}))
+        assert "ns:a" not in backend.entries
+
+        # our own messages are ignored
+        backend._invalidate(json.dumps({"key": "ns:b", "origin": backend.origin}))
+        assert "ns:b" in backend.entries
+
+        backend._invalidate(json.dumps({"namespace": "ns", "origin": "someone else"}))
+        assert list(backend.entries) == ["other"]
+
+        backend._invalidate("not json")
+
+    asyncio.run(run())
+
+
+def test_a_read_racing_an_invalidation_is_not_kept():
+    redis = FakeRedis()
+    redis.data["k"], redis.ttls["k"] = b"old", 100
+    backend = TwoTierBackend(redis)
+    read = backend.l2.get_with_ttl
+
+    async def slow_read(key):
+        result = await read(key)
+        # another worker writes while the old value is on its way back
+        redis.data["k"] = b"new"
+        backend._invalidate(json.dumps({"key": "k", "origin": "someone else"}))
+        return result
+
+    async def run():
+        backend.l2.get_with_ttl = slow_read
+        first = await backend.get("k")
+        backend.l2.get_with_ttl = read
+        return first, await backend.get("k")
+
+    assert asyncio.run(run()) == (b"old", b"new")
+    assert backend.entries["k"][0] == b"new"
+
+
+def test_size_limit_evicts_the_least_recently_used():
+    backend = TwoTierBackend(FakeRedis(), max_bytes=25)
+
+    async def run():
+        await backend.set("too big", b"x" * 30, 10)
+        for key in ("a", "b", "c"):
+            await backend.set(key, b"1234567890", 10)
+            await backend.get("a")
+
+    asyncio.run(run())
+
+    assert "too big" not in backend.entries
+    # a was read after every write, so b went first
+    assert list(backend.entries) == ["c", "a"]
+    assert backend.size == 20
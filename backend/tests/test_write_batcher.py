@@ -0,0 +1,62 @@
+import pytest
+
+from helpers.write_batcher import WriteBatcher
+
+
+class FakeTable:
+    def __init__(self):
+        self.updates = []
+        self.creates = []
+
+    def batch_update(self, records):
+        self.updates.append(records)
+        return records
+
+    def batch_create(self, records):
+        self.creates.append(records)
+        return records
+
+
+def test_updates_to_a_record_are_merged():
+    table = FakeTable()
+    batcher = WriteBatcher(table)
+
+    batcher.update("rec1", {"Name": "a"})
+    batcher.update("rec1", {"Status": "active"})
+    batcher.update("rec2", {})
+    batcher.flush()
+
+    assert table.updates == [[{"id": "rec1", "fields": {"Name": "a", "Status": "active"}}]]
+    assert table.creates == []
+
+
+def test_full_batches_are_sent_right_away():
+    table = FakeTable()
+    batcher = WriteBatcher(table, batch_size=2)
+
+    for i in range(5):
+        batcher.update(f"rec{i}", {"n": i})
+        batcher.create({"n": i})
+
+    assert [len(batch) for batch in table.updates] == [2, 2]
+    assert [len(batch) for batch in table.creates] == [2, 2]
+
+    batcher.flush()
+
+    assert [len(batch) for batch in table.updates] == [2, 2, 1]
+    assert [len(batch) for batch in table.creates] == [2, 2, 1]
+
+
+def test_flush_without_writes():
+    table = FakeTable()
+
+    assert WriteBatcher(table).flush_updates() == []
+    assert WriteBatcher(table).flush_creates() == []
+    assert table.updates == table.creates == []
+
+
+def test_not_a_context_manager():
+    # queued writes are only sent by an explicit flush, never on the way out of a failed block
+    with pytest.raises((AttributeError, TypeError)):
+        with WriteBatcher(FakeTable()):
+            pass